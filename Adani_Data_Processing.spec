@@ -1,11 +1,26 @@
 # -*- mode: python ; coding: utf-8 -*-
+# Same bundle as build_exe.py (onefile profile)
 
+import os
+import sys
+
+sys.path.insert(0, SPECPATH)
+from template_plan import load_plan
+
+# Compile the template plan so the bundled app never has to scan format.xlsx
+load_plan(os.path.join(SPECPATH, 'output', 'format.xlsx'))
 
 a = Analysis(
-    ['D:\\Rishav_raj\\Adani\\Adani_project\\Adani_project\\Adani_project\\GUI\\gui.py'],
-    pathex=[],
+    ['gui.py'],
+    pathex=[SPECPATH],
     binaries=[],
-    datas=[('README.md', '.'), ('requirements.txt', '.'), ('output/format.xlsx', 'output')],
+    datas=[
+        ('README.md', '.'),
+        ('requirements.txt', '.'),
+        ('output/format.xlsx', 'output'),
+        ('output/template_plan.json', 'output'),
+        ('gradient.svg', '.'),
+    ],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
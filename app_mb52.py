@@ -1,78 +1,187 @@
+import numpy as np
 from openpyxl import load_workbook
-from copy import copy
 from openpyxl.utils import get_column_letter
+from openpyxl.cell.cell import Cell
+from openpyxl.styles.cell_style import StyleArray
+from template_plan import SIGN_OFF_LABEL, has_label
+from label_index import LabelIndex
+from row_styles import FORMAT_FIELDS, style_id, apply_style_id
+from instrumentation import traced, phase
+from report_render import RowBlock, add_row_block, row_blocks_enabled
+
+# Input (SAP export) header -> output header
+COLUMN_MAPPING = {
+    "Plant": "Plant",
+    "Material": "Material",
+    "Material Description": "Material Description",
+    "Include/ Exclude": "Exclusion/ Inclusion",
+    "Name 1": "Name 1",
+    "Storage Location": "Storage Location",
+    "Category": "Category",
+    "Descr. of Storage Loc.": "Descr. of Storage Loc.",
+    "Base Unit of Measure": "Base Unit of Measure",
+    "Unrestricted": "Unrestricted",
+    "Quality Inspection": "Quality Inspection",
+    "Blocked": "Blocked",
+    "Returns": "Returns",
+    "Transit and Transfer": "Transit and Transfer",
+    "Restricted-Use Stock": "Restricted-Use Stock",
+    "Special Stock": "Special Stock",
+    "Total Qty": "Total Stock",
+    "Value Unrestricted": "Value Unrestricted",
+    "Value in QualInsp.": "Value in QualInsp.",
+    "Value BlockedStock": "Value BlockedStock",
+    "Value Rets Blocked": "Value Rets Blocked",
+    "Val. in Trans./Tfr": "Val. in Trans./Tfr",
+    "Value Restricted": "Value Restricted",
+    "Total Value": "Total Value"
+}
+
+# Input columns summed into Total Qty and Total Value
+QTY_COLUMNS = [
+    "Unrestricted",
+    "Quality Inspection",
+    "Blocked",
+    "Returns",
+    "Transit and Transfer",
+    "Restricted-Use Stock",
+    "Special Stock"
+]
+VALUE_COLUMNS = [
+    "Value Unrestricted",
+    "Value in QualInsp.",
+    "Value BlockedStock",
+    "Value Rets Blocked",
+    "Val. in Trans./Tfr",
+    "Value Restricted"
+]
+
+# Output columns that get a SUM formula on the TOTAL row
+TOTAL_COLUMNS = QTY_COLUMNS + ["Total Stock"] + VALUE_COLUMNS + ["Total Value"]
+
+def compile_column_plan(output_headers, input_headers):
+    """
+    (output column number, input header) for every output column that is
+    filled from the input, resolved once instead of per cell.
+    input_headers must include the computed Total Qty and Total Value.
+    """
+    input_for_output = {}
+    for in_header, out_header in COLUMN_MAPPING.items():
+        input_for_output.setdefault(out_header, in_header)
+    plan = []
+    for col, out_header in enumerate(output_headers, 1):
+        in_header = input_for_output.get(out_header)
+        if in_header and in_header in input_headers:
+            plan.append((col, in_header))
+    return plan
+
+def row_totals(data_rows, columns):
+    """
+    Per-row sums of the given input columns as Python floats. Blank values
+    count as 0 and non-numeric text raises ValueError, as float() did.
+    """
+    values = np.array([[row.get(col, 0) or 0 for col in columns] for row in data_rows], dtype=object)
+    values = values.astype(float)
+    # Column by column from 0, the same addition order as sum() over each row
+    totals = np.zeros(len(data_rows))
+    for col in range(len(columns)):
+        totals += values[:, col]
+    return totals.tolist()
+
+def write_mb52_rows(ws, first_row, num_rows, columns, row_style_ids):
+    """
+    Write rows first_row.. in one pass per row: every column gets the format
+    row's style id and the planned columns (column -> values) their value.
+    Cells are created directly instead of through ws.cell() argument checks.
+    """
+    sheet_cells = ws._cells
+    # Style of a new cell: the format fields of the style id, default flags
+    new_cell_styles = []
+    for style in row_style_ids:
+        new_style = StyleArray()
+        new_style[:FORMAT_FIELDS] = style[:FORMAT_FIELDS]
+        new_cell_styles.append(new_style)
+    planned = sorted(columns.items())
+
+    for i in range(num_rows):
+        row = first_row + i
+        for col, style in enumerate(row_style_ids, 1):
+            cell = sheet_cells.get((row, col))
+            if cell is None:
+                cell = sheet_cells[(row, col)] = Cell(ws, row=row, column=col)
+                # Every cell needs its own array: openpyxl updates it in place on later style changes
+                cell._style = StyleArray(new_cell_styles[col - 1])
+            else:
+                apply_style_id(cell, style)
+        for col, values in planned:
+            cell = sheet_cells.get((row, col))
+            if cell is None:
+                cell = sheet_cells[(row, col)] = Cell(ws, row=row, column=col)
+            cell.value = values[i]
+
+def iter_mb52_rows(mb52_input_file_path, s_loc_code, header_row=3):
+    """
+    Stream the MB52 export with a read-only, values-only reader and yield a dict
+    only for rows of the given S Loc Code, so memory scales with the matching
+    rows instead of the whole plant-wide export
+    """
+    wb_input = load_workbook(mb52_input_file_path, read_only=True, data_only=True)
+    try:
+        ws_input = wb_input.active
+        rows = ws_input.iter_rows(min_row=header_row, values_only=True)
 
-def process_mb52(format_file_path, mb52_input_file_path, s_loc_code):
+        # Headers are in row 3 of the SAP export
+        headers_input = next(rows, None)
+        if not headers_input or "S Loc Code" not in headers_input:
+            return
+        s_loc_idx = headers_input.index("S Loc Code")
+        target = str(s_loc_code)
+
+        for row in rows:
+            value = row[s_loc_idx] if s_loc_idx < len(row) else None
+            # Filter before building the dict so non-matching rows are never materialized
+            if str(value).strip() == target:
+                yield dict(zip(headers_input, row))
+    finally:
+        wb_input.close()
+
+@traced("process_mb52")
+def process_mb52(format_file_path, mb52_input_file_path, s_loc_code, wb=None, plan=None):
+    """
+    Fill the MB52 stock report. A location without MB52 rows leaves the sheet
+    as it is (a warning, still True); returns False when an error stopped it.
+    """
     try:
         input_file = mb52_input_file_path
         output_file = format_file_path
         sheet_name = "Mb52- Stock Report"
 
-        # Step 2: Open input workbook and read sheet
-        wb_input = load_workbook(input_file,data_only=True)
-        ws_input = wb_input.active
-
-        # Step 3: Get headers from input sheet (assume headers are in row 3)
-        header_row_input = 3
-        headers_input = [cell.value for cell in ws_input[header_row_input]]
-
-        # Step 4: Column mapping
-        column_mapping = {
-            "Plant": "Plant",
-            "Material": "Material",
-            "Material Description": "Material Description",
-            "Include/ Exclude": "Exclusion/ Inclusion",
-            "Name 1": "Name 1",
-            "Storage Location": "Storage Location",
-            "Category": "Category",
-            "Descr. of Storage Loc.": "Descr. of Storage Loc.",
-            "Base Unit of Measure": "Base Unit of Measure",
-            "Unrestricted": "Unrestricted",
-            "Quality Inspection": "Quality Inspection",
-            "Blocked": "Blocked",
-            "Returns": "Returns",
-            "Transit and Transfer": "Transit and Transfer",
-            "Restricted-Use Stock": "Restricted-Use Stock",
-            "Special Stock": "Special Stock",
-            "Total Qty": "Total Stock",
-            "Value Unrestricted": "Value Unrestricted",
-            "Value in QualInsp.": "Value in QualInsp.",
-            "Value BlockedStock": "Value BlockedStock",
-            "Value Rets Blocked": "Value Rets Blocked",
-            "Val. in Trans./Tfr": "Val. in Trans./Tfr",
-            "Value Restricted": "Value Restricted",
-            "Total Value": "Total Value"
-        }
-
-        # Step 5: Filter rows by Storage Location
-        data_rows = []
-        for row in ws_input.iter_rows(min_row=header_row_input + 1, values_only=True):
-            row_dict = dict(zip(headers_input, row))
-            if str(row_dict.get("S Loc Code", "")).strip() == str(s_loc_code):
-                data_rows.append(row_dict)
+        # Step 5: Stream the input and keep only rows for this Storage Location
+        phase("read input")
+        data_rows = list(iter_mb52_rows(input_file, s_loc_code))
 
         if not data_rows:
             print("[WARNING] No data found for the given Storage Location.")
-            return
+            return True
 
-        # Step 6: Open output workbook
-        wb_output = load_workbook(output_file)
+        # Step 6: Open output workbook (or use the pipeline session's one)
+        if wb is None:
+            phase("load workbook")
+        wb_output = wb if wb is not None else load_workbook(output_file)
         ws_output = wb_output[sheet_name]
 
-        # Step 7: Find sign-off section row
-        sign_off_label = "S Loc Incharge (WMS Representative)"
-        sign_off_row = None
-        for row in ws_output.iter_rows(min_row=1, max_row=ws_output.max_row):
-            for cell in row:
-                if str(cell.value).strip() == sign_off_label:
-                    sign_off_row = cell.row
-                    break
-            if sign_off_row:
-                break
+        # Step 7: Find sign-off section row (compiled plan or scan)
+        phase("anchor search")
+        sign_off = plan.sheet(sheet_name).get("sign_off", {}) if plan else {}
+        if has_label(ws_output, sign_off.get("row"), sign_off.get("column"), SIGN_OFF_LABEL):
+            sign_off_row = sign_off["row"]
+        else:
+            sign_off_row, _ = LabelIndex(ws_output).find(SIGN_OFF_LABEL)
         if not sign_off_row:
             raise Exception("[ERROR] Sign-off label not found in output file!")
 
         # Step 8: Calculate available space and insert rows if needed
+        phase("row insertion")
         header_start = 3
         insert_start = header_start + 1
         rows_to_write = len(data_rows)
@@ -84,88 +193,48 @@ def process_mb52(format_file_path, mb52_input_file_path, s_loc_code):
             extra_rows = required_space - available_rows
             ws_output.insert_rows(idx=insert_start, amount=extra_rows)
 
-        # Step 9: Copy formatting from row 3
+        # Step 9: Copy formatting from row 3, resolved once to shared style ids per column
+        phase("formatting")
         format_row_number = 3
-        format_row_styles = []
-        for col in range(1, ws_output.max_column + 1):
-            cell = ws_output.cell(row=format_row_number, column=col)
-            format_row_styles.append({
-                "font": copy(cell.font),
-                "border": copy(cell.border),
-                "fill": copy(cell.fill),
-                "number_format": copy(cell.number_format),
-                "protection": copy(cell.protection),
-                "alignment": copy(cell.alignment)
-            })
-
-        # Apply formatting to new rows
-        for i in range(rows_to_write):
-            for col in range(1, ws_output.max_column + 1):
-                tgt_cell = ws_output.cell(row=insert_start + i, column=col)
-                style = format_row_styles[col - 1]
-                tgt_cell.font = style["font"]
-                tgt_cell.border = style["border"]
-                tgt_cell.fill = style["fill"]
-                tgt_cell.number_format = style["number_format"]
-                tgt_cell.protection = style["protection"]
-                tgt_cell.alignment = style["alignment"]
-
-        # Step 10: Write data to output
+        format_row_styles = [
+            style_id(ws_output.cell(row=format_row_number, column=col))
+            for col in range(1, ws_output.max_column + 1)
+        ]
+
+        # The stream engine applies them when writing the block
+        deferred = row_blocks_enabled(ws_output)
+
+        # Step 10: Write data and formatting to output in bulk
+        phase("write rows")
         output_headers = [cell.value for cell in ws_output[2]]
-        for i, row_data in enumerate(data_rows):
-            # Calculate Total Stock
-            total_stock = sum(float(row_data.get(col, 0) or 0) for col in [
-                "Unrestricted",
-                "Quality Inspection",
-                "Blocked",
-                "Returns",
-                "Transit and Transfer",
-                "Restricted-Use Stock",
-                "Special Stock"
-            ])
-            # Calculate Total Value
-            total_value = sum(float(row_data.get(col, 0) or 0) for col in [
-                "Value Unrestricted",
-                "Value in QualInsp.",
-                "Value BlockedStock",
-                "Value Rets Blocked",
-                "Val. in Trans./Tfr",
-                "Value Restricted"
-            ])
-            # Update the row data with calculated totals
-            row_data["Total Qty"] = total_stock
-            row_data["Total Value"] = total_value
-            for j, out_header in enumerate(output_headers):
-                in_header = next((k for k, v in column_mapping.items() if v == out_header), None)
-                if in_header and in_header in row_data:
-                    ws_output.cell(row=insert_start + i, column=j + 1, value=row_data[in_header])
+        column_values = {
+            "Total Qty": row_totals(data_rows, QTY_COLUMNS),
+            "Total Value": row_totals(data_rows, VALUE_COLUMNS),
+        }
+        input_headers = set(data_rows[0]) | set(column_values)
+        columns = {}
+        for col, in_header in compile_column_plan(output_headers, input_headers):
+            values = column_values.get(in_header)
+            if values is None:
+                values = [row_data[in_header] for row_data in data_rows]
+            columns[col] = values
+        if not deferred:
+            write_mb52_rows(ws_output, insert_start, rows_to_write, columns, format_row_styles)
 
         # Move the delete_rows before calculating totals
+        phase("totals")
         ws_output.delete_rows(3)
+        if deferred:
+            # Row 3 is gone, so the rows meant for insert_start now start one row higher
+            styles = dict(enumerate(format_row_styles, 1))
+            add_row_block(ws_output, RowBlock(insert_start - 1, rows_to_write, columns, styles, format_only=True))
 
         # Step 11: Add total row at the bottom
         total_row_index = insert_start + rows_to_write - 1
         ws_output.cell(row=total_row_index, column=2, value="TOTAL")
         output_headers = [cell.value for cell in ws_output[2]]
-        total_columns = [
-            "Unrestricted",
-            "Quality Inspection",
-            "Blocked",
-            "Returns",
-            "Transit and Transfer",
-            "Restricted-Use Stock",
-            "Special Stock",
-            "Total Stock",
-            "Value Unrestricted",
-            "Value in QualInsp.",
-            "Value BlockedStock",
-            "Value Rets Blocked",
-            "Val. in Trans./Tfr",
-            "Value Restricted",
-            "Total Value"
-        ]
         for j, out_header in enumerate(output_headers):
-            if out_header in total_columns:
+            if out_header in TOTAL_COLUMNS:
                 col_letter = get_column_letter(j + 1)
                 start_row = insert_start
                 end_row = insert_start + rows_to_write - 2
@@ -173,7 +242,13 @@ def process_mb52(format_file_path, mb52_input_file_path, s_loc_code):
                     formula = f"=SUM({col_letter}{start_row}:{col_letter}{end_row})"
                     ws_output.cell(row=total_row_index, column=j + 1, value=formula)
 
-        wb_output.save(output_file)
-        print(f"[INFO] MB52 data processed and saved to {output_file}")
+        if wb is None:
+            phase("save")
+            wb_output.save(output_file)
+            print(f"[INFO] MB52 data processed and saved to {output_file}")
+        else:
+            print("[INFO] MB52 data processed")
+        return True
     except Exception as e:
         print(f"[ERROR] {e}")
+        return False
@@ -0,0 +1,164 @@
+import os
+import sys
+import argparse
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from master_data_fetcher import fetch_master_data, get_master_store
+from pipeline import run_all
+from report_render import ENGINES, ENGINE_ENV
+from instrumentation import tracing, write_trace
+
+DEFAULT_FORMAT_FILE_PATH = os.path.join("output", "format.xlsx")
+DEFAULT_OUTPUT_DIR = os.path.join("output", "batch")
+
+def safe_name(value):
+    """Make a value usable in a file name ('Paddy/Rice' -> 'Paddy-Rice')"""
+    return "".join(ch if ch.isalnum() or ch in "-_." else "-" for ch in str(value).strip())
+
+def resolve_input(path_pattern, s_loc_code, category):
+    """
+    Expand {s_loc} and {category} placeholders in an input path.
+    Returns None when no pattern is given or the file does not exist.
+    """
+    if not path_pattern:
+        return None
+    path = path_pattern.format(s_loc=safe_name(s_loc_code), category=safe_name(category))
+    return path if os.path.exists(path) else None
+
+def process_location(job):
+    """
+    Run the full stage chain for one (S Loc, Category) pair.
+    Executed in a worker process; stage output goes to a per-location log file.
+    A stage that fails, whether it raised or only reported the error, makes
+    the location an error pointing at that log.
+    """
+    s_loc_code, category = job["s_loc_code"], job["category"]
+    base_name = f"format_{safe_name(s_loc_code)}_{safe_name(category)}"
+    output_file_path = os.path.join(job["output_dir"], base_name + ".xlsx")
+    log_file_path = os.path.join(job["output_dir"], "logs", base_name + ".log")
+    trace_file_path = os.path.join(job["output_dir"], "traces", base_name + ".json")
+
+    try:
+        with open(log_file_path, "w", encoding="utf-8") as log_file, contextlib.redirect_stdout(log_file), \
+                tracing(f"{s_loc_code} / {category}", memory=job["trace_memory"]) as trace:
+            result = fetch_master_data(
+                s_loc_code=s_loc_code,
+                category=category,
+                master_file_path=job["master_file_path"]
+            )
+            if result["status"] == "error":
+                return s_loc_code, category, "error", result.get("error_message", "Unknown error")
+            run_all(
+                master_data=result["master_data"],
+                auditor_data=result["auditor_data"],
+                format_file_path=job["format_file_path"],
+                output_file_path=output_file_path,
+                s_loc_code=s_loc_code,
+                hygiene_input_file_path=resolve_input(job["hygiene_input"], s_loc_code, category),
+                mb52_input_file_path=resolve_input(job["mb52_input"], s_loc_code, category),
+                countsheet_input_file_path=resolve_input(job["countsheet_input"], s_loc_code, category),
+                stack_input_file_path=resolve_input(job["stack_input"], s_loc_code, category),
+                incremental=job["incremental"],
+                engine=job["engine"]
+            )
+        # Written after the block so the trace covers the whole run
+        write_trace(trace, trace_file_path)
+        with open(log_file_path, "a", encoding="utf-8") as log_file:
+            log_file.write("\n" + "\n".join(trace.summary_lines()) + "\n")
+        return s_loc_code, category, "success", output_file_path
+    except Exception as e:
+        return s_loc_code, category, "error", f"{e} (log: {log_file_path})"
+
+def run_batch(pairs, master_file_path, format_file_path=DEFAULT_FORMAT_FILE_PATH, output_dir=DEFAULT_OUTPUT_DIR,
+              hygiene_input=None, mb52_input=None, countsheet_input=None, stack_input=None, workers=None,
+              trace_memory=False, incremental=True, engine=None):
+    """
+    Process every (S Loc, Category) pair in a pool of worker processes,
+    writing one output workbook per location into output_dir.
+    Input paths may contain {s_loc} and {category} placeholders for per-location files.
+    A timing trace per location is written to output_dir/traces.
+    With incremental=True a location's stages that are unchanged since the
+    last batch reuse its previous workbook, and failed locations resume.
+    engine picks how workbooks are written (see report_render).
+    """
+    os.makedirs(os.path.join(output_dir, "logs"), exist_ok=True)
+    os.makedirs(os.path.join(output_dir, "traces"), exist_ok=True)
+    jobs = [{
+        "s_loc_code": str(s_loc_code).strip(),
+        "category": str(category).strip(),
+        "master_file_path": master_file_path,
+        "format_file_path": format_file_path,
+        "output_dir": output_dir,
+        "hygiene_input": hygiene_input,
+        "mb52_input": mb52_input,
+        "countsheet_input": countsheet_input,
+        "stack_input": stack_input,
+        "trace_memory": trace_memory,
+        "incremental": incremental,
+        "engine": engine,
+    } for s_loc_code, category in pairs]
+
+    print(f"Processing {len(jobs)} locations with {workers or os.cpu_count()} workers...")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_location, job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            s_loc_code, category, status, detail = future.result()
+            marker = "✅" if status == "success" else "❌"
+            print(f"{marker} [{done}/{len(jobs)}] {s_loc_code} / {category}: {detail}")
+            results.append((s_loc_code, category, status, detail))
+
+    failed = sum(1 for result in results if result[2] != "success")
+    print(f"Batch complete: {len(results) - failed} succeeded, {failed} failed")
+    return results
+
+def parse_pair(value):
+    """Parse 'S_LOC:CATEGORY' (e.g. '8046:Wheat') into a tuple"""
+    s_loc_code, sep, category = value.partition(":")
+    if not sep or not s_loc_code.strip() or not category.strip():
+        raise argparse.ArgumentTypeError(f"Expected S_LOC:CATEGORY, got '{value}'")
+    return s_loc_code.strip(), category.strip()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Adani audit chain for many locations in parallel")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--pairs", nargs="+", type=parse_pair, metavar="S_LOC:CATEGORY",
+                           help="Locations to process, e.g. 8046:Wheat 8058:Paddy/Rice")
+    selection.add_argument("--all", action="store_true", help="Process every row in the master file")
+    parser.add_argument("--master", required=True, help="Master file (master.xlsx)")
+    parser.add_argument("--format", default=DEFAULT_FORMAT_FILE_PATH, help="Template format.xlsx")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Directory for per-location workbooks")
+    parser.add_argument("--hygiene", help="Hygiene audit-headers file")
+    parser.add_argument("--mb52", help="MB52 export")
+    parser.add_argument("--countsheet", help="Count sheet input, may use {s_loc} and {category}")
+    parser.add_argument("--stack", help="Stack input, may use {s_loc} and {category}")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record peak memory per phase in the location traces (slower)")
+    parser.add_argument("--full", action="store_true",
+                        help="Run every stage even when its inputs are unchanged since the last batch")
+    parser.add_argument("--engine", choices=ENGINES,
+                        help=f"How workbooks are written (default: ${ENGINE_ENV} or openpyxl)")
+    args = parser.parse_args(argv)
+
+    pairs = get_master_store(args.master).pairs() if args.all else args.pairs
+    results = run_batch(
+        pairs,
+        master_file_path=args.master,
+        format_file_path=args.format,
+        output_dir=args.output_dir,
+        hygiene_input=args.hygiene,
+        mb52_input=args.mb52,
+        countsheet_input=args.countsheet,
+        stack_input=args.stack,
+        workers=args.workers,
+        trace_memory=args.trace_memory,
+        incremental=not args.full,
+        engine=args.engine
+    )
+    return 0 if all(result[2] == "success" for result in results) else 1
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,396 @@
+import os
+import sys
+import io
+import json
+import time
+import logging
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import statistics
+import tracemalloc
+from datetime import datetime
+from openpyxl import load_workbook
+from log_setup import ROOT_LOGGER_NAME
+from dataset_generator import (DEFAULT_SEED, plan_locations, write_rows, master_rows, mb52_rows,
+                               count_sheet_rows, hygiene_rows)
+
+BENCHMARK_VERSION = 2
+DEFAULT_SIZES = (100, 1000, 5000)
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_BASELINE_PATH = "benchmark_baseline.json"
+DEFAULT_FORMAT_FILE_PATH = os.path.join("output", "format.xlsx")
+
+# Differences smaller than these are noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.05
+MIN_PEAK_KB_DELTA = 512
+
+# Every input of a benchmark has `size` data rows. MB52 rows are spread over
+# as many locations as needed at this many rows each, like a plant-wide export.
+MB52_ROWS_PER_LOCATION = 50
+# Input rows for benchmarks that do not depend on the input size
+UNSIZED_ROWS = 50
+# Printed lines of a stage that caught an error instead of raising it
+ERROR_LINE_PREFIXES = ("❌", "[ERROR]", "Error")
+
+class StageFailed(Exception):
+    """A benchmarked stage reported an error instead of raising it"""
+
+class StageOutput(logging.Handler):
+    """
+    Captures what the stages print and log while a benchmark runs. check()
+    raises StageFailed when the call returned a failure status or the stages
+    reported an error, so a broken stage never counts as a fast one.
+    """
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.errors = []
+        self.output = io.StringIO()
+        self._redirect = contextlib.redirect_stdout(self.output)
+
+    def emit(self, record):
+        self.errors.append(record.getMessage())
+
+    def __enter__(self):
+        logging.getLogger(ROOT_LOGGER_NAME).addHandler(self)
+        self._redirect.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._redirect.__exit__(*exc_info)
+        logging.getLogger(ROOT_LOGGER_NAME).removeHandler(self)
+        return False
+
+    def check(self, result):
+        errors = self.errors + [line.strip() for line in self.output.getvalue().splitlines()
+                                if line.strip().startswith(ERROR_LINE_PREFIXES)]
+        if errors:
+            raise StageFailed(errors[-1].strip())
+        if result is False or (isinstance(result, dict) and result.get("status") == "error"):
+            raise StageFailed("the stage returned a failure status")
+
+def reset_caches():
+    """Forget parsed inputs kept in memory, so every run reads its input files"""
+    from master_data_fetcher import _master_stores
+    from hygeine import _hygiene_stores
+    _master_stores.clear()
+    _hygiene_stores.clear()
+
+class BenchmarkInputs:
+    """
+    Synthetic inputs of one size in a scratch directory, plus the template
+    copy the stages write to. The first generated location is the one every
+    stage processes. Files are written on first use and reused by every
+    benchmark of that size.
+    """
+
+    def __init__(self, work_dir, size, format_file_path, seed=DEFAULT_SEED):
+        self.work_dir = work_dir
+        self.size = size
+        self.rows = size or UNSIZED_ROWS
+        self.seed = seed
+        self.format_file_path = os.path.join(work_dir, "format.xlsx")
+        shutil.copy(format_file_path, self.format_file_path)
+        self.locations = plan_locations(self.rows, seed=seed)
+        self.location = self.locations[0]
+        self.s_loc_code = str(self.location["s_loc"])
+        self.category = self.location["category"]
+        self._paths = {}
+        self._master = None
+
+    def input_rows(self, name):
+        if name == "master":
+            return master_rows(self.locations, self.seed)
+        if name == "hygiene":
+            return hygiene_rows(self.locations, self.seed)
+        if name == "mb52":
+            rows_per_location = min(self.rows, MB52_ROWS_PER_LOCATION)
+            return mb52_rows(self.locations[:self.rows // rows_per_location], rows_per_location, self.seed)
+        return count_sheet_rows(self.location, self.rows, seed=self.seed)
+
+    def path(self, name):
+        """Input file 'master', 'mb52', 'hygiene' or 'countsheet' (also the stack input)"""
+        if name not in self._paths:
+            self._paths[name] = write_rows(os.path.join(self.work_dir, f"{name}.xlsx"), self.input_rows(name))
+        return self._paths[name]
+
+    def master(self):
+        """(master_data, auditor_data) of the benchmarked location"""
+        if self._master is None:
+            from master_data_fetcher import fetch_master_data
+            result = fetch_master_data(self.s_loc_code, self.category, self.path("master"))
+            if result["status"] == "error":
+                raise RuntimeError(result.get("error_message", "Could not read the generated master data"))
+            self._master = (result["master_data"], result["auditor_data"])
+        return self._master
+
+    def workbook(self):
+        """Fresh template workbook and its compiled plan, as a pipeline session holds them"""
+        from template_plan import load_plan
+        wb = load_workbook(self.format_file_path)
+        return wb, load_plan(self.format_file_path, wb=wb)
+
+# Each setup prepares one run outside the timed region and returns the call to time
+
+def setup_fetch_master_data(inputs):
+    from master_data_fetcher import fetch_master_data
+    master_file_path = inputs.path("master")
+    return lambda: fetch_master_data(inputs.s_loc_code, inputs.category, master_file_path)
+
+def setup_process_mb52(inputs):
+    from app_mb52 import process_mb52
+    wb, plan = inputs.workbook()
+    mb52_file_path = inputs.path("mb52")
+    return lambda: process_mb52(inputs.format_file_path, mb52_file_path, inputs.s_loc_code, wb=wb, plan=plan)
+
+def setup_process_count_sheet(inputs):
+    from countsheet import process_count_sheet
+    wb, plan = inputs.workbook()
+    countsheet_file_path = inputs.path("countsheet")
+    return lambda: process_count_sheet(countsheet_file_path, inputs.format_file_path, wb=wb, plan=plan)
+
+def setup_process_stack_data(inputs):
+    from stack import process_stack_data
+    master_data, _ = inputs.master()
+    wb, plan = inputs.workbook()
+    stack_file_path = inputs.path("countsheet")
+    return lambda: process_stack_data(stack_file_path, inputs.format_file_path, master_data, wb=wb, plan=plan)
+
+def filled_stock_sheets(inputs):
+    """Template with the MB52 and stack sheets filled at this size, as the raw material stage finds it"""
+    from app_mb52 import process_mb52
+    from stack import process_stack_data
+    master_data, _ = inputs.master()
+    wb, plan = inputs.workbook()
+    if not process_mb52(inputs.format_file_path, inputs.path("mb52"), inputs.s_loc_code, wb=wb, plan=plan):
+        raise StageFailed("process_mb52 failed while filling the MB52 sheet")
+    if not process_stack_data(inputs.path("countsheet"), inputs.format_file_path, master_data, wb=wb, plan=plan):
+        raise StageFailed("process_stack_data failed while filling the stack sheet")
+    return wb, plan
+
+def setup_process_rm_stack_wise(inputs):
+    from raw_material import process_rm_stack_wise
+    wb, _ = filled_stock_sheets(inputs)
+    return lambda: process_rm_stack_wise(inputs.format_file_path, wb=wb)
+
+def setup_update_annexure_sheet(inputs):
+    from raw_material import annexure_data, update_annexure_sheet
+    master_data, _ = inputs.master()
+    wb, plan = filled_stock_sheets(inputs)
+    processed_data, physical_stock, fumigation_stock = annexure_data(inputs.format_file_path, wb)
+    return lambda: update_annexure_sheet(inputs.format_file_path, processed_data, master_data, wb=wb, plan=plan,
+                                         physical_stock_dict=physical_stock,
+                                         fumigation_stock_dict=fumigation_stock)
+
+def setup_fill_hygiene_sheet(inputs):
+    from hygeine import fill_hygiene_sheet
+    master_data, _ = inputs.master()
+    wb, plan = inputs.workbook()
+    hygiene_file_path = inputs.path("hygiene")
+    return lambda: fill_hygiene_sheet(master_data, inputs.format_file_path, hygiene_file_path, wb=wb, plan=plan)
+
+def setup_header_main(inputs):
+    from header import main as header_main
+    master_data, auditor_data = inputs.master()
+    wb, _ = inputs.workbook()
+    return lambda: header_main(master_data, auditor_data, inputs.format_file_path, inputs.format_file_path, wb=wb)
+
+# name -> (setup, runs at every size). The header stage only reads the
+# template, so it runs once per suite instead of once per input size.
+BENCHMARKS = {
+    "fetch_master_data": (setup_fetch_master_data, True),
+    "process_mb52": (setup_process_mb52, True),
+    "process_count_sheet": (setup_process_count_sheet, True),
+    "process_stack_data": (setup_process_stack_data, True),
+    "process_rm_stack_wise": (setup_process_rm_stack_wise, True),
+    "update_annexure_sheet": (setup_update_annexure_sheet, True),
+    "fill_hygiene_sheet": (setup_fill_hygiene_sheet, True),
+    "header.main": (setup_header_main, False),
+}
+
+def result_key(name, size):
+    return name if size is None else f"{name}[{size}]"
+
+def measure(setup, inputs, repeat):
+    """
+    Best-of-repeat wall time of the call returned by setup, then one more
+    run under tracemalloc for its peak Python allocation. Raises StageFailed
+    when any run reports an error.
+    """
+    samples = []
+    for _ in range(repeat):
+        reset_caches()
+        with StageOutput() as output:
+            call = setup(inputs)
+            started = time.perf_counter()
+            result = call()
+            samples.append(time.perf_counter() - started)
+        output.check(result)
+
+    reset_caches()
+    with StageOutput() as output:
+        call = setup(inputs)
+        tracemalloc.start()
+        try:
+            result = call()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    output.check(result)
+    return {
+        "seconds": round(min(samples), 4),
+        "median_seconds": round(statistics.median(samples), 4),
+        "peak_kb": round(peak / 1024),
+    }
+
+def run_suite(names, sizes, repeat, format_file_path=DEFAULT_FORMAT_FILE_PATH, seed=DEFAULT_SEED):
+    """
+    Run the selected benchmarks at every size; returns the results document.
+    Benchmarks whose stage failed are listed under "failed" instead of "results".
+    """
+    results = {}
+    failed = {}
+    with tempfile.TemporaryDirectory(prefix="adani_benchmark_") as work_root:
+        for size in [None] + list(sizes):
+            selected = [name for name in names if BENCHMARKS[name][1] == (size is not None)]
+            if not selected:
+                continue
+            work_dir = os.path.join(work_root, str(size or "unsized"))
+            os.makedirs(work_dir)
+            inputs = BenchmarkInputs(work_dir, size, format_file_path, seed)
+            for name in selected:
+                key = result_key(name, size)
+                try:
+                    # Stage output would swamp the report
+                    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                        result = measure(BENCHMARKS[name][0], inputs, repeat)
+                except Exception as e:
+                    print(f"❌ {key} failed: {e}")
+                    failed[key] = str(e)
+                    continue
+                result.update({"benchmark": name, "size": size})
+                results[key] = result
+                print(f"{key:<32} {result['seconds']:>9.4f}s  peak {result['peak_kb']:>9} KB")
+    return {
+        "version": BENCHMARK_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "seed": seed,
+        "sizes": list(sizes),
+        "results": results,
+        "failed": failed,
+    }
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Print current against baseline and return the keys whose time or peak
+    memory grew by more than threshold (0.15 = 15%), or whose stage failed
+    """
+    regressions = []
+    failed = current.get("failed", {})
+    for key, base in baseline["results"].items():
+        result = current["results"].get(key)
+        if key in failed:
+            print(f"❌ {key:<32} failed: {failed[key]}")
+            regressions.append(key)
+            continue
+        if result is None:
+            print(f"[INFO] {key}: not in the current run")
+            continue
+        time_change = result["seconds"] / base["seconds"] - 1 if base["seconds"] else 0.0
+        memory_change = result["peak_kb"] / base["peak_kb"] - 1 if base["peak_kb"] else 0.0
+        slower = time_change > threshold and result["seconds"] - base["seconds"] > MIN_SECONDS_DELTA
+        larger = memory_change > threshold and result["peak_kb"] - base["peak_kb"] > MIN_PEAK_KB_DELTA
+        marker = "❌" if slower or larger else "✅"
+        print(f"{marker} {key:<32} {base['seconds']:>9.4f}s -> {result['seconds']:>9.4f}s ({time_change:+.1%})  "
+              f"peak {base['peak_kb']} -> {result['peak_kb']} KB ({memory_change:+.1%})")
+        if slower or larger:
+            regressions.append(key)
+    for key in current["results"]:
+        if key not in baseline["results"]:
+            print(f"[INFO] {key}: no baseline yet")
+    return regressions
+
+def read_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        results = json.load(f)
+    if results.get("version") != BENCHMARK_VERSION:
+        raise ValueError(f"{path} was written by a different benchmark version")
+    return results
+
+def write_results(path, results):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to: {path}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the processing stages at several input sizes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the suite and write the results")
+    run_parser.add_argument("--output", default=DEFAULT_BASELINE_PATH,
+                            help=f"Results file (default {DEFAULT_BASELINE_PATH})")
+
+    compare_parser = commands.add_parser("compare", help="Compare a run against a stored baseline")
+    compare_parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH,
+                                help=f"Baseline file (default {DEFAULT_BASELINE_PATH})")
+    compare_parser.add_argument("--current", help="Results file to compare instead of running the suite")
+    compare_parser.add_argument("--output", help="Also write the current run to this file")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help=f"Allowed slowdown or memory growth (default {DEFAULT_THRESHOLD} = 15%%)")
+
+    for command_parser in (run_parser, compare_parser):
+        command_parser.add_argument("--sizes", type=int, nargs="+",
+                                    help=f"Input sizes in rows (default {' '.join(map(str, DEFAULT_SIZES))}, "
+                                         "or the baseline's sizes when comparing)")
+        command_parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Benchmarks to run")
+        command_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                                    help=f"Timed runs per benchmark, best one kept (default {DEFAULT_REPEAT})")
+        command_parser.add_argument("--seed", type=int,
+                                    help=f"Seed of the generated inputs (default {DEFAULT_SEED}, "
+                                         "or the baseline's seed when comparing)")
+        command_parser.add_argument("--format", default=DEFAULT_FORMAT_FILE_PATH,
+                                    help=f"Template workbook (default {DEFAULT_FORMAT_FILE_PATH})")
+    args = parser.parse_args(argv)
+    only = [name for name in BENCHMARKS if name in args.only] if args.only else None
+
+    if args.command == "run":
+        results = run_suite(only or list(BENCHMARKS), args.sizes or DEFAULT_SIZES, args.repeat, args.format,
+                            DEFAULT_SEED if args.seed is None else args.seed)
+        write_results(args.output, results)
+        if results["failed"]:
+            print(f"❌ {len(results['failed'])} benchmark(s) failed: {', '.join(results['failed'])}")
+            return 1
+        return 0
+
+    try:
+        baseline = read_results(args.baseline)
+        if args.current:
+            current = read_results(args.current)
+        else:
+            in_baseline = {result["benchmark"] for result in baseline["results"].values()}
+            names = only or [name for name in BENCHMARKS if name in in_baseline]
+            seed = baseline.get("seed", DEFAULT_SEED) if args.seed is None else args.seed
+            current = run_suite(names, args.sizes or baseline["sizes"], args.repeat, args.format, seed)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"❌ Could not compare: {e}")
+        return 1
+    if args.output:
+        write_results(args.output, current)
+
+    regressions = compare_results(baseline, current, args.threshold)
+    if regressions:
+        print(f"❌ {len(regressions)} benchmark(s) failed or regressed above {args.threshold:.0%}: "
+              f"{', '.join(regressions)}")
+        return 1
+    print(f"✅ No regressions above {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
 import PyInstaller.__main__
 import os
+import argparse
+from template_plan import load_plan
 
 # Get the current directory
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -11,19 +13,35 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 main_script = os.path.join(current_dir, 'gui.py')
 requirements_file = os.path.join(current_dir, 'requirements.txt')
 
+# onefile: a single exe that unpacks itself to a temp folder on every launch
+# onedir: a folder with the exe and its libraries; starts faster on kiosks
+parser = argparse.ArgumentParser(description="Build the Adani Data Processing executable")
+parser.add_argument('--profile', choices=['onefile', 'onedir'], default='onefile',
+                    help="Bundle layout (default: onefile)")
+profile = parser.parse_args().profile
+
+# Compile the template plan so the bundled app never has to scan format.xlsx
+load_plan(os.path.join(current_dir, 'output', 'format.xlsx'))
+
 # PyInstaller arguments
 args = [
     main_script,
     '--name=Adani_Data_Processing',
-    '--onefile',
+    f'--{profile}',
     '--windowed',
     '--clean',
     '--add-data=README.md;.',
     '--add-data=requirements.txt;.',
     '--add-data=output/format.xlsx;output',
+    '--add-data=output/template_plan.json;output',
+    '--add-data=gradient.svg;.',
     # f'--icon={icon_path}',  # Uncomment when you have an icon
     '--noconfirm',
 ]
 
+if profile == 'onedir':
+    # Unpacked libraries load straight from disk, so compressing them only costs start-up time
+    args.append('--noupx')
+
 # Run PyInstaller
 PyInstaller.__main__.run(args) 
\ No newline at end of file
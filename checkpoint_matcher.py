@@ -0,0 +1,89 @@
+import os
+import json
+import difflib
+import hashlib
+from template_plan import read_json_cache, write_json_cache
+
+MATCHES_FILE_NAME = "hygiene_matches.json"
+OVERRIDES_FILE_NAME = "hygiene_overrides.json"
+MATCHER_VERSION = 1
+MAX_CACHED_MAPPINGS = 32
+FUZZY_CUTOFF = 0.7
+
+# Mappings already loaded or computed in this process, by cache key
+_mappings = {}
+
+def normalize_check_point(check_point):
+    return check_point.lower().strip()
+
+def fingerprint(values):
+    """SHA-256 of an ordered list of header texts"""
+    return hashlib.sha256(json.dumps(list(values), ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def compute_mapping(check_points, input_columns):
+    """
+    Match every distinct check point to an input column: an exact
+    case-insensitive match first, otherwise the closest column name
+    (difflib, cutoff 0.7). Unmatched check points map to None.
+    """
+    input_columns_lower = [col.lower() for col in input_columns]
+    exact = {}
+    for idx, col in enumerate(input_columns_lower):
+        exact.setdefault(col.strip(), input_columns[idx])
+    mapping = {}
+    for check_point in check_points:
+        key = normalize_check_point(check_point)
+        if key in mapping:
+            continue
+        match_col = exact.get(key)
+        if not match_col:
+            close_matches = difflib.get_close_matches(key, input_columns_lower, n=1, cutoff=FUZZY_CUTOFF)
+            if close_matches:
+                match_col = input_columns[input_columns_lower.index(close_matches[0])]
+        mapping[key] = match_col
+    return mapping
+
+def load_overrides(cache_dir):
+    """
+    Manual fixes from hygiene_overrides.json: {"check point text": "Input column"}.
+    A null column forces 'no match' for that check point.
+    """
+    overrides = read_json_cache(os.path.join(cache_dir, OVERRIDES_FILE_NAME))
+    return {normalize_check_point(str(check_point)): col for check_point, col in overrides.items()}
+
+def match_check_points(check_points, input_columns, cache_dir):
+    """
+    Check point (normalized) -> input column for this pair of headers.
+    The mapping is computed once per combination of check points and input
+    columns and stored in hygiene_matches.json under cache_dir, keyed by both
+    fingerprints; hygiene_overrides.json in the same folder is applied on top.
+    """
+    check_points = [check_point for check_point in check_points if check_point]
+    input_columns = list(input_columns)
+    key = f"{fingerprint(normalize_check_point(check_point) for check_point in check_points)}:{fingerprint(input_columns)}"
+
+    mapping = _mappings.get(key)
+    if mapping is None:
+        path = os.path.join(cache_dir, MATCHES_FILE_NAME)
+        cached = read_json_cache(path)
+        entry = cached.get(key)
+        if entry and entry.get("version") == MATCHER_VERSION:
+            mapping = entry["mapping"]
+        else:
+            print("Matching hygiene check points to input columns...")
+            mapping = compute_mapping(check_points, input_columns)
+            cached.pop(key, None)
+            cached[key] = {"version": MATCHER_VERSION, "mapping": mapping}
+            # Keep only the most recently computed header combinations
+            for stale in list(cached)[:-MAX_CACHED_MAPPINGS]:
+                del cached[stale]
+            write_json_cache(path, cached, description="hygiene check point matches")
+        _mappings[key] = mapping
+
+    mapping = dict(mapping)
+    for check_point, col in load_overrides(cache_dir).items():
+        if col is not None and col not in input_columns:
+            print(f"[WARNING] Override for '{check_point}' names unknown input column '{col}', ignored")
+            continue
+        mapping[check_point] = col
+    return mapping
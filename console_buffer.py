@@ -0,0 +1,49 @@
+import shutil
+import tempfile
+import threading
+
+class ConsoleBuffer:
+    """
+    Thread-safe sink for console output.
+    write() only appends to an in-memory list, so stages and worker threads
+    never wait on the GUI; the display takes everything written since its
+    last refresh with take(). The complete log is spooled to a temporary
+    file so the display can drop old lines while save() still writes it all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._spool = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+
+    def write(self, s):
+        if not s:
+            return 0
+        with self._lock:
+            self._pending.append(s)
+            self._spool.write(s)
+        return len(s)
+
+    def take(self):
+        """Everything written since the last call, as one string"""
+        with self._lock:
+            if not self._pending:
+                return ""
+            text = "".join(self._pending)
+            self._pending = []
+        return text
+
+    def save(self, path):
+        """Write the full log, including lines no longer on screen, to path"""
+        with self._lock:
+            self._spool.flush()
+            self._spool.seek(0)
+            try:
+                with open(path, "w", encoding="utf-8") as f:
+                    shutil.copyfileobj(self._spool, f)
+            finally:
+                self._spool.seek(0, 2)
+
+    def close(self):
+        with self._lock:
+            self._spool.close()
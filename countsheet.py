@@ -1,58 +1,31 @@
 import pandas as pd
 import openpyxl
 from openpyxl.utils import get_column_letter
-from copy import copy
+from openpyxl.cell.cell import Cell
+from openpyxl.styles.cell_style import StyleArray
+from template_plan import has_label
+from label_index import LabelIndex
+from row_layout import move_block_down
+from instrumentation import traced, phase
+from report_render import RowBlock, add_row_block, row_blocks_enabled
 
-def find_signoff_section(sheet):
+def find_signoff_section(sheet, search_from=1, index=None):
     """Find the start and end row of sign-off section"""
-    start_row = None
-    end_row = None
-    
+    index = index or LabelIndex(sheet)
+
     # Find where the sign-off section starts by looking for "S Loc Incharge"
-    for row in range(1, sheet.max_row + 1):
-        for col in range(1, sheet.max_column + 1):
-            cell_value = sheet.cell(row=row, column=col).value
-            if cell_value and "S Loc Incharge" in str(cell_value):
-                start_row = row
-                # Find the end of sign-off section (first empty row after start)
-                for end_r in range(start_row + 1, sheet.max_row + 1):
-                    is_empty = True
-                    for c in range(1, sheet.max_column + 1):
-                        if sheet.cell(row=end_r, column=c).value:
-                            is_empty = False
-                            break
-                    if is_empty:
-                        end_row = end_r - 1
-                        break
-                if not end_row:  # If no empty row found
-                    end_row = sheet.max_row
-                return start_row, end_row
-    
-    return None, None
+    start_row, _ = index.find_containing("S Loc Incharge", min_row=search_from)
+    if start_row is None:
+        return None, None
+
+    # Find the end of sign-off section (first empty row after start)
+    empty_row = index.first_empty_row(start_row + 1)
+    end_row = empty_row - 1 if empty_row else sheet.max_row
+    return start_row, end_row
 
 def move_range_down(sheet, start_row, end_row, shift_amount):
     """Move a range of cells down by shift_amount rows"""
-    if start_row is None or end_row is None:
-        return
-        
-    # Move from bottom to top to avoid overwriting
-    for row in range(end_row, start_row - 1, -1):
-        for col in range(1, sheet.max_column + 1):
-            source_cell = sheet.cell(row=row, column=col)
-            target_cell = sheet.cell(row=row + shift_amount, column=col)
-            
-            # Copy value and style
-            target_cell.value = source_cell.value
-            if source_cell.has_style:
-                target_cell._style = copy(source_cell._style)
-            
-            # Clear source cell
-            source_cell.value = None
-
-def copy_cell_format(source_cell, target_cell):
-    """Copy cell format from source to target"""
-    if source_cell.has_style:
-        target_cell._style = copy(source_cell._style)
+    move_block_down(sheet, start_row, end_row, shift_amount)
 
 def get_column_index_by_header(headers, header_name):
     """Get the column index (1-based) for a given header name"""
@@ -61,18 +34,29 @@ def get_column_index_by_header(headers, header_name):
     except ValueError:
         return None
 
-def process_count_sheet(input_file, output_file):
+@traced("process_count_sheet")
+def process_count_sheet(input_file, output_file, wb=None, plan=None):
+    """Write the count sheet rows; errors are raised, so it always returns True"""
     # Read the input file
+    phase("read input")
     input_df = pd.read_excel(input_file)
     
-    # Load the template workbook
-    workbook = openpyxl.load_workbook(output_file)
+    # Load the template workbook (or use the pipeline session's one)
+    if wb is None:
+        phase("load workbook")
+    workbook = wb if wb is not None else openpyxl.load_workbook(output_file)
     count_sheet = workbook['Count Sheet']
     
-    # Find the sign-off section
-    signoff_start, signoff_end = find_signoff_section(count_sheet)
+    # Find the sign-off section (start from the compiled anchor when it still matches)
+    phase("anchor search")
+    sign_off = plan.sheet('Count Sheet').get("sign_off", {}) if plan else {}
+    search_from = 1
+    if has_label(count_sheet, sign_off.get("row"), sign_off.get("column"), "S Loc Incharge", exact=False):
+        search_from = sign_off["row"]
+    signoff_start, signoff_end = find_signoff_section(count_sheet, search_from)
     
     # Calculate required rows and move sign-off section if needed
+    phase("row insertion")
     data_rows = len(input_df)
     if signoff_start is not None:
         current_data_space = signoff_start - 2  # Subtract header row
@@ -81,6 +65,7 @@ def process_count_sheet(input_file, output_file):
             move_range_down(count_sheet, signoff_start, signoff_end, shift_amount)
     
     # Get headers from the count sheet (row 1)
+    phase("write rows")
     headers = []
     for col in range(1, count_sheet.max_column + 1):
         cell = count_sheet.cell(row=1, column=col)
@@ -91,34 +76,75 @@ def process_count_sheet(input_file, output_file):
     diff_col = get_column_index_by_header(headers, "Diff")
     gross_qty_col = get_column_index_by_header(headers, "Gross QTY")
     book_stock_col = get_column_index_by_header(headers, "Item QTY As Per book Stock")
+    diff_template = None
+    if diff_col and data_rows:
+        if gross_qty_col and book_stock_col:
+            # Create Excel formula for Diff column with ABS for absolute value
+            diff_template = f"=ABS({get_column_letter(gross_qty_col)}{{row}}-{get_column_letter(book_stock_col)}{{row}})"
+        else:
+            print("[WARNING] Count Sheet has no 'Gross QTY' or 'Item QTY As Per book Stock' header; "
+                  "no Diff formula is written")
     
-    # Store reference cells from the second row
-    reference_cells = {}
-    for col in range(1, len(headers) + 1):
-        reference_cells[col] = count_sheet.cell(row=2, column=col)
+    # Reference styles of the second row, from the compiled plan when it describes this sheet
+    sheet_plan = plan.sheet('Count Sheet') if plan else {}
+    if sheet_plan.get("headers") == headers and sheet_plan.get("data_row_styles"):
+        reference_styles = sheet_plan["data_row_styles"][:len(headers)]
+    else:
+        reference_styles = [count_sheet.cell(row=2, column=col)._style for col in range(1, len(headers) + 1)]
+    reference_styles = [StyleArray(style) if style is not None and any(style) else None
+                        for style in reference_styles]
     
-    # Start writing from row 2 (after headers)
-    current_row = 2
+    # Header -> input column position, resolved once
+    input_columns = list(input_df.columns)
+    value_columns = [(col, input_columns.index(header)) for col, header in enumerate(headers, start=1)
+                     if col != diff_col and header in input_columns]
     
-    # Write data row by row
-    for _, row in input_df.iterrows():
-        for col, header in enumerate(headers, start=1):
-            target_cell = count_sheet.cell(row=current_row, column=col)
-            
-            # Handle Diff column specially
-            if col == diff_col:
-                # Create Excel formula for Diff column with ABS for absolute value
-                gross_qty_cell = get_column_letter(gross_qty_col) + str(current_row)
-                book_stock_cell = get_column_letter(book_stock_col) + str(current_row)
-                target_cell.value = f"=ABS({gross_qty_cell}-{book_stock_cell})"
-            elif header in row:
-                target_cell.value = row[header]
-            
-            # Copy format from reference cell
-            if col in reference_cells:
-                copy_cell_format(reference_cells[col], target_cell)
-        
-        current_row += 1
+    # Write all rows from the DataFrame's underlying array, starting at row 2 (after headers)
+    write_count_rows(count_sheet, input_df.to_numpy(), 2, value_columns, reference_styles,
+                     diff_col, diff_template)
     
     # Save the workbook
-    workbook.save(output_file)
+    if wb is None:
+        phase("save")
+        workbook.save(output_file)
+    return True
+
+def write_count_rows(sheet, values, first_row, value_columns, reference_styles, diff_col=None, diff_template=None):
+    """
+    Write input rows in bulk, one cell per header column: the value at its
+    planned input position, the Diff formula from its template and the
+    reference style of the column. Without a template no Diff formula is
+    written; the column only gets its style.
+    """
+    if diff_template is None:
+        diff_col = None
+    sheet_cells = sheet._cells
+    positions = dict(value_columns)
+    # One entry per header column: (column, input position or None, style id or None)
+    columns = [(col, positions.get(col), style) for col, style in enumerate(reference_styles, start=1)]
+
+    if row_blocks_enabled(sheet):
+        # Stream engine: keep the rows as column values, written out at save
+        block_columns = {}
+        for col, position, style in columns:
+            if col == diff_col:
+                block_columns[col] = [diff_template.format(row=row) for row in range(first_row, first_row + len(values))]
+            elif position is not None:
+                block_columns[col] = values[:, position]
+        styles = {col: style for col, _, style in columns if style is not None}
+        add_row_block(sheet, RowBlock(first_row, len(values), block_columns, styles))
+        return
+
+    for row, row_values in enumerate(values, start=first_row):
+        for col, position, style in columns:
+            # sheet.cell() without its argument checks, for this hot loop
+            cell = sheet_cells.get((row, col))
+            if cell is None:
+                cell = sheet_cells[(row, col)] = Cell(sheet, row=row, column=col)
+            if col == diff_col:
+                cell.value = diff_template.format(row=row)
+            elif position is not None:
+                cell.value = row_values[position]
+            if style is not None:
+                # Every cell needs its own array: openpyxl updates it in place on later style changes
+                cell._style = StyleArray(style)
@@ -0,0 +1,361 @@
+import os
+import sys
+import random
+import argparse
+from openpyxl import Workbook
+
+DEFAULT_SEED = 1
+DEFAULT_LOCATIONS = 20
+DEFAULT_STACK_ROWS = 40
+DEFAULT_MB52_ROWS = 30
+DEFAULT_FUMIGATION_SHARE = 0.3
+DEFAULT_CATEGORY_MIX = {"Wheat": 0.7, "Paddy/Rice": 0.3}
+DEFAULT_QUARTER = "Q1 FY 25-26"
+DEFAULT_MONTH = "May'25"
+
+FIRST_S_LOC = 8001
+
+MASTER_FILE_NAME = "master.xlsx"
+MB52_FILE_NAME = "mb52.xlsx"
+HYGIENE_FILE_NAME = "hygiene.xlsx"
+# Per-location inputs, named the way batch.py expands {s_loc} and {category}
+COUNTSHEET_PATTERN = os.path.join("countsheet", "{s_loc}_{category}.xlsx")
+STACK_PATTERN = os.path.join("stack", "{s_loc}_{category}.xlsx")
+
+# Column headers exactly as in the sample inputs under input/
+MASTER_GROUP_HEADERS = {10: "In charge at S LOC", 12: "HO SPOC", 15: "Auditor's Details"}
+MASTER_HEADERS = [
+    None, "Sr No.", "Product Category", "Plant", "S Loc", "City", "WSP Agency", "Warehouse Name",
+    "Address", "Contact Person", "Contact No.", "Name", "Email Id", "Contact No.", "No. of Auditors",
+    "Auditor's Name", "Auditor's Contact No.", "Auditor's Email ID",
+]
+MB52_GROUP_HEADERS = {9: "For Annexure", 10: "For Mb52"}
+MB52_HEADERS = [
+    None, "Plant", "Material", "Material Description", "Include/ Exclude", "Name 1", "Material Type",
+    "Material Group", "Storage Location", "S Loc Code", "Descr. of Storage Loc.", "Base Unit of Measure",
+    "Unrestricted", "Quality Inspection", "Blocked", "Returns", "Transit and Transfer",
+    "Restricted-Use Stock", "Special Stock", "Total Qty", "Value Unrestricted", "Value in QualInsp.",
+    "Value BlockedStock", "Value Rets Blocked", "Val. in Trans./Tfr", "Value Restricted", "Total Value",
+]
+COUNTSHEET_HEADERS = [
+    "Sr No", "JW/S Loc/Depo Name", "JW/S Loc/Depo Code", "Material Code", "Material Name", "Item Type",
+    "Item Sub Type", "Brand", "Location", "UOM", "Batch Number", "Item MRP", "Item Rate", "Item Value",
+    "Field 1", "Field 2", "Field 3", "Field 4", "Field 5", "Item QTY As Per book Stock", "Stack No",
+    "Normal Bag", "Madeup Bag", "Gross QTY", "Bardana Weight", "Physical Stock", "WIP Stock", "Fumigation",
+    "Good Stock", "Damage Stock", "Stock Type", "Leakage Stock", "Diff", "Remarks", "Image",
+    "Variance Remarks", "Action",
+]
+HYGIENE_HEADERS = [
+    "Sr No.", "Month", "Category", "Product", "Zone", "Plant/Depo code", "S Loc Code", "Vendor/WH/Depot Name",
+    "Address", "City", "State", "Incharge Name", "Incharge Contact Number", "No. of Auditors requirement",
+    "GSTIN", "Verifier Name", "Status", "Remark", "Verification Date & Time", "User", "Date", "Time",
+]
+# Each check point column is followed by a "Photos of ..." column
+HYGIENE_CHECK_POINTS = [
+    ("Whether similar stock is arranged/stacked on FIFO basis ",
+     "Photos of stock arranged/stacked in FIFO basis"),
+    ("Whether the stock is kept in countable condition",
+     "Photos of the stock is kept in countable condition"),
+    ("Whether stack card is present indicating the no. of bags",
+     "Photos of stack card is present indicating the no. of bags"),
+    ("Whether separate area for damaged stocks is demarketed in the storage location and are the damaged stock properly stored",
+     "Photos of separate area for damaged stocks is demarketed in the storage location and are the damaged stock properly stored"),
+    ("Whether stocks not related to AWL lying in the Storage location.",
+     "Photos of stocks not related to AWL lying in the Storage location."),
+    ("Whether any stocks are kept outside the storage location",
+     "Photos of any stocks are kept outside the storage location"),
+    ("Any stock under fumigation/ not in countable position",
+     "Photos of any stock under fumigation/ not in countable position"),
+    ("Approx weight of each bag (Kgs)",
+     "Photos of approx weight of each bag (Kgs)"),
+    ("Whether hygiene is maintained in the storage location.",
+     "Photos of hygiene is maintained in the storage location."),
+    ("Whether all emergency numbers are well displayed.",
+     "Photos of all emergency numbers are well displayed."),
+    ("Whether fire extinguishers are available and are not expired",
+     "Photos of fire extinguishers are available and are not expired"),
+    ("Whether the roofs are completely leak proof and properly covering the storage location.",
+     "Photos of the roofs are completely leak proof and properly covering the storage location."),
+    ("Whether Electric wiring in the storage location is in perfect condition with no open loose wiring",
+     "Photos of Electric wiring in the storage location is in perfect condition with no open loose wiring"),
+    ("Any non-normal observations at the storage location.",
+     "Photos of any non-normal observations at the storage location."),
+]
+
+# Raw materials counted in the stacks, by category: (material, description, material group)
+MATERIALS = {
+    "Wheat": [
+        ("R31501002", "WHEAT GRADE 1", "R31501"),
+        ("R31501003", "WHEAT GRADE 2", "R31501"),
+        ("R31501004", "WHEAT GRADE 3", "R31501"),
+        ("R31501005", "WHEAT MILLING", "R31501"),
+        ("R31501005V1", "WHEAT MILLING (V1)", "R31501"),
+        ("R31501041", "WHEAT SHARBATI", "R31501"),
+        ("R31501050", "WHEAT LOKWAN", "R31501"),
+    ],
+    "Paddy/Rice": [
+        ("R31403053", "SONA MASURI HEAD RICE (STEAM)", "R31403"),
+        ("R31403187", "SONAM STEAM HEAD RICE DOUBLE DRY", "R31403"),
+        ("R31403188", "SONAM STEAM HEAD RICE", "R31403"),
+        ("R31403191", "SONAM SIZER RICE STEAM", "R31403"),
+        ("R31407049", "BADSHAH BHOG RAW HEAD RICE", "R31407"),
+        ("R31407188", "GOVIND BHOG HEAD RICE RAW (CY-2021-22)", "R31407"),
+        ("R31407201", "GOVIND BHOG RAW HEAD RICE", "R31407"),
+        ("R31407208", "VISHNU BHOG RAW HEAD RICE", "R31407"),
+        ("R31407214", "SONA MASURI SIZER RICE STEAM", "R31407"),
+        ("R31407223", "SONAM RAW HEAD RICE", "R31407"),
+    ],
+}
+# Packaging and consumables stocked at every location, excluded from the annexure
+PACKING_MATERIALS = [
+    ("P29000049", "PP BAGS - RICE"),
+    ("P29162002", "BAG 10KG FORTUNE SONA MASOORI REGULAR"),
+    ("P29166001", "BAG 25KG SONA MASOORI RICE REGULAR"),
+    ("P29166002", "BAG 5KG FORTUNE SONA MASOORI REGULAR"),
+    ("P29169001", "BAG 25KG GUJARAT SPL JEERASAR RICE"),
+    ("P29199068", "BAG 26KG RELIANCE GOOD LIFE DAILY RICE"),
+    ("P49000001", "WOODEN PALLETS"),
+]
+# Plant-level storage that shares the plant's MB52 rows
+TRANSIT_STORAGE = [("TRLS", "TRANSIT LOSS"), ("SHRT", "SHORTAGE"), ("INSC", "IN SCRAP")]
+
+PLANTS = [
+    ("BR01", "Bihar", ["Mohania", "Buxar", "Patna"]),
+    ("DL01", "Delhi", ["Delhi"]),
+    ("J041", "West Bengal", ["Kolkata"]),
+    ("KA01", "Karnataka", ["Bangalore"]),
+    ("MP03", "Madhya Pradesh", ["Jabalpur", "Chhindwara"]),
+    ("MP07", "Madhya Pradesh", ["Dabra", "Ashoknagar"]),
+    ("UP09", "Uttar Pradesh", ["Mathura"]),
+    ("UP17", "Uttar Pradesh", ["Varansi", "Etah"]),
+]
+FIRST_NAMES = ["Anvesh", "Dhaval", "Sahil", "Bibhuti", "Sachin", "Anand", "Likith", "Piyush", "Rohit",
+               "Aditya", "Ravi", "Naveen", "Danish", "Paritosh", "Anubhav", "Vishal", "Ankit"]
+LAST_NAMES = ["Dubey", "Shah", "Kumar", "Sahu", "Singh", "Verma", "Gupta", "Yadav"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+def seeded_random(seed, stream):
+    """
+    Random generator for one output file. Each file gets its own stream, so
+    changing the size of one input does not change the contents of the others.
+    """
+    return random.Random(f"{seed}:{stream}")
+
+def parse_category_mix(spec):
+    """Parse 'Wheat=0.7,Paddy/Rice=0.3' into {'Wheat': 0.7, 'Paddy/Rice': 0.3}"""
+    mix = {}
+    for item in spec.split(","):
+        category, sep, weight = item.partition("=")
+        category = category.strip()
+        if category not in MATERIALS:
+            raise ValueError(f"Unknown category '{category}' (expected one of {', '.join(MATERIALS)})")
+        mix[category] = float(weight) if sep else 1.0
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("The category mix needs at least one positive weight")
+    return mix
+
+def person_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+def phone_number(rng):
+    return rng.randint(7000000000, 9999999999)
+
+def plan_locations(count, category_mix=None, seed=DEFAULT_SEED):
+    """
+    One entry per (S Loc, category) pair of the dataset. Locations are
+    numbered from FIRST_S_LOC and each stores one category drawn from the mix.
+    """
+    category_mix = category_mix or DEFAULT_CATEGORY_MIX
+    rng = seeded_random(seed, "locations")
+    categories = list(category_mix)
+    weights = [category_mix[category] for category in categories]
+    locations = []
+    for number in range(count):
+        plant, state, cities = rng.choice(PLANTS)
+        city = rng.choice(cities)
+        locations.append({
+            "s_loc": FIRST_S_LOC + number,
+            "category": rng.choices(categories, weights)[0],
+            "plant": plant,
+            "state": state,
+            "city": city,
+            "warehouse": f"{rng.choice(LAST_NAMES).upper()} WH {number + 1}",
+            "address": f"Plot no. {rng.randint(1, 400)}, {city}, {state}",
+            "incharge": person_name(rng),
+            "incharge_phone": phone_number(rng),
+            "auditors": [person_name(rng) for _ in range(rng.choice([1, 1, 1, 2, 3]))],
+        })
+    return locations
+
+def write_rows(path, rows, sheet_title="Sheet1"):
+    """Write rows to the only sheet of a new workbook, streaming them to disk"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_title)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return path
+
+def group_header_row(headers, group_headers):
+    row = [None] * len(headers)
+    for col, label in group_headers.items():
+        row[col - 1] = label
+    return row
+
+def master_rows(locations, seed=DEFAULT_SEED, quarter=DEFAULT_QUARTER):
+    rng = seeded_random(seed, "master")
+    yield [None, "Audit Quarter:", quarter]
+    yield group_header_row(MASTER_HEADERS, MASTER_GROUP_HEADERS)
+    yield MASTER_HEADERS
+    spoc = person_name(rng)
+    spoc_email = spoc.lower().replace(" ", ".") + "@example.com"
+    spoc_phone = phone_number(rng)
+    for number, location in enumerate(locations, start=1):
+        auditors = location["auditors"]
+        yield [
+            None, number, location["category"], location["plant"], location["s_loc"], location["city"], None,
+            location["warehouse"], location["address"], location["incharge"], location["incharge_phone"],
+            spoc, spoc_email, spoc_phone, len(auditors), " / ".join(auditors), phone_number(rng),
+            auditors[0].lower().replace(" ", ".") + "@example.com",
+        ]
+
+def mb52_rows(locations, rows_per_location=DEFAULT_MB52_ROWS, seed=DEFAULT_SEED):
+    """
+    Plant-wide MB52 export: for every location its raw materials (included
+    in the annexure), packing materials and a share of transit storage rows
+    """
+    rng = seeded_random(seed, "mb52")
+    yield [None] * len(MB52_HEADERS)
+    yield group_header_row(MB52_HEADERS, MB52_GROUP_HEADERS)
+    yield MB52_HEADERS
+    for location in locations:
+        materials = MATERIALS[location["category"]]
+        for number in range(rows_per_location):
+            storage, storage_name = location["s_loc"], location["warehouse"]
+            if number < len(materials):
+                material, description, group = materials[number]
+                include, material_type, unit = "Include", "ZALB", "MT"
+                quantity = round(rng.uniform(1, 800), 3)
+                rate = rng.uniform(25000, 75000)
+            else:
+                material, description = rng.choice(PACKING_MATERIALS)
+                include, material_type, group, unit = "Exclude", "ZERP", "P58000", "EA"
+                quantity = float(rng.randint(100, 30000))
+                rate = rng.uniform(5, 30)
+                if rng.random() < 0.25:
+                    storage, storage_name = rng.choice(TRANSIT_STORAGE)
+            blocked = round(quantity * 0.01, 3) if rng.random() < 0.1 else 0
+            value = round(quantity * rate, 2)
+            blocked_value = round(blocked * rate, 2)
+            yield [
+                None, location["plant"], material, description, include, f"AWL-DEPOT-{location['city'].upper()}",
+                material_type, group, storage, location["s_loc"], storage_name, unit,
+                quantity, 0, blocked, 0, 0, 0, "", round(quantity + blocked, 3),
+                value, 0, blocked_value, 0, 0, 0, round(value + blocked_value, 2),
+            ]
+
+def count_sheet_rows(location, rows, fumigation_share=DEFAULT_FUMIGATION_SHARE, seed=DEFAULT_SEED):
+    """Auditor count sheet for one location: one row per stack, General or Fumigation"""
+    rng = seeded_random(seed, f"countsheet:{location['s_loc']}")
+    materials = MATERIALS[location["category"]]
+    book_stock = {material: round(rng.uniform(100, 300), 1) for material, _, _ in materials}
+    yield COUNTSHEET_HEADERS
+    for number in range(1, rows + 1):
+        material, description, _ = rng.choice(materials)
+        gross = round(rng.uniform(100, 250), 2)
+        stock_type = "Fumigation" if rng.random() < fumigation_share else "General"
+        yield [
+            number, location["warehouse"], location["s_loc"], material, description, location["category"],
+            rng.choice(WEEKDAYS), "NA", "NA", "MT", "NA", "NA", "NA", "NA", "NA", "NA", "NA", "NA", 3,
+            book_stock[material], number, rng.randint(1000, 2500), rng.randint(0, 200), gross, 1.3,
+            "0", "0", "0", "0", "0", stock_type, "0", round(book_stock[material] - gross, 2), "0", "",
+            rng.choice(["", "", "GRN Pending"]), "",
+        ]
+
+def hygiene_answer(rng, check_point):
+    if check_point.startswith("Approx weight"):
+        return rng.choice(["50", "26", "25"])
+    if check_point.startswith("Any non-normal"):
+        return rng.choice(["NA", "NA", "Rodent activity observed"])
+    return rng.choices(["Yes", "No"], [0.85, 0.15])[0]
+
+def hygiene_rows(locations, seed=DEFAULT_SEED, month=DEFAULT_MONTH):
+    rng = seeded_random(seed, "hygiene")
+    yield HYGIENE_HEADERS + [header for pair in HYGIENE_CHECK_POINTS for header in pair]
+    for number, location in enumerate(locations, start=1):
+        row = [
+            number, month, location["category"], None, None, location["plant"], location["s_loc"],
+            location["warehouse"], location["address"], location["city"], location["state"],
+            location["incharge"], location["incharge_phone"], len(location["auditors"]),
+            None, None, None, None, None, None, None, None,
+        ]
+        for check_point, _ in HYGIENE_CHECK_POINTS:
+            row += [hygiene_answer(rng, check_point), None]
+        yield row
+
+def location_file_name(pattern, location):
+    # Same character rules as batch.safe_name
+    category = "".join(ch if ch.isalnum() or ch in "-_." else "-" for ch in location["category"])
+    return pattern.format(s_loc=location["s_loc"], category=category)
+
+def generate_dataset(output_dir, locations=DEFAULT_LOCATIONS, stack_rows=DEFAULT_STACK_ROWS,
+                     mb52_rows_per_location=DEFAULT_MB52_ROWS, category_mix=None,
+                     fumigation_share=DEFAULT_FUMIGATION_SHARE, seed=DEFAULT_SEED):
+    """
+    Write a master, MB52 and hygiene workbook covering every location, plus
+    a count sheet and a stack workbook per location. The same arguments
+    always produce the same cell contents. Returns the written paths.
+    """
+    planned = plan_locations(locations, category_mix, seed)
+    paths = {
+        "locations": [(location["s_loc"], location["category"]) for location in planned],
+        "master": write_rows(os.path.join(output_dir, MASTER_FILE_NAME), master_rows(planned, seed),
+                             "Sample Audit Plan"),
+        "mb52": write_rows(os.path.join(output_dir, MB52_FILE_NAME),
+                           mb52_rows(planned, mb52_rows_per_location, seed), "Mb52"),
+        "hygiene": write_rows(os.path.join(output_dir, HYGIENE_FILE_NAME), hygiene_rows(planned, seed),
+                              "Worksheet"),
+        "countsheet": os.path.join(output_dir, COUNTSHEET_PATTERN),
+        "stack": os.path.join(output_dir, STACK_PATTERN),
+    }
+    for location in planned:
+        rows = list(count_sheet_rows(location, stack_rows, fumigation_share, seed))
+        # The stack stage reads the same count sheet layout
+        write_rows(os.path.join(output_dir, location_file_name(COUNTSHEET_PATTERN, location)), rows)
+        write_rows(os.path.join(output_dir, location_file_name(STACK_PATTERN, location)), rows)
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic audit dataset for load testing")
+    parser.add_argument("output_dir", help="Directory for the generated workbooks")
+    parser.add_argument("--locations", type=int, default=DEFAULT_LOCATIONS,
+                        help=f"Number of S Loc / category pairs (default {DEFAULT_LOCATIONS})")
+    parser.add_argument("--stack-rows", type=int, default=DEFAULT_STACK_ROWS,
+                        help=f"Count sheet and stack rows per location (default {DEFAULT_STACK_ROWS})")
+    parser.add_argument("--mb52-rows", type=int, default=DEFAULT_MB52_ROWS,
+                        help=f"MB52 rows per location (default {DEFAULT_MB52_ROWS})")
+    parser.add_argument("--category-mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_CATEGORY_MIX.items()),
+                        help="Share of locations per category, e.g. 'Wheat=0.7,Paddy/Rice=0.3'")
+    parser.add_argument("--fumigation-share", type=float, default=DEFAULT_FUMIGATION_SHARE,
+                        help=f"Share of stacks under fumigation (default {DEFAULT_FUMIGATION_SHARE})")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"Random seed (default {DEFAULT_SEED})")
+    args = parser.parse_args(argv)
+
+    try:
+        category_mix = parse_category_mix(args.category_mix)
+        paths = generate_dataset(args.output_dir, args.locations, args.stack_rows, args.mb52_rows,
+                                 category_mix, args.fumigation_share, args.seed)
+    except (OSError, ValueError) as e:
+        print(f"❌ Could not generate the dataset: {e}")
+        return 1
+    print(f"✅ Generated {len(paths['locations'])} locations in {args.output_dir}")
+    print(f"Master: {paths['master']}")
+    print(f"MB52: {paths['mb52']}")
+    print(f"Hygiene: {paths['hygiene']}")
+    print(f"Count sheets: {paths['countsheet']}")
+    print(f"Stacks: {paths['stack']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import re
+import threading
+from collections import OrderedDict
+import xml.etree.ElementTree as ET
+
+# The linear gradient of gradient.svg, used when the SVG is not available.
+# The vector is in objectBoundingBox units: fractions of width and height.
+DEFAULT_VECTOR = (0.146, 0.146, 0.854, 0.854)
+DEFAULT_STOPS = [
+    (0.0, (255, 255, 196)),
+    (0.5, (255, 97, 100)),
+    (1.0, (176, 0, 18)),
+]
+
+MAX_CACHED_SIZES = 8
+
+SVG_NAMESPACE = "{http://www.w3.org/2000/svg}"
+
+def _parse_color(value):
+    """'rgb(255, 97, 100)' or '#ff6164' -> (255, 97, 100)"""
+    value = value.strip()
+    if value.startswith("#") and len(value) == 7:
+        return tuple(int(value[i:i + 2], 16) for i in (1, 3, 5))
+    channels = re.findall(r"\d+", value)
+    if value.startswith("rgb") and len(channels) == 3:
+        return tuple(int(channel) for channel in channels)
+    raise ValueError(f"Unsupported stop color: {value}")
+
+def _parse_offset(value):
+    value = value.strip()
+    if value.endswith("%"):
+        return float(value[:-1]) / 100
+    return float(value)
+
+def load_gradient(svg_path):
+    """
+    Read the first linearGradient of an SVG file as (vector, stops).
+    Falls back to the built-in gradient when the file is missing or unreadable.
+    """
+    try:
+        gradient = next(ET.parse(svg_path).getroot().iter(f"{SVG_NAMESPACE}linearGradient"))
+        vector = tuple(_parse_offset(gradient.get(name, default))
+                       for name, default in zip(("x1", "y1", "x2", "y2"), ("0", "0", "1", "0")))
+        stops = [(_parse_offset(stop.get("offset", "0")), _parse_color(stop.get("stop-color", "")))
+                 for stop in gradient.iter(f"{SVG_NAMESPACE}stop")]
+        if not stops:
+            raise ValueError("gradient has no stops")
+        return vector, stops
+    except (OSError, StopIteration, ET.ParseError, ValueError):
+        return DEFAULT_VECTOR, DEFAULT_STOPS
+
+def render_gradient(width, height, vector=DEFAULT_VECTOR, stops=DEFAULT_STOPS):
+    """
+    RGB pixels (height x width x 3, uint8) of a linear gradient drawn directly
+    at the requested size, with SVG objectBoundingBox and pad semantics.
+    """
+    # Imported here so the GUI can show its window before numpy loads
+    import numpy as np
+
+    x1, y1, x2, y2 = vector
+    dx, dy = x2 - x1, y2 - y1
+    length = dx * dx + dy * dy or 1.0
+    # Position of each pixel centre along the gradient vector, 0..1
+    u = (np.arange(width, dtype=np.float32) + 0.5) / width
+    v = (np.arange(height, dtype=np.float32) + 0.5) / height
+    t = ((u[None, :] - x1) * dx + (v[:, None] - y1) * dy) / length
+    t = np.clip(t, 0.0, 1.0)
+
+    offsets = np.array([offset for offset, _ in stops], dtype=np.float32)
+    colors = np.array([color for _, color in stops], dtype=np.float32)
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    for channel in range(3):
+        pixels[:, :, channel] = np.rint(np.interp(t, offsets, colors[:, channel]))
+    return pixels
+
+class GradientCache:
+    """
+    Rendered gradients keyed by (width, height), keeping the most recently used sizes.
+    Safe to render from a background thread while the GUI thread reads.
+    """
+
+    def __init__(self, vector=DEFAULT_VECTOR, stops=DEFAULT_STOPS, max_sizes=MAX_CACHED_SIZES):
+        self.vector = vector
+        self.stops = stops
+        self.max_sizes = max_sizes
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, width, height):
+        """Cached pixels for this size, or None"""
+        key = (width, height)
+        with self._lock:
+            if key in self._images:
+                self._images.move_to_end(key)
+            return self._images.get(key)
+
+    def render(self, width, height):
+        """Pixels for this size, rendering and caching them when needed"""
+        pixels = self.get(width, height)
+        if pixels is None:
+            pixels = render_gradient(width, height, self.vector, self.stops)
+            with self._lock:
+                self._images[(width, height)] = pixels
+                while len(self._images) > self.max_sizes:
+                    self._images.popitem(last=False)
+        return pixels
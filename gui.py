@@ -4,15 +4,17 @@ from tkinter import ttk, filedialog, messagebox
 from io import StringIO
 import os
 import subprocess
-from master_data_fetcher import fetch_master_data
-from header import main as header_main
-from hygeine import fill_hygiene_sheet
-from app_mb52 import process_mb52
-from countsheet import process_count_sheet
-from stack import process_stack_data
-from raw_material import process_raw_material
-import openpyxl
-from PIL import Image, ImageTk
+from concurrent.futures import ThreadPoolExecutor
+import time
+import json
+import threading
+import importlib
+from job_runner import Job, JobRunner
+from instrumentation import write_trace
+from console_buffer import ConsoleBuffer
+from gradient import load_gradient, GradientCache
+# pandas, openpyxl, numpy, PIL and the stage modules are imported on first
+# use (or by the background warm-up) so the window appears without waiting for them
 
 # For PyInstaller compatibility
 def resource_path(relative_path):
@@ -50,17 +52,199 @@ BUTTON_WIDTH = 15
 LABEL_WIDTH = 20
 ENTRY_WIDTH = 50
 
+# How often the Tk thread picks up worker events and console output
+JOB_POLL_INTERVAL_MS = 100
+
+# The console pane is refreshed on a timer and keeps only its last lines;
+# "Save Log" writes the complete output
+CONSOLE_FLUSH_INTERVAL_MS = 100
+CONSOLE_MAX_LINES = 2000
+
+# Background gradient is redrawn once resizing has paused this long
+BG_DEBOUNCE_MS = 150
+BG_POLL_INTERVAL_MS = 30
+
+# Modules imported in the background once the window is up; ADANI_WARM_UP=0 turns this off
+WARM_UP_MODULES = (
+    "numpy", "PIL.Image", "PIL.ImageTk", "pandas", "openpyxl",
+    "master_data_fetcher", "header", "hygeine", "app_mb52",
+    "countsheet", "stack", "raw_material", "pipeline",
+)
+WARM_UP_ENV = "ADANI_WARM_UP"
+WARM_UP_DELAY_MS = 200
+
+# measure_startup.py sets this to a file path; the GUI writes its startup
+# timestamps there and exits once warm-up has finished
+STARTUP_PROBE_ENV = "ADANI_STARTUP_PROBE"
+
+def warm_up_imports():
+    """Import the heavy modules ahead of the first stage run"""
+    for module_name in WARM_UP_MODULES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            print(f"Note: Could not preload {module_name}: {str(e)}")
+
+REQUIRED_INPUT_ERRORS = {
+    "s_loc_code": "Please enter S Loc Code",
+    "category": "Please select a category",
+    "master_file_path": "Please select master file",
+    "hygiene_input_file_path": "Please select hygiene input file",
+    "mb52_input_file_path": "Please select MB52 input file",
+    "countsheet_input_file_path": "Please select Count Sheet input file",
+    "stack_input_file_path": "Please select Stack input file",
+}
+
+# Stage jobs run on the worker thread. They get a snapshot of the form
+# values, must not touch Tk, and return the success message.
+def require_success(succeeded, title):
+    """Raise when a stage returned False: it printed its error and did not finish the sheet"""
+    if not succeeded:
+        from pipeline import StageFailed
+        raise StageFailed(f"{title} stage reported an error; see the console for details")
+
+def fetch_master_for_job(values):
+    from master_data_fetcher import fetch_master_data
+    result = fetch_master_data(
+        s_loc_code=values["s_loc_code"],
+        category=values["category"],
+        master_file_path=values["master_file_path"]
+    )
+    if result["status"] == "error":
+        raise RuntimeError(result.get("error_message", "Unknown error"))
+    return result
+
+def data_job(values):
+    from header import main as header_main
+    result = fetch_master_for_job(values)
+    require_success(header_main(
+        master_data=result["master_data"],
+        auditor_data=result["auditor_data"],
+        output_file_path=FORMAT_FILE_PATH,
+        format_file_path=FORMAT_FILE_PATH
+    ), "Header")
+    return f"Data processing completed! Output: {FORMAT_FILE_PATH}"
+
+def hygiene_job(values):
+    from hygeine import fill_hygiene_sheet
+    result = fetch_master_for_job(values)
+    require_success(fill_hygiene_sheet(
+        master_data=result["master_data"],
+        format_file_path=FORMAT_FILE_PATH,
+        hygiene_input_file_path=values["hygiene_input_file_path"]
+    ), "Hygiene")
+    return f"Hygiene data processed! Output: {FORMAT_FILE_PATH}"
+
+def mb52_job(values):
+    from app_mb52 import process_mb52
+    require_success(process_mb52(
+        format_file_path=FORMAT_FILE_PATH,
+        mb52_input_file_path=values["mb52_input_file_path"],
+        s_loc_code=values["s_loc_code"]
+    ), "MB52")
+    return f"MB52 data processed! Output: {FORMAT_FILE_PATH}"
+
+def countsheet_job(values):
+    from countsheet import process_count_sheet
+    require_success(process_count_sheet(
+        input_file=values["countsheet_input_file_path"],
+        output_file=FORMAT_FILE_PATH
+    ), "Count Sheet")
+    return f"Count Sheet data processed! Output: {FORMAT_FILE_PATH}"
+
+def stack_job(values):
+    from stack import process_stack_data
+    result = fetch_master_for_job(values)
+    require_success(process_stack_data(
+        input_file=values["stack_input_file_path"],
+        output_file=FORMAT_FILE_PATH,
+        master_data=result["master_data"]
+    ), "Stack")
+    return f"Stack data processed! Output: {FORMAT_FILE_PATH}"
+
+def raw_material_job(values):
+    from raw_material import process_raw_material
+    result = fetch_master_for_job(values)
+    require_success(process_raw_material(
+        format_file_path=FORMAT_FILE_PATH,
+        master_data=result["master_data"]
+    ), "Raw Material")
+    return f"Raw Material data processed! Output: {FORMAT_FILE_PATH}"
+
+def run_all_job(values):
+    from pipeline import run_all
+    result = fetch_master_for_job(values)
+    run_all(
+        master_data=result["master_data"],
+        auditor_data=result["auditor_data"],
+        format_file_path=FORMAT_FILE_PATH,
+        s_loc_code=values["s_loc_code"],
+        hygiene_input_file_path=values["hygiene_input_file_path"],
+        mb52_input_file_path=values["mb52_input_file_path"],
+        countsheet_input_file_path=values["countsheet_input_file_path"],
+        stack_input_file_path=values["stack_input_file_path"]
+    )
+    return f"All stages processed! Output: {FORMAT_FILE_PATH}"
+
+# Status text shown while the job runs, and the job itself
+STAGE_JOBS = {
+    "data": ("Processing data", data_job),
+    "hygiene": ("Processing hygiene data", hygiene_job),
+    "mb52": ("Processing MB52 data", mb52_job),
+    "countsheet": ("Processing Count Sheet data", countsheet_job),
+    "stack": ("Processing Stack data", stack_job),
+    "raw_material": ("Processing Raw Material data", raw_material_job),
+    "run_all": ("Running all stages", run_all_job),
+}
+
+ALL_SHEETS = {"Header", "Annexure- Hygiene Obs", "Mb52- Stock Report", "Count Sheet",
+              "RM- Stack wise", "Annexure- Raw Material"}
+
+# Sheets each stage reads or writes; stages sharing a sheet conflict
+STAGE_SHEETS = {
+    "data": ALL_SHEETS,
+    "hygiene": {"Annexure- Hygiene Obs"},
+    "mb52": {"Mb52- Stock Report"},
+    "countsheet": {"Count Sheet"},
+    "stack": {"RM- Stack wise"},
+    "raw_material": {"Mb52- Stock Report", "RM- Stack wise", "Annexure- Raw Material"},
+    "run_all": ALL_SHEETS,
+}
+
 class ConsoleRedirect(StringIO):
-    def __init__(self, text_widget):
+    """
+    stdout/stderr replacement for the console pane. Writes from any thread
+    go to a ConsoleBuffer; drain() shows them in one insert per refresh and
+    trims the Text widget to its last max_lines lines.
+    """
+
+    def __init__(self, text_widget, max_lines=CONSOLE_MAX_LINES):
         super().__init__()
         self.text_widget = text_widget
+        self.max_lines = max_lines
+        self.log = ConsoleBuffer()
 
     def write(self, s):
+        return self.log.write(s)
+
+    def drain(self):
+        """Show output written since the last refresh; call from the Tk thread"""
+        text = self.log.take()
+        if not text:
+            return
         self.text_widget.configure(state='normal')
-        self.text_widget.insert(tk.END, s)
+        self.text_widget.insert(tk.END, text)
+        line_count = int(self.text_widget.index('end-1c').split('.')[0])
+        if line_count > self.max_lines:
+            self.text_widget.delete('1.0', f'{line_count - self.max_lines + 1}.0')
         self.text_widget.see(tk.END)
         self.text_widget.configure(state='disabled')
 
+    def start(self, root):
+        """Refresh the console pane on a timer"""
+        self.drain()
+        root.after(CONSOLE_FLUSH_INTERVAL_MS, self.start, root)
+
     def flush(self):
         pass
 
@@ -76,9 +260,18 @@ class AdaniGUI:
         self.mb52_input_file_path = tk.StringVar()
         self.countsheet_input_file_path = tk.StringVar()
         self.stack_input_file_path = tk.StringVar()
+        self.stage_buttons = {}
+        self.jobs = JobRunner()
+        self.bg_renderer = None
+        self.closed = False
         self.create_styles()
         self.create_widgets()
         self.redirect_console()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(JOB_POLL_INTERVAL_MS, self.poll_jobs)
+        self.warm_up_thread = None
+        if os.environ.get(WARM_UP_ENV, "1") != "0":
+            self.root.after(WARM_UP_DELAY_MS, self.start_warm_up)
 
     def create_styles(self):
         style = ttk.Style()
@@ -156,31 +349,23 @@ class AdaniGUI:
                        foreground='#1a237e')
 
     def create_widgets(self):
-        # --- PNG Gradient Background ---
+        # --- Gradient Background ---
+        # Drawn at the window size from gradient.svg's stops, off the Tk thread,
+        # after resizing settles; each size is rendered once
         try:
-            gradient_path = resource_path('gradient.png')
-            if os.path.exists(gradient_path):
-                self.bg_image = Image.open(gradient_path)
-                self.bg_photo = ImageTk.PhotoImage(self.bg_image)
-                self.bg_label = tk.Label(self.root, image=self.bg_photo)
-                self.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
-                self.bg_label.lower()
-                def resize_bg(event):
-                    # Resize the background image to fit the window
-                    new_width = event.width
-                    new_height = event.height
-                    resized = self.bg_image.resize((new_width, new_height), Image.LANCZOS)
-                    self.bg_photo = ImageTk.PhotoImage(resized)
-                    self.bg_label.config(image=self.bg_photo)
-                self.root.bind('<Configure>', resize_bg)
-            else:
-                # Fallback to a solid background color if gradient.png is not found
-                self.root.configure(bg='#f5f7fa')
-                print("Note: gradient.png not found, using solid background color instead")
+            vector, stops = load_gradient(resource_path('gradient.svg'))
+            self.bg_cache = GradientCache(vector, stops)
+            self.bg_renderer = ThreadPoolExecutor(max_workers=1)
+            self.bg_size = None
+            self.bg_pending = None
+            self.bg_label = tk.Label(self.root, bd=0, bg='#f5f7fa')
+            self.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
+            self.bg_label.lower()
+            self.root.bind('<Configure>', self.on_root_configure)
         except Exception as e:
             # Fallback to a solid background color if any error occurs
             self.root.configure(bg='#f5f7fa')
-            print(f"Note: Could not load background image: {str(e)}, using solid background color instead")
+            print(f"Note: Could not set up background gradient: {str(e)}, using solid background color instead")
 
         # Title Bar
         title_frame = ttk.Frame(self.root, style='TFrame')
@@ -225,35 +410,46 @@ class AdaniGUI:
         ttk.Label(file_frame, text="Master File:").grid(row=1, column=0, sticky=tk.W, pady=5, padx=5)
         ttk.Entry(file_frame, textvariable=self.master_file_path, width=ENTRY_WIDTH).grid(row=1, column=1, pady=5, padx=5)
         ttk.Button(file_frame, text="Browse", command=self.browse_master_file, style='Fancy.TButton').grid(row=1, column=2, padx=5, pady=5)
-        ttk.Button(file_frame, text="Process Data", command=self.process_data, style='TButton', width=20).grid(row=1, column=3, padx=5, pady=5)
+        self.stage_buttons["data"] = ttk.Button(file_frame, text="Process Data", command=self.process_data, style='TButton', width=20)
+        self.stage_buttons["data"].grid(row=1, column=3, padx=5, pady=5)
         
         # Hygiene File Section
         ttk.Label(file_frame, text="Hygiene Input File:").grid(row=2, column=0, sticky=tk.W, pady=5, padx=5)
         ttk.Entry(file_frame, textvariable=self.hygiene_input_file_path, width=ENTRY_WIDTH).grid(row=2, column=1, pady=5, padx=5)
         ttk.Button(file_frame, text="Browse", command=self.browse_hygiene_input_file, style='Fancy.TButton').grid(row=2, column=2, padx=5, pady=5)
-        ttk.Button(file_frame, text="Process Hygiene", command=self.process_hygiene, style='TButton',width=20).grid(row=2, column=3, padx=5, pady=5)
+        self.stage_buttons["hygiene"] = ttk.Button(file_frame, text="Process Hygiene", command=self.process_hygiene, style='TButton',width=20)
+        self.stage_buttons["hygiene"].grid(row=2, column=3, padx=5, pady=5)
         
         # MB52 File Section
         ttk.Label(file_frame, text="MB52 Input File:").grid(row=3, column=0, sticky=tk.W, pady=5, padx=5)
         ttk.Entry(file_frame, textvariable=self.mb52_input_file_path, width=ENTRY_WIDTH).grid(row=3, column=1, pady=5, padx=5)
         ttk.Button(file_frame, text="Browse", command=self.browse_mb52_input_file, style='Fancy.TButton').grid(row=3, column=2, padx=5, pady=5)
-        ttk.Button(file_frame, text="Process MB52", command=self.process_mb52, style='TButton', width=20).grid(row=3, column=3, padx=5, pady=5)
+        self.stage_buttons["mb52"] = ttk.Button(file_frame, text="Process MB52", command=self.process_mb52, style='TButton', width=20)
+        self.stage_buttons["mb52"].grid(row=3, column=3, padx=5, pady=5)
         
         # Count Sheet Section
         ttk.Label(file_frame, text="Count Sheet Input:").grid(row=4, column=0, sticky=tk.W, pady=5, padx=5)
         ttk.Entry(file_frame, textvariable=self.countsheet_input_file_path, width=ENTRY_WIDTH).grid(row=4, column=1, pady=5, padx=5)
         ttk.Button(file_frame, text="Browse", command=self.browse_countsheet_input_file, style='Fancy.TButton').grid(row=4, column=2, padx=5, pady=5)
-        ttk.Button(file_frame, text="Process Count Sheet", command=self.process_countsheet, style='TButton', width=20).grid(row=4, column=3, padx=5, pady=5)
+        self.stage_buttons["countsheet"] = ttk.Button(file_frame, text="Process Count Sheet", command=self.process_countsheet, style='TButton', width=20)
+        self.stage_buttons["countsheet"].grid(row=4, column=3, padx=5, pady=5)
         
         # Stack File Section
         ttk.Label(file_frame, text="Stack Input File:").grid(row=5, column=0, sticky=tk.W, pady=5, padx=5)
         ttk.Entry(file_frame, textvariable=self.stack_input_file_path, width=ENTRY_WIDTH).grid(row=5, column=1, pady=5, padx=5)
         ttk.Button(file_frame, text="Browse", command=self.browse_stack_input_file, style='Fancy.TButton').grid(row=5, column=2, padx=5, pady=5)
-        ttk.Button(file_frame, text="Process Stack", command=self.process_stack, style='TButton',width=20).grid(row=5, column=3, padx=5, pady=5)
+        self.stage_buttons["stack"] = ttk.Button(file_frame, text="Process Stack", command=self.process_stack, style='TButton',width=20)
+        self.stage_buttons["stack"].grid(row=5, column=3, padx=5, pady=5)
         
         # Raw Material Section
         ttk.Label(file_frame, text="Raw Material:").grid(row=6, column=0, sticky=tk.W, pady=5, padx=5)
-        ttk.Button(file_frame, text="Process Raw Material", command=self.process_raw_material, style='Danger.TButton', width=20).grid(row=6, column=3, padx=5, pady=5)
+        self.stage_buttons["raw_material"] = ttk.Button(file_frame, text="Process Raw Material", command=self.process_raw_material, style='Danger.TButton', width=20)
+        self.stage_buttons["raw_material"].grid(row=6, column=3, padx=5, pady=5)
+
+        # Run All Section
+        ttk.Label(file_frame, text="All Stages:").grid(row=7, column=0, sticky=tk.W, pady=5, padx=5)
+        self.stage_buttons["run_all"] = ttk.Button(file_frame, text="Run All", command=self.run_all, style='Danger.TButton', width=20)
+        self.stage_buttons["run_all"].grid(row=7, column=3, padx=5, pady=5)
 
         # --- Right: Console Output ---
         right_frame = ttk.Frame(main_horiz_frame, style='TFrame')
@@ -282,10 +478,77 @@ class AdaniGUI:
         console_scroll = ttk.Scrollbar(console_frame, command=self.console_text.yview)
         console_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.console_text['yscrollcommand'] = console_scroll.set
+        ttk.Button(right_frame, text="Save Log", command=self.save_log, style='Fancy.TButton').pack(anchor='e', pady=(5, 0))
+
+    def start_warm_up(self):
+        if self.warm_up_thread is not None:
+            return
+        self.warm_up_thread = threading.Thread(target=warm_up_imports, name="warm-up", daemon=True)
+        self.warm_up_thread.start()
+
+    def on_root_configure(self, event):
+        # The root binding also fires for every child widget; only the window size matters
+        if event.widget is not self.root:
+            return
+        size = (event.width, event.height)
+        if size == self.bg_size or min(size) < 1:
+            return
+        self.bg_size = size
+        if self.bg_pending is not None:
+            self.root.after_cancel(self.bg_pending)
+        self.bg_pending = self.root.after(BG_DEBOUNCE_MS, self.render_background)
+
+    def render_background(self):
+        if self.closed:
+            return
+        self.bg_pending = None
+        width, height = self.bg_size
+        pixels = self.bg_cache.get(width, height)
+        if pixels is not None:
+            self.show_background(pixels)
+            return
+        future = self.bg_renderer.submit(self.bg_cache.render, width, height)
+        self.root.after(BG_POLL_INTERVAL_MS, self.show_rendered_background, future, self.bg_size)
+
+    def show_rendered_background(self, future, size):
+        if self.closed:
+            return
+        if not future.done():
+            self.root.after(BG_POLL_INTERVAL_MS, self.show_rendered_background, future, size)
+            return
+        if size != self.bg_size:
+            # The window was resized again; a newer render is on its way
+            return
+        try:
+            self.show_background(future.result())
+        except Exception as e:
+            print(f"Note: Could not render background: {str(e)}")
+
+    def show_background(self, pixels):
+        from PIL import Image, ImageTk
+        self.bg_photo = ImageTk.PhotoImage(Image.fromarray(pixels))
+        self.bg_label.config(image=self.bg_photo)
 
     def redirect_console(self):
-        sys.stdout = ConsoleRedirect(self.console_text)
-        sys.stderr = ConsoleRedirect(self.console_text)
+        self.console = ConsoleRedirect(self.console_text)
+        sys.stdout = self.console
+        sys.stderr = self.console
+        self.console.start(self.root)
+
+    def save_log(self):
+        """Save the whole console output, including lines trimmed from the pane"""
+        filename = filedialog.asksaveasfilename(
+            title="Save Console Log",
+            defaultextension=".log",
+            filetypes=[("Log files", "*.log"), ("Text files", "*.txt"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+        try:
+            self.console.log.save(filename)
+            self.status_label.config(text=f"Log saved to: {filename}")
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save log: {str(e)}")
 
     def browse_master_file(self):
         filename = filedialog.askopenfilename(
@@ -327,186 +590,108 @@ class AdaniGUI:
         if filename:
             self.stack_input_file_path.set(filename)
             
-    def process_data(self):
-        # Validate inputs
-        if not self.s_loc_code.get():
-            messagebox.showerror("Error", "Please enter S Loc Code")
+    def snapshot_values(self):
+        """Copy the form fields so a queued job is not affected by later edits"""
+        return {
+            "s_loc_code": self.s_loc_code.get(),
+            "category": self.category.get(),
+            "master_file_path": self.master_file_path.get(),
+            "hygiene_input_file_path": self.hygiene_input_file_path.get(),
+            "mb52_input_file_path": self.mb52_input_file_path.get(),
+            "countsheet_input_file_path": self.countsheet_input_file_path.get(),
+            "stack_input_file_path": self.stack_input_file_path.get(),
+        }
+
+    def validate(self, values, required):
+        """Show the first missing input as an error; True when everything is filled in"""
+        for field in required:
+            if not values[field]:
+                messagebox.showerror("Error", REQUIRED_INPUT_ERRORS[field])
+                return False
+        return True
+
+    def submit_job(self, stage, required):
+        values = self.snapshot_values()
+        if not self.validate(values, required):
             return
-            
-        if not self.category.get():
-            messagebox.showerror("Error", "Please select a category")
+        title, func = STAGE_JOBS[stage]
+        running = self.jobs.running()
+        self.jobs.submit(Job(stage, title, func, values, STAGE_SHEETS[stage]))
+        if running is not None:
+            waiting = len(self.jobs.waiting())
+            self.status_label.config(text=f"Queued: {title} for S Loc {values['s_loc_code'] or '-'} ({waiting} waiting)")
+        self.update_job_controls()
+
+    def poll_jobs(self):
+        """Drain worker events on the Tk thread, then check again shortly"""
+        for event in self.jobs.poll():
+            kind, job = event[0], event[1]
+            if kind == "started":
+                self.status_label.config(text=f"{job.title}...")
+            elif kind == "finished":
+                self.report_trace(job)
+                self.console.drain()
+                self.status_label.config(text=event[2])
+                messagebox.showinfo("Success", event[2])
+            elif kind == "failed":
+                self.report_trace(job)
+                self.console.drain()
+                self.status_label.config(text=f"Error: {str(event[2])}")
+                messagebox.showerror("Error", str(event[2]))
+            self.update_job_controls()
+        self.root.after(JOB_POLL_INTERVAL_MS, self.poll_jobs)
+
+    def report_trace(self, job):
+        """Show the job's per-stage timing summary in the console and keep its JSON trace"""
+        if job.trace is None:
             return
-            
-        if not self.master_file_path.get():
-            messagebox.showerror("Error", "Please select master file")
+        print("\n" + "\n".join(job.trace.summary_lines()))
+        trace_path = write_trace(job.trace)
+        if trace_path:
+            print(f"Trace written to: {trace_path}")
+
+    def update_job_controls(self):
+        """Disable the buttons of stages that conflict with the running job"""
+        running = self.jobs.running()
+        for stage, button in self.stage_buttons.items():
+            if running is not None and running.conflicts_with(STAGE_SHEETS[stage]):
+                button.state(['disabled'])
+            else:
+                button.state(['!disabled'])
+
+    def on_close(self):
+        if self.jobs.busy and not messagebox.askyesno(
+                "Processing", "A stage is still running or queued. Quit anyway?"):
             return
-            
-        try:
-            self.status_label.config(text="Processing data...")
-            self.root.update()
-            result = fetch_master_data(
-                s_loc_code=self.s_loc_code.get(),
-                category=self.category.get(),
-                master_file_path=self.master_file_path.get()
-            )
-            if result["status"] == "error":
-                messagebox.showerror("Error", result.get("error_message", "Unknown error"))
-                return
-            header_main(
-                master_data=result["master_data"],
-                auditor_data=result["auditor_data"],
-                output_file_path=FORMAT_FILE_PATH,
-                format_file_path=FORMAT_FILE_PATH
-            )
-            self.status_label.config(text=f"Data processing completed! Output: {FORMAT_FILE_PATH}")
-            messagebox.showinfo("Success", f"Data processing completed! Output: {FORMAT_FILE_PATH}")
-        except Exception as e:
-            self.status_label.config(text=f"Error: {str(e)}")
-            messagebox.showerror("Error", str(e))
+        self.close_window()
+
+    def close_window(self):
+        """Stop background rendering, then destroy the window; late render callbacks see closed"""
+        self.closed = True
+        if self.bg_renderer is not None:
+            self.bg_renderer.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
+
+    def process_data(self):
+        self.submit_job("data", ["s_loc_code", "category", "master_file_path"])
 
     def process_hygiene(self):
-        # Validate inputs
-        if not self.s_loc_code.get():
-            messagebox.showerror("Error", "Please enter S Loc Code")
-            return
-        if not self.category.get():
-            messagebox.showerror("Error", "Please select a category")
-            return
-        if not self.master_file_path.get():
-            messagebox.showerror("Error", "Please select master file")
-            return
-        if not self.hygiene_input_file_path.get():
-            messagebox.showerror("Error", "Please select hygiene input file")
-            return
-        try:
-            self.status_label.config(text="Processing hygiene data...")
-            self.root.update()
-            result = fetch_master_data(
-                s_loc_code=self.s_loc_code.get(),
-                category=self.category.get(),
-                master_file_path=self.master_file_path.get()
-            )
-            if result["status"] == "error":
-                messagebox.showerror("Error", result.get("error_message", "Unknown error"))
-                return
-            fill_hygiene_sheet(
-                master_data=result["master_data"],
-                format_file_path=FORMAT_FILE_PATH,
-                hygiene_input_file_path=self.hygiene_input_file_path.get()
-            )
-            self.status_label.config(text=f"Hygiene data processed! Output: {FORMAT_FILE_PATH}")
-            messagebox.showinfo("Success", f"Hygiene data processed! Output: {FORMAT_FILE_PATH}")
-        except Exception as e:
-            self.status_label.config(text=f"Error: {str(e)}")
-            messagebox.showerror("Error", str(e))
+        self.submit_job("hygiene", ["s_loc_code", "category", "master_file_path", "hygiene_input_file_path"])
 
     def process_mb52(self):
-        # Validate inputs
-        if not self.s_loc_code.get():
-            messagebox.showerror("Error", "Please enter S Loc Code")
-            return
-        if not self.mb52_input_file_path.get():
-            messagebox.showerror("Error", "Please select MB52 input file")
-            return
-        try:
-            self.status_label.config(text="Processing MB52 data...")
-            self.root.update()
-            process_mb52(
-                format_file_path=FORMAT_FILE_PATH,
-                mb52_input_file_path=self.mb52_input_file_path.get(),
-                s_loc_code=self.s_loc_code.get()
-            )
-            self.status_label.config(text=f"MB52 data processed! Output: {FORMAT_FILE_PATH}")
-            messagebox.showinfo("Success", f"MB52 data processed! Output: {FORMAT_FILE_PATH}")
-        except Exception as e:
-            self.status_label.config(text=f"Error: {str(e)}")
-            messagebox.showerror("Error", str(e))
+        self.submit_job("mb52", ["s_loc_code", "mb52_input_file_path"])
 
     def process_countsheet(self):
-        # Validate inputs
-        if not self.countsheet_input_file_path.get():
-            messagebox.showerror("Error", "Please select Count Sheet input file")
-            return
-        try:
-            self.status_label.config(text="Processing Count Sheet data...")
-            self.root.update()
-            process_count_sheet(
-                input_file=self.countsheet_input_file_path.get(),
-                output_file=FORMAT_FILE_PATH
-            )
-            self.status_label.config(text=f"Count Sheet data processed! Output: {FORMAT_FILE_PATH}")
-            messagebox.showinfo("Success", f"Count Sheet data processed! Output: {FORMAT_FILE_PATH}")
-        except Exception as e:
-            self.status_label.config(text=f"Error: {str(e)}")
-            messagebox.showerror("Error", str(e))
+        self.submit_job("countsheet", ["countsheet_input_file_path"])
 
     def process_stack(self):
-        # Validate inputs
-        if not self.s_loc_code.get():
-            messagebox.showerror("Error", "Please enter S Loc Code")
-            return
-        if not self.category.get():
-            messagebox.showerror("Error", "Please select a category")
-            return
-        if not self.master_file_path.get():
-            messagebox.showerror("Error", "Please select master file")
-            return
-        if not self.stack_input_file_path.get():
-            messagebox.showerror("Error", "Please select Stack input file")
-            return
-        try:
-            self.status_label.config(text="Processing Stack data...")
-            self.root.update()
-            result = fetch_master_data(
-                s_loc_code=self.s_loc_code.get(),
-                category=self.category.get(),
-                master_file_path=self.master_file_path.get()
-            )
-            if result["status"] == "error":
-                messagebox.showerror("Error", result.get("error_message", "Unknown error"))
-                return
-            process_stack_data(
-                input_file=self.stack_input_file_path.get(),
-                output_file=FORMAT_FILE_PATH,
-                master_data=result["master_data"]
-            )
-            self.status_label.config(text=f"Stack data processed! Output: {FORMAT_FILE_PATH}")
-            messagebox.showinfo("Success", f"Stack data processed! Output: {FORMAT_FILE_PATH}")
-        except Exception as e:
-            self.status_label.config(text=f"Error: {str(e)}")
-            messagebox.showerror("Error", str(e))
+        self.submit_job("stack", ["s_loc_code", "category", "master_file_path", "stack_input_file_path"])
 
     def process_raw_material(self):
-        # Validate inputs
-        if not self.s_loc_code.get():
-            messagebox.showerror("Error", "Please enter S Loc Code")
-            return
-        if not self.category.get():
-            messagebox.showerror("Error", "Please select a category")
-            return
-        if not self.master_file_path.get():
-            messagebox.showerror("Error", "Please select master file")
-            return
-        try:
-            self.status_label.config(text="Processing Raw Material data...")
-            self.root.update()
-            result = fetch_master_data(
-                s_loc_code=self.s_loc_code.get(),
-                category=self.category.get(),
-                master_file_path=self.master_file_path.get()
-            )
-            if result["status"] == "error":
-                messagebox.showerror("Error", result.get("error_message", "Unknown error"))
-                return
-            process_raw_material(
-                format_file_path=FORMAT_FILE_PATH,
-                master_data=result["master_data"]
-            )
-            self.status_label.config(text=f"Raw Material data processed! Output: {FORMAT_FILE_PATH}")
-            messagebox.showinfo("Success", f"Raw Material data processed! Output: {FORMAT_FILE_PATH}")
-        except Exception as e:
-            self.status_label.config(text=f"Error: {str(e)}")
-            messagebox.showerror("Error", str(e))
+        self.submit_job("raw_material", ["s_loc_code", "category", "master_file_path"])
+
+    def run_all(self):
+        self.submit_job("run_all", ["s_loc_code", "category", "master_file_path"])
 
     def view_format_file(self):
         """Open the format Excel file in the default application"""
@@ -523,9 +708,26 @@ class AdaniGUI:
         else:
             messagebox.showinfo("Information", "Format file does not exist yet. Process some data first.")
 
+def write_startup_probe(app, probe_path, first_window_time):
+    """Record startup timestamps for measure_startup.py, then close the window"""
+    if app.warm_up_thread is not None and app.warm_up_thread.is_alive():
+        app.root.after(20, write_startup_probe, app, probe_path, first_window_time)
+        return
+    with open(probe_path, "w", encoding="utf-8") as f:
+        json.dump({"first_window": first_window_time, "ready": time.time()}, f)
+    app.close_window()
+
 def main():
     root = tk.Tk()
     app = AdaniGUI(root)
+    probe_path = os.environ.get(STARTUP_PROBE_ENV)
+    if probe_path:
+        # First window = the moment the mapped window has been drawn
+        root.update()
+        first_window_time = time.time()
+        if os.environ.get(WARM_UP_ENV, "1") != "0":
+            app.start_warm_up()
+        write_startup_probe(app, probe_path, first_window_time)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -1,6 +1,13 @@
 # -*- mode: python ; coding: utf-8 -*-
 
 import os
+import sys
+
+sys.path.insert(0, SPECPATH)
+from template_plan import load_plan
+
+# Compile the template plan so the bundled app never has to scan format.xlsx
+load_plan(os.path.join(SPECPATH, 'output', 'format.xlsx'))
 
 a = Analysis(
     ['gui.py'],
@@ -8,7 +15,8 @@ a = Analysis(
     binaries=[],
     datas=[
         ('output/format.xlsx', 'output'),
-        ('gradient.png', '.'),
+        ('output/template_plan.json', 'output'),
+        ('gradient.svg', '.'),
     ],
     hiddenimports=[],
     hookspath=[],
@@ -2,6 +2,8 @@ import pandas as pd
 from openpyxl import load_workbook
 from datetime import datetime
 from master_data_fetcher import fetch_master_data
+from label_index import LabelIndex
+from instrumentation import traced, phase, end_phase
 
 def format_current_date():
     """Format current date as '21st May' 25'"""
@@ -21,45 +23,34 @@ def get_quarter_data(sheet):
                     return str(quarter_value).strip()
     return None
 
-def find_sections(sheet):
+def find_sections(sheet, index=None):
     """
     Dynamically identify different sections in the format sheet
     Returns a dictionary of section info with their row ranges
     """
+    index = index or LabelIndex(sheet)
     sections = {}
     current_section = None
     section_headers = ["About the Location", "Auditor Details", "Sign Off"]
-    last_content_row = 1
-    
-    # First pass: Find the last row with actual content
-    for row_idx, row in enumerate(sheet.iter_rows(), 1):
-        has_content = any(cell.value for cell in row)
-        if has_content:
-            last_content_row = row_idx
-    
-    # Second pass: Find sections
-    for row_idx, row in enumerate(sheet.iter_rows(), 1):
-        if row_idx > last_content_row:
-            break
-            
-        for cell in row:
-            if cell.value:
-                cell_text = str(cell.value).strip()
-                
-                # If we found a section header
-                if cell_text in section_headers:
-                    # Close previous section if exists
-                    if current_section:
-                        sections[current_section]["end_row"] = row_idx - 1
-                    
-                    # Start new section
-                    current_section = cell_text
-                    sections[current_section] = {
-                        "start_row": row_idx,
-                        "end_row": last_content_row,
-                        "column": cell.column
-                    }
-                    break
+    last_content_row = index.last_content_row
+
+    # Section headers in sheet order, at most one per row
+    header_cells = {}
+    for row_idx, column, cell_text in index.search(lambda text: text in section_headers, max_row=last_content_row):
+        header_cells.setdefault(row_idx, (column, cell_text))
+
+    for row_idx, (column, cell_text) in sorted(header_cells.items()):
+        # Close previous section if exists
+        if current_section:
+            sections[current_section]["end_row"] = row_idx - 1
+
+        # Start new section
+        current_section = cell_text
+        sections[current_section] = {
+            "start_row": row_idx,
+            "end_row": last_content_row,
+            "column": column
+        }
     
     # Adjust section end rows based on next section's start
     sorted_sections = sorted(sections.items(), key=lambda x: x[1]["start_row"])
@@ -92,17 +83,14 @@ def process_auditor_names(auditor_names_str):
     
     return auditor_data
 
-def find_name_row_in_signoff(sheet):
+def find_name_row_in_signoff(sheet, index=None):
     """Find the row with 'Name' label in sign-off section"""
-    for row in sheet.iter_rows():
-        for cell in row:
-            if cell.value and str(cell.value).strip() == "Name":
-                return cell.row, cell.column
-    return None, None
+    index = index or LabelIndex(sheet)
+    return index.find("Name")
 
-def fill_signoff_section(sheet, master_data, auditor_names):
+def fill_signoff_section(sheet, master_data, auditor_names, index=None):
     """Fill the sign-off section with WMS Representative and auditor names"""
-    name_row, name_col = find_name_row_in_signoff(sheet)
+    name_row, name_col = find_name_row_in_signoff(sheet, index=index)
     if name_row:
         # Get the header row (one row above the 'Name' row)
         header_row = name_row - 1
@@ -147,9 +135,17 @@ def is_protected_cell(cell, sections):
     
     return False
 
-def update_all_sheets_signoff(master_data, auditor_data, format_file_path):
+@traced("update_all_sheets_signoff")
+def update_all_sheets_signoff(master_data, auditor_data, format_file_path, wb=None):
+    """Fill the sign-off names on every annexure sheet.
+
+    When ``wb`` is given (pipeline session) the in-memory workbook is updated
+    and saving is left to the caller. Returns False when an error was reported.
+    """
     try:
-        wb = load_workbook(format_file_path)
+        owns_workbook = wb is None
+        if owns_workbook:
+            wb = load_workbook(format_file_path)
         sheets_to_update = [
             "Annexure- Raw Material",
             "RM- Stack wise",
@@ -161,63 +157,78 @@ def update_all_sheets_signoff(master_data, auditor_data, format_file_path):
             if sheet_name in wb.sheetnames:
                 print(f"Updating Sign Off section in {sheet_name}...")
                 sheet = wb[sheet_name]
-                fill_signoff_section(sheet, master_data, auditor_data)
+                fill_signoff_section(sheet, master_data, auditor_data, index=LabelIndex(sheet))
             else:
                 print(f"Warning: Sheet '{sheet_name}' not found in {format_file_path}")
-        wb.save(format_file_path)
+        if owns_workbook:
+            wb.save(format_file_path)
         print("Successfully updated Sign Off sections in all sheets")
+        return True
     except Exception as e:
         print(f"Error updating Sign Off sections: {str(e)}")
+        return False
 
-def main(master_data=None, auditor_data=None, output_file_path=None, format_file_path=None):
+@traced("header")
+def main(master_data=None, auditor_data=None, output_file_path=None, format_file_path=None, wb=None):
+    """Fill the Header sheet and every sign-off; returns False when an error was reported"""
     if not master_data or not auditor_data:
         print("❌ Error: Master data and auditor data are required")
-        return
+        return False
 
     if not output_file_path:
         print("❌ Error: Output file path is required")
-        return
+        return False
 
     if not format_file_path:
         print("❌ Error: Format file path is required")
-        return
+        return False
 
     try:
-        # Load format workbook
-        format_wb = load_workbook(format_file_path)
+        # Load format workbook (or use the one owned by the pipeline session)
+        if wb is None:
+            phase("load workbook")
+        format_wb = wb if wb is not None else load_workbook(format_file_path)
         format_sheet = format_wb["Header"]
 
         # DEBUG: Write a test value to A1
         #format_sheet['A1'] = "TEST VALUE - If you see this, file is being updated!"
 
-        # Get section information
-        sections = find_sections(format_sheet)
-
-        # Fill data in format sheet
-        for row in format_sheet.iter_rows():
-            for cell in row:
-                if cell.value:
-                    # Skip protected cells and AWL Executive
-                    if is_protected_cell(cell, sections) or str(cell.value).strip() == "AWL Executive":
-                        continue
-                        
-                    label = str(cell.value).strip()
-                    if label in master_data:
-                        right_cell = cell.offset(column=1)
-                        right_cell.value = master_data[label]
+        # Index the sheet's labels once and get section information
+        phase("anchor search")
+        index = LabelIndex(format_sheet)
+        sections = find_sections(format_sheet, index=index)
+
+        # Fill data in format sheet: only labelled cells whose label is a master data key
+        phase("write rows")
+        for row_idx, column, label in index.search(lambda text: text in master_data):
+            cell = format_sheet.cell(row=row_idx, column=column)
+            # Skip cells already overwritten by a value written to their left
+            if cell.value is None or str(cell.value).strip() != label:
+                continue
+            # Skip protected cells and AWL Executive
+            if is_protected_cell(cell, sections) or label == "AWL Executive":
+                continue
+            right_cell = cell.offset(column=1)
+            right_cell.value = master_data[label]
 
         # Fill sign-off section with WMS Representative and auditor names only
-        fill_signoff_section(format_sheet, master_data, auditor_data)
+        fill_signoff_section(format_sheet, master_data, auditor_data, index=index)
 
         # Save updated file
-        try:
-            format_wb.save(output_file_path)
-            print(f"✅ Data mapped and filled successfully! Saved to: {output_file_path}")
-        except Exception as e:
-            print(f"❌ Error saving file: {e}")
+        if wb is None:
+            phase("save")
+            try:
+                format_wb.save(output_file_path)
+                print(f"✅ Data mapped and filled successfully! Saved to: {output_file_path}")
+            except Exception as e:
+                print(f"❌ Error saving file: {e}")
+                return False
+        else:
+            print("✅ Data mapped and filled successfully!")
 
         # Update sign-off in all relevant sheets
-        update_all_sheets_signoff(master_data, auditor_data, format_file_path)
+        end_phase()
+        return update_all_sheets_signoff(master_data, auditor_data, format_file_path, wb=wb)
 
     except Exception as e:
         print(f"❌ Error: {str(e)}")
@@ -1,8 +1,90 @@
+import os
+import numpy as np
 import pandas as pd
 from openpyxl import load_workbook
-import difflib
+from checkpoint_matcher import match_check_points, normalize_check_point
+from template_plan import has_label
+from label_index import LabelIndex
+from instrumentation import traced, phase
 
-def fill_hygiene_sheet(master_data, format_file_path, hygiene_input_file_path):
+class HygieneInputStore:
+    """
+    Parsed copy of the hygiene audit-header file with a hash index on
+    (S Loc Code, Category). The file is read once, so filling the annexure
+    for every location costs one parse and a dictionary hit per location.
+    """
+
+    def __init__(self, input_file_path):
+        self.input_file_path = input_file_path
+        self.signature = self.file_signature(input_file_path)
+        self.input_df = pd.read_excel(input_file_path)
+        self.input_columns = list(self.input_df.columns)
+        # Category is compared case-insensitively
+        self.input_df['Category'] = self.input_df['Category'].astype(str).str.strip().str.lower()
+        self._build_index()
+
+    @staticmethod
+    def file_signature(input_file_path):
+        """Modification time and size, used to invalidate a cached store"""
+        stat = os.stat(input_file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def location_key(value):
+        """
+        Index key of an S Loc Code cell. Only numeric cells with a whole
+        value are keyed, since lookups compare against int(s_loc_code).
+        """
+        if isinstance(value, bool) or not isinstance(value, (int, float, np.integer, np.floating)):
+            return None
+        if not np.isfinite(value) or value != int(value):
+            return None
+        return str(int(value))
+
+    def _build_index(self):
+        self.by_location_category = {}
+        locations = self.input_df['S Loc Code'].tolist()
+        categories = self.input_df['Category'].tolist()
+        # Keep the first matching row for every key, like row.iloc[0] after filtering
+        for position, (location, category) in enumerate(zip(locations, categories)):
+            location = self.location_key(location)
+            if location is not None:
+                self.by_location_category.setdefault((location, category), position)
+
+    def lookup(self, s_loc_code, category):
+        """First input row for this S Loc Code and Category, or None"""
+        position = self.by_location_category.get((str(int(s_loc_code)), category.strip().lower()))
+        if position is None:
+            return None
+        return self.input_df.iloc[position]
+
+    def categories(self):
+        return self.input_df['Category'].unique()
+
+_hygiene_stores = {}
+
+def get_hygiene_store(input_file_path):
+    """Return the cached store for a hygiene input file, re-parsing it only when it changed on disk"""
+    key = os.path.abspath(input_file_path)
+    store = _hygiene_stores.get(key)
+    if store is None or store.signature != HygieneInputStore.file_signature(input_file_path):
+        store = HygieneInputStore(input_file_path)
+        _hygiene_stores[key] = store
+    return store
+
+def find_check_points_header(ws):
+    """Find the header row containing 'Check Points' and 'Auditor's response'"""
+    index = LabelIndex(ws)
+    for row, check_points_col in index.find_all('Check Points'):
+        _, auditor_response_col = index.find("Auditor's response", min_row=row, max_row=row)
+        if auditor_response_col:
+            return row, check_points_col, auditor_response_col
+    return None, None, None
+
+@traced("fill_hygiene_sheet")
+def fill_hygiene_sheet(master_data, format_file_path, hygiene_input_file_path, wb=None, plan=None):
+    """Fill the hygiene annexure; returns False when the sheet could not be filled"""
+    owns_workbook = wb is None
     try:
         # File paths
         input_file = hygiene_input_file_path
@@ -10,7 +92,9 @@ def fill_hygiene_sheet(master_data, format_file_path, hygiene_input_file_path):
         output_file_filled = format_file_path
 
         # Load the output Excel file and select the Hygiene sheet
-        wb = load_workbook(output_file)
+        if owns_workbook:
+            phase("load workbook")
+            wb = load_workbook(output_file)
         ws = wb['Annexure- Hygiene Obs']
 
         # Fill header data (Date and PSV Quarter)
@@ -23,10 +107,10 @@ def fill_hygiene_sheet(master_data, format_file_path, hygiene_input_file_path):
         for key, value in master_data.items():
             print(f"{key}: {value}")
 
-        # Read input Excel file
-        input_df = pd.read_excel(input_file)
-        input_columns = list(input_df.columns)
-        input_columns_lower = [col.lower() for col in input_columns]
+        # Parsed input file, shared across calls until it changes on disk
+        phase("read input")
+        store = get_hygiene_store(input_file)
+        input_columns = store.input_columns
 
         # Get S Loc Code and Category from master_data
         s_loc_code = master_data.get("S Loc Code")
@@ -39,70 +123,68 @@ def fill_hygiene_sheet(master_data, format_file_path, hygiene_input_file_path):
         if not s_loc_code or not category:
             print("S Loc Code or Category not found in master data.")
             print(f"Available data: {master_data}")  # Debug print
-            return
+            return False
 
-        # Convert input DataFrame's Product column to string and lowercase for comparison
-        input_df['Category'] = input_df['Category'].astype(str).str.strip().str.lower()
-        
         # Find the row with the matching S Loc Code and Category (case-insensitive)
-        row = input_df[
-            (input_df['S Loc Code'] == int(s_loc_code)) & 
-            (input_df['Category'] == category.strip().lower())
-        ]
+        row = store.lookup(s_loc_code, category)
         
-        if row.empty:
+        if row is None:
             print(f'No data found for S Loc Code {s_loc_code} and Category {category} in input file.')
             # Debug print to show available categories
             print("\nAvailable categories in input file:")
-            print(input_df['Category'].unique())
-            return
-        row = row.iloc[0]
-
-        # Dynamically find the header row containing 'Check Points' and 'Auditor's response'
-        header_row = None
-        check_points_col = None
-        auditor_response_col = None
-        for i in range(1, ws.max_row + 1):
-            row_values = [ws.cell(row=i, column=col).value for col in range(1, ws.max_column + 1)]
-            if 'Check Points' in row_values and "Auditor's response" in row_values:
-                header_row = i
-                check_points_col = row_values.index('Check Points') + 1
-                auditor_response_col = row_values.index("Auditor's response") + 1
-                break
+            print(store.categories())
+            return False
+
+        # Header row containing 'Check Points' and 'Auditor's response' (compiled plan or scan)
+        phase("anchor search")
+        sheet_plan = plan.sheet('Annexure- Hygiene Obs') if plan else {}
+        if (sheet_plan
+                and has_label(ws, sheet_plan["header_row"], sheet_plan["check_points_col"], 'Check Points')
+                and has_label(ws, sheet_plan["header_row"], sheet_plan["auditor_response_col"], "Auditor's response")):
+            header_row = sheet_plan["header_row"]
+            check_points_col = sheet_plan["check_points_col"]
+            auditor_response_col = sheet_plan["auditor_response_col"]
+        else:
+            header_row, check_points_col, auditor_response_col = find_check_points_header(ws)
         if header_row is None:
             print('Could not find required columns in Hygiene sheet.')
-            return
+            return False
 
-        # Iterate through Check Points and fill Auditor's response
+        # Collect the Check Points, then match them to input columns in one go
+        phase("match check points")
+        check_point_rows = []
         row_idx = header_row + 1
         while True:
             check_point = ws.cell(row=row_idx, column=check_points_col).value
             if check_point is None:
                 break
-            # Try exact (case-insensitive) match first
-            match_col = None
-            for idx, col in enumerate(input_columns_lower):
-                if check_point and check_point.lower().strip() == col.strip():
-                    match_col = input_columns[idx]
-                    break
-            # If not found, use fuzzy matching
-            if not match_col and check_point:
-                close_matches = difflib.get_close_matches(check_point.lower().strip(), input_columns_lower, n=1, cutoff=0.7)
-                if close_matches:
-                    match_col = input_columns[input_columns_lower.index(close_matches[0])]
-            # Fill value if match found
+            check_point_rows.append((row_idx, check_point))
+            row_idx += 1
+        matches = match_check_points(
+            [check_point for _, check_point in check_point_rows], input_columns,
+            cache_dir=os.path.dirname(os.path.abspath(format_file_path)))
+
+        # Fill Auditor's response for every matched Check Point
+        phase("write rows")
+        for row_idx, check_point in check_point_rows:
+            match_col = matches.get(normalize_check_point(check_point)) if check_point else None
             if match_col:
                 ws.cell(row=row_idx, column=auditor_response_col).value = row[match_col]
-            row_idx += 1
 
         # Save the filled output file
-        wb.save(output_file_filled)
-        print(f'Successfully filled output saved as {output_file_filled}')
+        if owns_workbook:
+            phase("save")
+            wb.save(output_file_filled)
+            print(f'Successfully filled output saved as {output_file_filled}')
+        else:
+            print('Successfully filled hygiene sheet')
+        return True
 
     except Exception as e:
         print(f"Error processing hygiene sheet: {str(e)}")
+        return False
     finally:
-        if 'wb' in locals():
+        if owns_workbook and wb is not None:
             wb.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextlib
+import tracemalloc
+from datetime import datetime
+
+TRACE_VERSION = 1
+DEFAULT_TRACE_DIR = os.path.join("output", "traces")
+# ADANI_TRACE_DIR=path changes where traces are written,
+# ADANI_TRACE_MEMORY=1 records tracemalloc peaks (slows stages down 2-3x)
+TRACE_DIR_ENV = "ADANI_TRACE_DIR"
+TRACE_MEMORY_ENV = "ADANI_TRACE_MEMORY"
+
+# Phases shorter than this are left out of the printed summary (not the JSON)
+SUMMARY_MIN_SECONDS = 0.01
+
+_local = threading.local()
+
+class Span:
+    """One timed region of a trace, with its child spans in start order"""
+
+    def __init__(self, name, is_phase=False, start_memory=0):
+        self.name = name
+        self.is_phase = is_phase
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.start_memory = start_memory
+        self.peak_memory = start_memory
+        self.children = []
+
+    def to_dict(self, memory=False):
+        span = {"name": self.name, "seconds": round(self.seconds or 0.0, 4)}
+        if memory:
+            span["peak_kb"] = round((self.peak_memory - self.start_memory) / 1024)
+        if self.children:
+            span["spans"] = [child.to_dict(memory) for child in self.children]
+        return span
+
+class Trace:
+    """
+    Nested spans recorded on one thread for one run. With memory=True every
+    span also records its tracemalloc peak above the allocation it started at.
+    """
+
+    def __init__(self, name, memory=False):
+        self.name = name
+        self.memory = memory
+        self.created = datetime.now()
+        self.root = Span(name, start_memory=self._traced_memory()[0])
+        self.stack = [self.root]
+
+    def _traced_memory(self):
+        return tracemalloc.get_traced_memory() if self.memory else (0, 0)
+
+    def open(self, name, is_phase=False):
+        current, peak = self._traced_memory()
+        parent = self.stack[-1]
+        parent.peak_memory = max(parent.peak_memory, peak)
+        if self.memory:
+            # The parent keeps the peak seen so far; the child measures from here
+            tracemalloc.reset_peak()
+        span = Span(name, is_phase, current)
+        parent.children.append(span)
+        self.stack.append(span)
+        return span
+
+    def close(self, span):
+        """Close span and any phase or span still open inside it"""
+        if span not in self.stack:
+            return
+        while True:
+            closing = self.stack.pop()
+            closing.seconds = time.perf_counter() - closing.started
+            closing.peak_memory = max(closing.peak_memory, self._traced_memory()[1])
+            if self.stack:
+                self.stack[-1].peak_memory = max(self.stack[-1].peak_memory, closing.peak_memory)
+            if closing is span:
+                return
+
+    def next_phase(self, name):
+        top = self.stack[-1]
+        if top.is_phase:
+            self.close(top)
+        return self.open(name, is_phase=True)
+
+    def end_phase(self):
+        top = self.stack[-1]
+        if top.is_phase:
+            self.close(top)
+
+    def finish(self):
+        self.close(self.root)
+
+    @property
+    def seconds(self):
+        return self.root.seconds if self.root.seconds is not None else time.perf_counter() - self.root.started
+
+    def to_dict(self):
+        trace = self.root.to_dict(self.memory)
+        trace.update({
+            "version": TRACE_VERSION,
+            "created": self.created.isoformat(timespec="seconds"),
+            "memory": self.memory,
+        })
+        return trace
+
+    def summary_lines(self):
+        """Time per stage and per phase within it, slowest phase marked"""
+        lines = [f"Timing summary for {self.name}: {self.seconds:.2f}s"]
+        for stage in self.root.children:
+            lines.append(self._summary_line(stage, 1))
+            phases = [phase for phase in stage.children if (phase.seconds or 0) >= SUMMARY_MIN_SECONDS]
+            slowest = max(phases, key=lambda phase: phase.seconds, default=None)
+            for phase in phases:
+                lines.append(self._summary_line(phase, 2) + ("  <- slowest" if phase is slowest else ""))
+        return lines
+
+    def _summary_line(self, span, depth):
+        seconds = span.seconds or 0.0
+        share = seconds / self.seconds if self.seconds else 0.0
+        line = f"{'  ' * depth}{span.name:<{40 - 2 * depth}} {seconds:>8.2f}s {share:>5.0%}"
+        if self.memory:
+            line += f"  peak {(span.peak_memory - span.start_memory) / 1024:>9.0f} KB"
+        return line
+
+def memory_tracing_enabled():
+    return os.environ.get(TRACE_MEMORY_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+def current_trace():
+    """The trace being recorded on this thread, or None"""
+    return getattr(_local, "trace", None)
+
+@contextlib.contextmanager
+def tracing(name, memory=None):
+    """
+    Record a trace of everything run inside the block on this thread.
+    memory defaults to the ADANI_TRACE_MEMORY environment variable.
+    """
+    if memory is None:
+        memory = memory_tracing_enabled()
+    owns_tracemalloc = memory and not tracemalloc.is_tracing()
+    if owns_tracemalloc:
+        tracemalloc.start()
+    previous = current_trace()
+    trace = Trace(name, memory)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        trace.finish()
+        _local.trace = previous
+        if owns_tracemalloc:
+            tracemalloc.stop()
+
+@contextlib.contextmanager
+def span(name):
+    """Time the block as a child of the current span; free when no trace is recording"""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    opened = trace.open(name)
+    try:
+        yield
+    finally:
+        trace.close(opened)
+
+def traced(name):
+    """Decorator: run the function inside span(name)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def phase(name):
+    """
+    Start the next sequential phase of the current span, ending the previous
+    one. The last phase ends with end_phase() or when its span closes.
+    """
+    trace = current_trace()
+    if trace is not None:
+        trace.next_phase(name)
+
+def end_phase():
+    trace = current_trace()
+    if trace is not None:
+        trace.end_phase()
+
+def write_trace(trace, path=None):
+    """
+    Write the trace as JSON. Without a path it goes to ADANI_TRACE_DIR (or
+    output/traces) as <timestamp>_<name>.json. Returns the path, or None
+    when the trace could not be written.
+    """
+    if path is None:
+        directory = os.environ.get(TRACE_DIR_ENV) or DEFAULT_TRACE_DIR
+        safe_name = "".join(ch if ch.isalnum() or ch in "-_." else "-" for ch in trace.name)
+        path = os.path.join(directory, f"{trace.created:%Y%m%d_%H%M%S}_{safe_name}.json")
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace.to_dict(), f, indent=2)
+    except OSError as e:
+        print(f"[WARNING] Could not write trace {path}: {e}")
+        return None
+    return path
@@ -0,0 +1,88 @@
+import queue
+import threading
+from instrumentation import tracing
+
+class Job:
+    """One queued stage run: the callable, a snapshot of its inputs and the sheets it touches"""
+
+    def __init__(self, stage, title, func, values, sheets):
+        self.stage = stage
+        self.title = title
+        self.func = func
+        self.values = dict(values)
+        self.sheets = frozenset(sheets)
+        # Timing trace of the run, set by the worker once the job ended
+        self.trace = None
+
+    def conflicts_with(self, sheets):
+        """A stage conflicts with this job when they read or write any of the same sheets"""
+        return not self.sheets.isdisjoint(sheets)
+
+class JobRunner:
+    """
+    Runs queued jobs one at a time on a background worker thread.
+    Jobs run in submission order because every stage works on the same
+    format workbook. The worker never touches Tk: it posts
+    ("started", job), ("finished", job, result) and ("failed", job, error)
+    events that the GUI drains with poll() from a root.after loop.
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.events = queue.Queue()
+        self.current = None
+        self.pending = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._work, name="stage-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        with self._lock:
+            self.pending.append(job)
+        self.jobs.put(job)
+        return job
+
+    def post(self, kind, *payload):
+        """Send an event to the GUI thread; safe to call from any thread"""
+        self.events.put((kind,) + payload)
+
+    def poll(self):
+        """Every event posted since the last poll, oldest first"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    @property
+    def busy(self):
+        with self._lock:
+            return self.current is not None or bool(self.pending)
+
+    def waiting(self):
+        """Jobs queued behind the running one"""
+        with self._lock:
+            return list(self.pending)
+
+    def running(self):
+        with self._lock:
+            return self.current
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            with self._lock:
+                self.pending.remove(job)
+                self.current = job
+            self.post("started", job)
+            with tracing(job.title) as trace:
+                try:
+                    event = ("finished", job, job.func(job.values))
+                except Exception as e:
+                    event = ("failed", job, e)
+            job.trace = trace
+            # Clear the running job first so the GUI sees it idle when the event arrives
+            with self._lock:
+                self.current = None
+            self.post(*event)
@@ -0,0 +1,73 @@
+class LabelIndex:
+    """
+    Map of cell text -> coordinates for one worksheet, built in a single pass.
+    Anchor lookups (sign-off rows, header rows, section labels) become
+    dictionary hits instead of row-by-column scans of the whole sheet.
+
+    The index is a snapshot: rebuild it after inserting, deleting or moving rows.
+    Only existing cells are visited, so building it never adds cells to the sheet.
+    """
+
+    def __init__(self, sheet):
+        self.max_row = sheet.max_row
+        self.max_column = sheet.max_column
+        self.positions = {}
+        self.content_rows = set()
+        for (row, col), cell in sorted(sheet._cells.items()):
+            value = cell.value
+            if value is None or value == "":
+                continue
+            self.content_rows.add(row)
+            text = str(value).strip()
+            if text:
+                self.positions.setdefault(text, []).append((row, col))
+
+    @property
+    def last_content_row(self):
+        return max(self.content_rows, default=1)
+
+    def cells(self, min_row=1, max_row=None, min_col=1, max_col=None):
+        """(row, column, text) for every labelled cell in the range, in sheet order"""
+        return self.search(lambda text: True, min_row, max_row, min_col, max_col)
+
+    def search(self, predicate, min_row=1, max_row=None, min_col=1, max_col=None):
+        """(row, column, text) for every cell whose text satisfies predicate, in sheet order"""
+        max_row = max_row or self.max_row
+        max_col = max_col or self.max_column
+        found = []
+        for text, positions in self.positions.items():
+            if not predicate(text):
+                continue
+            found.extend((row, col, text) for row, col in positions
+                         if min_row <= row <= max_row and min_col <= col <= max_col)
+        found.sort()
+        return found
+
+    def find_all(self, label, min_row=1, max_row=None, min_col=1, max_col=None):
+        """All (row, column) positions whose stripped text equals label, in sheet order"""
+        max_row = max_row or self.max_row
+        max_col = max_col or self.max_column
+        return [(row, col) for row, col in self.positions.get(label, ())
+                if min_row <= row <= max_row and min_col <= col <= max_col]
+
+    def find(self, label, min_row=1, max_row=None, min_col=1, max_col=None):
+        """First (row, column) whose stripped text equals label, or (None, None)"""
+        matches = self.find_all(label, min_row, max_row, min_col, max_col)
+        return matches[0] if matches else (None, None)
+
+    def find_containing(self, fragment, min_row=1, max_row=None, min_col=1, max_col=None):
+        """First (row, column) whose text contains fragment, or (None, None)"""
+        matches = self.search(lambda text: fragment in text, min_row, max_row, min_col, max_col)
+        return matches[0][:2] if matches else (None, None)
+
+    def find_in_column(self, label, column, min_row=1, max_row=None):
+        """First row in column whose stripped text equals label, or None"""
+        row, _ = self.find(label, min_row, max_row, column, column)
+        return row
+
+    def first_empty_row(self, start_row):
+        """First row at or after start_row without any value, or None when every row to max_row has one"""
+        for row in range(start_row, self.max_row + 1):
+            if row not in self.content_rows:
+                return row
+        return None
@@ -0,0 +1,70 @@
+import os
+import sys
+import logging
+
+ROOT_LOGGER_NAME = "adani"
+DEFAULT_LEVEL = "INFO"
+
+# ADANI_LOG_LEVEL=WARNING sets the level of every module,
+# ADANI_LOG_LEVELS=stack=DEBUG,raw_material=INFO overrides single modules
+LEVEL_ENV = "ADANI_LOG_LEVEL"
+MODULE_LEVELS_ENV = "ADANI_LOG_LEVELS"
+
+_configured = False
+
+class ConsoleHandler(logging.StreamHandler):
+    """
+    Writes to whatever sys.stdout is when a record is emitted, so output
+    follows the GUI console redirect and the per-location batch log files.
+    """
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+def parse_module_levels(spec):
+    """Parse 'stack=DEBUG,raw_material=INFO' into {'stack': 'DEBUG', 'raw_material': 'INFO'}"""
+    levels = {}
+    for item in (spec or "").split(","):
+        module_name, sep, level = item.partition("=")
+        if sep and module_name.strip() and level.strip():
+            levels[module_name.strip()] = level.strip().upper()
+    return levels
+
+def set_module_level(module_name, level):
+    """Change the level of one module's logger, e.g. set_module_level('stack', 'DEBUG')"""
+    logging.getLogger(f"{ROOT_LOGGER_NAME}.{module_name}").setLevel(str(level).upper())
+
+def configure_logging(level=None, module_levels=None):
+    """
+    Attach the console handler and apply levels. Explicit arguments win over
+    the environment; the default level is INFO, which keeps per-cell DEBUG
+    messages in the stage loops switched off.
+    """
+    global _configured
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    if not _configured:
+        handler = ConsoleHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        root.addHandler(handler)
+        root.propagate = False
+        _configured = True
+
+    root.setLevel((level or os.environ.get(LEVEL_ENV) or DEFAULT_LEVEL).upper())
+    levels = parse_module_levels(os.environ.get(MODULE_LEVELS_ENV))
+    levels.update(module_levels or {})
+    for module_name, module_level in levels.items():
+        set_module_level(module_name, module_level)
+
+def get_logger(module_name):
+    """Logger for one pipeline module ('stack', 'raw_material', ...)"""
+    if not _configured:
+        configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{module_name}")
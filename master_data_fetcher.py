@@ -1,8 +1,12 @@
+import os
 import pandas as pd
+from pandas.io.parsers import TextParser
 from openpyxl import load_workbook
 from datetime import datetime
 from openpyxl.styles import Border, Side, PatternFill, Font, Alignment
 from copy import copy
+from label_index import LabelIndex
+from instrumentation import traced
 
 def format_current_date():
     """Format current date as '21st May' 25'"""
@@ -44,6 +48,132 @@ def process_auditor_names(auditor_names_str):
     
     return auditor_data
 
+class MasterDataStore:
+    """
+    Parsed copy of a master sheet with a hash index on (S Loc, Product Category).
+    The file is read once, in a single pass that also picks up the
+    'Audit Quarter:' value, so each lookup is a dictionary hit.
+    """
+
+    QUARTER_LABEL = 'Audit Quarter:'
+    HEADER_ROW = 3  # pd.read_excel(header=2)
+
+    def __init__(self, master_file_path):
+        self.master_file_path = master_file_path
+        self.signature = self.file_signature(master_file_path)
+        self.quarter = None
+        self.master_df = self._load()
+        self._build_index()
+
+    @staticmethod
+    def file_signature(master_file_path):
+        """Modification time and size, used to invalidate a cached store"""
+        stat = os.stat(master_file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _convert_value(value):
+        # Same cell conversion pandas applies when reading with openpyxl
+        if value is None:
+            return ""
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        return value
+
+    def _load(self):
+        wb = load_workbook(self.master_file_path, read_only=True, data_only=True)
+        try:
+            # The table is read from the first sheet (as pd.read_excel does) and
+            # the audit quarter from the active sheet; usually they are the same
+            sheet = wb.worksheets[0]
+            quarter_sheet = wb.active
+            rows = []
+            for row_idx, row in enumerate(sheet.iter_rows(values_only=True), 1):
+                if self.quarter is None and quarter_sheet is sheet:
+                    self._find_quarter(row)
+                if row_idx >= self.HEADER_ROW:
+                    rows.append([self._convert_value(value) for value in row])
+            if quarter_sheet is not sheet and quarter_sheet is not None:
+                for row in quarter_sheet.iter_rows(values_only=True):
+                    self._find_quarter(row)
+                    if self.quarter is not None:
+                        break
+        finally:
+            wb.close()
+
+        # Trim trailing empty rows and pad ragged rows, as pd.read_excel does
+        while rows and all(value == "" for value in rows[-1]):
+            rows.pop()
+        if not rows:
+            return pd.DataFrame()
+        width = max(len(row) for row in rows)
+        rows = [row + [""] * (width - len(row)) for row in rows]
+        return TextParser(rows, header=0).read()
+
+    def _find_quarter(self, row):
+        for col_idx, value in enumerate(row):
+            if value and self.QUARTER_LABEL in str(value):
+                # Get the cell to the right of 'Quarter'
+                quarter_value = row[col_idx + 1] if col_idx + 1 < len(row) else None
+                if quarter_value:
+                    self.quarter = str(quarter_value).strip()
+                    return
+
+    def _build_index(self):
+        self.by_location_category = {}
+        self.by_location = {}
+        self.by_category = {}
+        if self.master_df.empty or "S Loc" not in self.master_df.columns:
+            return
+
+        # Convert S Loc to string for comparison
+        self.master_df["S Loc"] = self.master_df["S Loc"].astype(str)
+        locations = self.master_df["S Loc"].str.strip()
+        if "Product Category" in self.master_df.columns:
+            categories = self.master_df["Product Category"].str.strip().str.lower()
+        else:
+            categories = pd.Series(index=self.master_df.index, dtype=object)
+
+        # Keep the first matching row for every key, like master_df.iloc[0] after filtering
+        for position, (location, category) in enumerate(zip(locations, categories)):
+            self.by_location.setdefault(location, position)
+            if isinstance(category, str):
+                self.by_category.setdefault(category, position)
+                self.by_location_category.setdefault((location, category), position)
+
+    def lookup(self, s_loc_code=None, category=None):
+        """Return the first master row matching S Loc Code and/or Category, or None"""
+        if self.master_df.empty:
+            return None
+        if s_loc_code and category:
+            position = self.by_location_category.get((s_loc_code, category))
+        elif s_loc_code:
+            position = self.by_location.get(s_loc_code)
+        elif category:
+            position = self.by_category.get(category)
+        else:
+            position = 0
+        if position is None:
+            return None
+        return self.master_df.iloc[position]
+
+    def pairs(self):
+        """All (S Loc, Product Category) pairs in master order"""
+        return [(location, self.master_df["Product Category"].iloc[position].strip())
+                for (location, _), position in self.by_location_category.items()]
+
+_master_stores = {}
+
+def get_master_store(master_file_path):
+    """Return the cached store for a master file, re-parsing it only when it changed on disk"""
+    key = os.path.abspath(master_file_path)
+    store = _master_stores.get(key)
+    if store is None or store.signature != MasterDataStore.file_signature(master_file_path):
+        store = MasterDataStore(master_file_path)
+        _master_stores[key] = store
+    return store
+
+@traced("fetch_master_data")
 def fetch_master_data(s_loc_code=None, category=None, master_file_path=None):
     """Fetch all required data from master sheet and return as a dictionary"""
     # Column mapping between format sheet labels and master sheet columns
@@ -67,24 +197,18 @@ def fetch_master_data(s_loc_code=None, category=None, master_file_path=None):
                 "error_message": "Master file path is required"
             }
 
-        # Load master data using pandas and openpyxl
-        master_df = pd.read_excel(master_file_path, header=2)
-        master_wb = load_workbook(master_file_path)
-        master_sheet = master_wb.active
+        # Parsed and indexed once per file version, reused across calls
+        store = get_master_store(master_file_path)
+        master_df = store.master_df
 
-        # Convert S Loc to string for comparison
-        master_df["S Loc"] = master_df["S Loc"].astype(str)
-        
-        # Filter data based on S Loc Code and Category if provided
         if s_loc_code:
             s_loc_code = str(s_loc_code).strip()  # Convert input to string and strip whitespace
-            master_df = master_df[master_df["S Loc"].str.strip() == s_loc_code]
         if category:
             category = str(category).strip().lower()  # Convert to lowercase and strip whitespace
-            master_df = master_df[master_df["Product Category"].str.strip().str.lower() == category]
+        data_row = store.lookup(s_loc_code, category)
 
         # Check if any data remains after filtering
-        if master_df.empty:
+        if data_row is None:
             return {
                 "master_data": {},
                 "auditor_data": {},
@@ -96,8 +220,6 @@ def fetch_master_data(s_loc_code=None, category=None, master_file_path=None):
         master_data = {}
         auditor_data = {}
 
-        data_row = master_df.iloc[0]
-        
         # Fill data based on column mapping
         for format_label, master_col in column_mapping.items():
             if master_col in master_df.columns:
@@ -112,8 +234,8 @@ def fetch_master_data(s_loc_code=None, category=None, master_file_path=None):
         # Add current date
         master_data["Date of Audit"] = format_current_date()
         
-        # Add quarter value if found
-        quarter_value = get_quarter_data(master_sheet)
+        # Add quarter value if found (located while the store parsed the file)
+        quarter_value = store.quarter
         if quarter_value:
             master_data["PSV Quarter"] = quarter_value
         
@@ -141,36 +263,24 @@ def fetch_master_data(s_loc_code=None, category=None, master_file_path=None):
             "error_message": str(e)
         }
 
-def find_signoff_section(sheet):
+def find_signoff_section(sheet, index=None):
     """Find the start and end row of sign-off section"""
-    start_row = None
-    end_row = None
-    
+    index = index or LabelIndex(sheet)
+
     # Find where the sign-off section starts by looking for "S Loc Incharge"
-    for row in range(1, sheet.max_row + 1):
-        for col in range(1, sheet.max_column + 1):
-            cell_value = sheet.cell(row=row, column=col).value
-            if cell_value and "S Loc Incharge" in str(cell_value):
-                start_row = row
-                # Find the end of sign-off section (first empty row after start)
-                for end_r in range(start_row + 1, sheet.max_row + 1):
-                    is_empty = True
-                    for c in range(1, sheet.max_column + 1):
-                        if sheet.cell(row=end_r, column=c).value:
-                            is_empty = False
-                            break
-                    if is_empty:
-                        end_row = end_r - 1
-                        break
-                if not end_row:  # If no empty row found
-                    end_row = sheet.max_row
-                return start_row, end_row
-    
-    return None, None
+    start_row, _ = index.find_containing("S Loc Incharge")
+    if start_row is None:
+        return None, None
+
+    # Find the end of sign-off section (first empty row after start)
+    empty_row = index.first_empty_row(start_row + 1)
+    end_row = empty_row - 1 if empty_row else sheet.max_row
+    return start_row, end_row
 
 def fill_signoff_section(sheet, master_data, auditor_data):
     """Fill the sign-off section with data from master sheet"""
-    signoff_start, signoff_end = find_signoff_section(sheet)
+    index = LabelIndex(sheet)
+    signoff_start, signoff_end = find_signoff_section(sheet, index=index)
     if not signoff_start:
         return
 
@@ -184,24 +294,20 @@ def fill_signoff_section(sheet, master_data, auditor_data):
     }
 
     # Fill in the values
-    for row in range(signoff_start, signoff_end + 1):
-        for col in range(1, sheet.max_column + 1):
-            cell = sheet.cell(row=row, column=col)
-            cell_value = str(cell.value) if cell.value else ""
-
-            # Check for each field in the mapping
-            for field, master_key in field_mapping.items():
-                if field in cell_value:
-                    # Get the cell below (for the name)
-                    name_cell = sheet.cell(row=row + 1, column=col)
-                    
-                    # Get value from master data or auditor data
-                    if field.startswith("Auditor"):
-                        value = auditor_data.get(master_key, "")
-                    else:
-                        value = master_data.get(master_key, "")
-                    
-                    name_cell.value = value
+    for row, col, cell_value in index.cells(min_row=signoff_start, max_row=signoff_end):
+        # Check for each field in the mapping
+        for field, master_key in field_mapping.items():
+            if field in cell_value:
+                # Get the cell below (for the name)
+                name_cell = sheet.cell(row=row + 1, column=col)
+
+                # Get value from master data or auditor data
+                if field.startswith("Auditor"):
+                    value = auditor_data.get(master_key, "")
+                else:
+                    value = master_data.get(master_key, "")
+
+                name_cell.value = value
 
 def update_all_sheets_signoff(master_data, auditor_data, format_file_path):
     try:
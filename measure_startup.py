@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from gui import STARTUP_PROBE_ENV, WARM_UP_ENV
+
+PROBE_TIMEOUT_SECONDS = 120
+
+def measure_once(command, warm_up=True):
+    """
+    Launch the GUI once and return (first_window, ready, exit) in seconds
+    after launch. ready is when the background warm-up finished.
+    """
+    fd, probe_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    env = dict(os.environ)
+    env[STARTUP_PROBE_ENV] = probe_path
+    env[WARM_UP_ENV] = "1" if warm_up else "0"
+    try:
+        started = time.time()
+        subprocess.run(command, env=env, timeout=PROBE_TIMEOUT_SECONDS, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        exited = time.time()
+        with open(probe_path, "r", encoding="utf-8") as f:
+            probe = json.load(f)
+    finally:
+        os.remove(probe_path)
+    return probe["first_window"] - started, probe["ready"] - started, exited - started
+
+def summarize(samples):
+    return {
+        "median": round(statistics.median(samples), 3),
+        "min": round(min(samples), 3),
+        "max": round(max(samples), 3),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure GUI time-to-first-window")
+    parser.add_argument("--exe", help="Packaged executable to measure instead of 'python gui.py'")
+    parser.add_argument("--runs", type=int, default=5, help="Number of launches (default 5)")
+    parser.add_argument("--no-warm-up", action="store_true", help="Disable the background import warm-up")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.exe:
+        command = [args.exe]
+    else:
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "gui.py")]
+
+    first_window, ready, exit_times = [], [], []
+    for run in range(1, args.runs + 1):
+        try:
+            window_s, ready_s, exit_s = measure_once(command, warm_up=not args.no_warm_up)
+        except (subprocess.SubprocessError, OSError, ValueError, KeyError) as e:
+            print(f"❌ Run {run} failed: {e}")
+            return 1
+        first_window.append(window_s)
+        ready.append(ready_s)
+        exit_times.append(exit_s)
+        print(f"Run {run}: first window {window_s:.3f}s, ready {ready_s:.3f}s")
+
+    results = {
+        "command": command,
+        "runs": args.runs,
+        "first_window": summarize(first_window),
+        "ready": summarize(ready),
+        "exit": summarize(exit_times),
+    }
+    print(f"✅ Time to first window: median {results['first_window']['median']:.3f}s "
+          f"(min {results['first_window']['min']:.3f}s, max {results['first_window']['max']:.3f}s)")
+    print(f"Time until stages are preloaded: median {results['ready']['median']:.3f}s")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to: {args.json}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import os
+from openpyxl import load_workbook
+from header import main as header_main
+from hygeine import fill_hygiene_sheet
+from app_mb52 import process_mb52
+from countsheet import process_count_sheet
+from stack import process_stack_data
+from raw_material import process_raw_material
+from template_plan import load_plan, record_derived_workbook
+from instrumentation import span
+from run_manifest import IncrementalRun, Stage
+from report_render import ENGINES, default_engine, usable_engine, enable_row_blocks, render_workbook
+
+# The header stage fills the Header sheet and the sign-off of every annexure
+HEADER_SHEETS = {"Header", "Annexure- Raw Material", "RM- Stack wise", "Annexure- Hygiene Obs",
+                 "Count Sheet", "Mb52- Stock Report"}
+
+class StageFailed(Exception):
+    """A stage reported an error (it printed the details) instead of raising it"""
+
+class PipelineSession:
+    """
+    Owns a single in-memory copy of the format workbook for a whole run.
+    Every stage is handed this workbook instead of loading and saving the
+    template itself, so format.xlsx is parsed once and written once.
+    The compiled template plan (anchors, column maps, style ids) is loaded
+    alongside it so stages can skip their label scans; a workbook saved over
+    its template keeps using that template's plan.
+    With engine="stream" stages keep their generated rows as row blocks and
+    save() streams the sheets to a write-only workbook (see report_render).
+    """
+
+    def __init__(self, format_file_path, output_file_path=None, engine=None):
+        self.format_file_path = format_file_path
+        self.output_file_path = output_file_path or format_file_path
+        self.engine = engine or default_engine()
+        if self.engine not in ENGINES:
+            raise ValueError(f"Unknown output engine '{self.engine}' (expected one of: {', '.join(ENGINES)})")
+        self.engine = usable_engine(self.engine)
+        print(f"Loading format workbook: {format_file_path}")
+        with span("load workbook"):
+            self.workbook = load_workbook(format_file_path)
+            self.plan = load_plan(format_file_path, wb=self.workbook)
+        if self.engine == "stream":
+            enable_row_blocks(self.workbook)
+
+    def sheet(self, sheet_name):
+        """Return a worksheet of the session workbook"""
+        return self.workbook[sheet_name]
+
+    def save(self):
+        """Write the session workbook to the output path"""
+        with span("save"):
+            if self.engine == "stream":
+                render_workbook(self.workbook, self.output_file_path)
+            else:
+                self.workbook.save(self.output_file_path)
+            if os.path.abspath(self.output_file_path) == os.path.abspath(self.format_file_path):
+                record_derived_workbook(self.plan, self.output_file_path)
+        print(f"✅ Workbook saved to: {self.output_file_path}")
+
+    def close(self):
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def run_all(master_data, auditor_data, format_file_path, output_file_path=None, s_loc_code=None,
+            hygiene_input_file_path=None, mb52_input_file_path=None,
+            countsheet_input_file_path=None, stack_input_file_path=None, incremental=True,
+            engine=None):
+    """
+    Run the full stage chain (header, hygiene, MB52, count sheet, stack, raw material)
+    against one in-memory workbook and save it once at the end.
+    Stages whose input file is not provided are skipped. A stage that
+    reports an error stops the run with StageFailed, so later stages never
+    build on its half-written sheets.
+
+    When writing to a separate output file, stages whose inputs and upstream
+    sheets are unchanged since the last run reuse that run's sheets (see
+    run_manifest), and a run that fails saves a checkpoint to resume from.
+    incremental=False runs every stage. engine picks how the workbook is
+    written: "openpyxl" or "stream" (default from ADANI_OUTPUT_ENGINE).
+    """
+    s_loc_code = s_loc_code or master_data.get("S Loc Code")
+    output_file_path = output_file_path or format_file_path
+    master_row = {"master_data": master_data, "auditor_data": auditor_data}
+
+    run = IncrementalRun(format_file_path, output_file_path, enabled=incremental)
+    stages = [
+        (Stage("header", "Header", HEADER_SHEETS, data=master_row, code=("header",)),
+         lambda wb, plan: header_main(
+             master_data=master_data,
+             auditor_data=auditor_data,
+             output_file_path=output_file_path,
+             format_file_path=format_file_path,
+             wb=wb
+         )),
+        (Stage("hygiene", "Hygiene", {"Annexure- Hygiene Obs"}, input_file_path=hygiene_input_file_path,
+               data=master_data, active=bool(hygiene_input_file_path), code=("hygeine", "checkpoint_matcher")),
+         lambda wb, plan: fill_hygiene_sheet(master_data, format_file_path, hygiene_input_file_path, wb=wb, plan=plan)),
+        (Stage("mb52", "MB52", {"Mb52- Stock Report"}, input_file_path=mb52_input_file_path,
+               data=s_loc_code, active=bool(mb52_input_file_path), code=("app_mb52",)),
+         lambda wb, plan: process_mb52(format_file_path, mb52_input_file_path, s_loc_code, wb=wb, plan=plan)),
+        (Stage("countsheet", "Count Sheet", {"Count Sheet"}, input_file_path=countsheet_input_file_path,
+               active=bool(countsheet_input_file_path), code=("countsheet",)),
+         lambda wb, plan: process_count_sheet(countsheet_input_file_path, format_file_path, wb=wb, plan=plan)),
+        (Stage("stack", "Stack", {"RM- Stack wise"}, input_file_path=stack_input_file_path,
+               data=master_data, active=bool(stack_input_file_path), code=("stack",)),
+         lambda wb, plan: process_stack_data(stack_input_file_path, format_file_path, master_data, wb=wb, plan=plan)),
+        (Stage("raw_material", "Raw Material", {"Annexure- Raw Material"},
+               reads={"Mb52- Stock Report", "RM- Stack wise"}, data=master_data, code=("raw_material",)),
+         lambda wb, plan: process_raw_material(format_file_path, master_data, wb=wb, plan=plan)),
+    ]
+    for stage, _ in stages:
+        run.add_stage(stage)
+    run.resolve()
+    if run.up_to_date():
+        print(f"✅ {output_file_path} is up to date; no stage needs to run")
+        return output_file_path
+
+    with PipelineSession(format_file_path, output_file_path, engine=engine) as session:
+        wb = session.workbook
+        plan = session.plan
+
+        for stage, run_stage in stages:
+            if not stage.active:
+                print(f"\nSkipping {stage.title} stage: no input file")
+                continue
+            if stage.reuse:
+                print(f"\nSkipping {stage.title} stage: unchanged since the last run")
+                continue
+            print(f"\n=== Stage: {stage.title} ===")
+            try:
+                run.before_stage(wb, stage)
+                if not run_stage(wb, plan):
+                    raise StageFailed(f"{stage.title} stage reported an error")
+            except Exception:
+                save_checkpoint(session, run, stage)
+                raise
+            run.stage_done(stage)
+
+        run.before_save(wb)
+        session.save()
+        run.write_manifest()
+    return output_file_path
+
+def save_checkpoint(session, run, stage):
+    """Save the stages completed so far, so the next run resumes at the failed one"""
+    if not run.enabled:
+        return
+    try:
+        run.stage_failed(session.workbook, stage)
+        print(f"[INFO] Saving checkpoint; the next run resumes from the {stage.title} stage")
+        session.save()
+        run.write_manifest()
+    except Exception as e:
+        print(f"[WARNING] Could not save checkpoint: {e}")
+    finally:
+        run.close()
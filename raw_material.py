@@ -1,38 +1,61 @@
+import time
+import logging
 import pandas as pd
+from pandas.io.parsers import TextParser
 import numpy as np
 from openpyxl import load_workbook
 from openpyxl.styles import Alignment, Border, Side, Font, PatternFill, Protection
 from copy import copy
+from template_plan import has_label
+from label_index import LabelIndex
+from row_layout import move_block_down
+from log_setup import get_logger
+from instrumentation import traced, phase, end_phase
+from report_render import iter_row_values
 
-def process_mb52_stock(excel_path):
-    # Load the workbook with data_only=True to get calculated values
-    wb = load_workbook(filename=excel_path, data_only=True)
+logger = get_logger("raw_material")
+
+def sheet_rows(sheet, header):
+    """Cell values from the header row down, without trailing empty rows"""
+    # Includes rows the stream engine holds as row blocks
+    rows = [list(row) for row in iter_row_values(sheet, min_row=header + 1)]
+    # Drop trailing empty rows, as pandas does when reading a file
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+    return rows
+
+def sheet_to_dataframe(sheet, header, rows=None):
+    """
+    Build a DataFrame from an in-memory worksheet the way pd.read_excel(header=header)
+    would read it from disk, so stages can share a pipeline session's workbook.
+    Pass rows from sheet_rows() to reuse values that were already read.
+    """
+    rows = sheet_rows(sheet, header) if rows is None else rows
+    if not rows:
+        return pd.DataFrame()
+    # Same parser pd.read_excel uses, so dtypes and header names match a file read
+    return TextParser(rows, header=0).read()
+
+@traced("process_mb52_stock")
+def process_mb52_stock(excel_path, wb=None):
+    # Read the MB52 sheet once; the DataFrame and the raw Unrestricted values share it
+    owns_workbook = wb is None
+    if owns_workbook:
+        wb = load_workbook(filename=excel_path)
     sheet = wb['Mb52- Stock Report']
+    rows = sheet_rows(sheet, header=1)
+    mb52_df = sheet_to_dataframe(sheet, header=1, rows=rows)
+    if owns_workbook:
+        wb.close()
     
-    # Read the regular data with pandas
-    mb52_df = pd.read_excel(
-        excel_path, 
-        sheet_name='Mb52- Stock Report', 
-        header=1
-    )
-    
-    # Get the column index for Unrestricted
-    header_row = 2  # since header=1 in pandas
-    unrestricted_col = None
-    for col in range(1, sheet.max_column + 1):
-        if sheet.cell(row=header_row, column=col).value == 'Unrestricted':
-            unrestricted_col = col
-            break
-    
-    # Get calculated values for Unrestricted
-    if unrestricted_col:
-        unrestricted_values = []
-        for row in range(header_row + 1, sheet.max_row + 1):
-            value = sheet.cell(row=row, column=unrestricted_col).value
-            if isinstance(value, (int, float)):  # Only append numeric values
-                unrestricted_values.append(value)
-            else:
-                unrestricted_values.append('')
+    # Take Unrestricted straight from the cells, keeping only numeric values
+    header_values = rows[0] if rows else []
+    if 'Unrestricted' in header_values:
+        unrestricted_idx = header_values.index('Unrestricted')
+        unrestricted_values = [
+            row[unrestricted_idx] if isinstance(row[unrestricted_idx], (int, float)) else ''
+            for row in rows[1:]
+        ]
         
         # Replace the Unrestricted column in mb52_df
         mb52_df['Unrestricted'] = pd.Series(unrestricted_values[:len(mb52_df)])
@@ -89,167 +112,154 @@ def copy_cell_format(source_cell, target_cell):
     if source_cell.has_style:
         target_cell._style = copy(source_cell._style)
 
-def find_signoff_section(sheet):
+def find_signoff_section(sheet, start_row=1, index=None):
     """Find the start and end row of sign-off section"""
-    for row in range(1, sheet.max_row + 1):
-        for col in range(1, sheet.max_column + 1):
-            cell_value = sheet.cell(row=row, column=col).value
-            if cell_value and "S Loc Incharge" in str(cell_value):
-                # Find the end of sign-off section
-                end_row = row
-                while end_row <= sheet.max_row:
-                    if all(sheet.cell(row=end_row, column=col).value is None 
-                          for col in range(1, sheet.max_column + 1)):
-                        end_row -= 1
-                        break
-                    end_row += 1
-                return row, end_row
-    return None, None
+    index = index or LabelIndex(sheet)
+    row, _ = index.find_containing("S Loc Incharge", min_row=start_row)
+    if row is None:
+        return None, None
+    # The section ends just before the first empty row
+    empty_row = index.first_empty_row(row)
+    end_row = empty_row - 1 if empty_row else sheet.max_row
+    return row, end_row
 
 def move_range_down(sheet, start_row, end_row, shift_amount):
     """Move a range of cells down by shift_amount rows"""
-    if start_row is None or end_row is None:
-        return
-        
-    # Move from bottom to top to avoid overwriting
-    for row in range(end_row, start_row - 1, -1):
-        for col in range(1, sheet.max_column + 1):
-            source_cell = sheet.cell(row=row, column=col)
-            target_cell = sheet.cell(row=row + shift_amount, column=col)
-            
-            # Copy value and style
-            target_cell.value = source_cell.value
-            if source_cell.has_style:
-                target_cell._style = copy(source_cell._style)
-            
-            # Clear source cell
-            source_cell.value = None
+    move_block_down(sheet, start_row, end_row, shift_amount)
 
-def find_header_row(sheet):
+def find_header_row(sheet, index=None):
     """Find the row containing the column headers"""
-    for row in range(1, sheet.max_row + 1):
-        cell_value = str(sheet.cell(row=row, column=2).value or '').strip()  # Look in column B
-        if cell_value == 'S Loc Code':
-            return row
-    return None
+    index = index or LabelIndex(sheet)
+    return index.find_in_column('S Loc Code', 2)  # Look in column B
 
-def find_total_row(sheet, header_row, sign_off_start):
+def find_total_row(sheet, header_row, sign_off_start, index=None):
     """Find the row containing 'Total' label"""
-    for row in range(header_row + 1, sign_off_start):
-        cell_value = str(sheet.cell(row=row, column=4).value or '').strip()  # Column D (Material Name)
-        if cell_value == 'Total':
-            return row
-    return None
+    index = index or LabelIndex(sheet)
+    return index.find_in_column('Total', 4, min_row=header_row + 1, max_row=sign_off_start - 1)  # Column D (Material Name)
 
-def process_rm_stack_wise(excel_path):
+def net_weight_by_material(section):
+    """
+    Sum Qty. In MT minus Bardana Weight per Material Code for one section of
+    the stack sheet, skipping label rows, 'Total Stock' rows and rows without
+    a material code or a numeric quantity/bardana. Materials keep the order
+    of their first stack.
+    """
+    stack_labels = section['Stack No. (With Stock)']
+    section = section[stack_labels.notna() & (stack_labels != 'Total Stock')]
+    section = section[section['Material Code'].notna()]
+    if section.empty:
+        return {}
+
+    def numeric_column(name):
+        if name not in section:
+            return pd.Series(0.0, index=section.index)
+        return pd.to_numeric(section[name], errors='coerce').astype(float)
+
+    net_weight = numeric_column('Qty. In MT') - numeric_column('Bardana Weight')
+    net_weight = net_weight[net_weight.notna()]
+    material_codes = section['Material Code'][net_weight.index]
+    totals = net_weight.groupby(material_codes, sort=False).sum()
+    return totals.to_dict()
+
+@traced("process_rm_stack_wise")
+def process_rm_stack_wise(excel_path, wb=None):
     """
     Process the RM Stack Wise sheet to get physical stock and fumigation stock data
     Returns two dictionaries mapping material codes to their respective net weights
     """
-    print("\n=== Processing RM Stack Wise Sheet ===")
+    logger.info("\n=== Processing RM Stack Wise Sheet ===")
     # Read the RM Stack Wise sheet
-    print(f"Reading Excel file: {excel_path}")
-    df = pd.read_excel(excel_path, sheet_name='RM- Stack wise', header=6)
-    print(f"Total rows read: {len(df)}")
-
-    # Find the index where 'Stock under Fumigation' appears
-    fumigation_start_idx = None
-    for i, row in df.iterrows():
-        if isinstance(row.get('Stack No. (With Stock)'), str) and 'Stock under Fumigation' in row.get('Stack No. (With Stock)', ''):
-            fumigation_start_idx = i
-            break
+    if wb is None:
+        logger.info("Reading Excel file: %s", excel_path)
+        df = pd.read_excel(excel_path, sheet_name='RM- Stack wise', header=6)
+    else:
+        df = sheet_to_dataframe(wb['RM- Stack wise'], header=6)
+    logger.info("Total rows read: %s", len(df))
 
-    if fumigation_start_idx is not None:
+    # Split at the first 'Stock under Fumigation' label
+    stack_labels = df['Stack No. (With Stock)']
+    fumigation_label_rows = np.flatnonzero(
+        stack_labels.astype(str).str.contains('Stock under Fumigation', regex=False).to_numpy())
+    if len(fumigation_label_rows):
+        fumigation_start_idx = fumigation_label_rows[0]
         general_data = df.iloc[:fumigation_start_idx]
         fumigation_data = df.iloc[fumigation_start_idx+1:]
     else:
         general_data = df
-        fumigation_data = pd.DataFrame()  # empty
-
-    # Clean up general_data and fumigation_data
-    general_data = general_data[general_data['Stack No. (With Stock)'].notna()]
-    general_data = general_data[general_data['Stack No. (With Stock)'] != 'Total Stock']
-
-    fumigation_data = fumigation_data[fumigation_data['Stack No. (With Stock)'].notna()]
-    fumigation_data = fumigation_data[fumigation_data['Stack No. (With Stock)'] != 'Total Stock']
+        fumigation_data = df.iloc[0:0]  # empty
 
-    # Initialize dictionaries to store results
-    physical_stock = {}
-    fumigation_stock = {}
+    physical_stock = net_weight_by_material(general_data)
+    fumigation_stock = net_weight_by_material(fumigation_data)
 
-    # Process general section
-    for _, row in general_data.iterrows():
-        material_code = row['Material Code']
-        if pd.notna(material_code):
-            try:
-                qty_in_mt = pd.to_numeric(row.get('Qty. In MT', 0), errors='coerce')
-                bardana_weight = pd.to_numeric(row.get('Bardana Weight', 0), errors='coerce')
-                if pd.notna(qty_in_mt) and pd.notna(bardana_weight):
-                    net_weight = float(qty_in_mt) - float(bardana_weight)
-                    physical_stock[material_code] = physical_stock.get(material_code, 0) + net_weight
-            except (ValueError, TypeError):
-                continue
-
-    # Process fumigation section
-    for _, row in fumigation_data.iterrows():
-        material_code = row['Material Code']
-        if pd.notna(material_code):
-            try:
-                qty_in_mt = pd.to_numeric(row.get('Qty. In MT', 0), errors='coerce')
-                bardana_weight = pd.to_numeric(row.get('Bardana Weight', 0), errors='coerce')
-                if pd.notna(qty_in_mt) and pd.notna(bardana_weight):
-                    net_weight = float(qty_in_mt) - float(bardana_weight)
-                    fumigation_stock[material_code] = fumigation_stock.get(material_code, 0) + net_weight
-            except (ValueError, TypeError):
-                continue
-
-    print("\nFinal Stock Summary:")
-    print("Physical Stock:", physical_stock)
-    print("Fumigation Stock:", fumigation_stock)
+    logger.info("\nFinal Stock Summary: %d materials in physical stock, %d under fumigation",
+                len(physical_stock), len(fumigation_stock))
+    logger.debug("Physical Stock: %s", physical_stock)
+    logger.debug("Fumigation Stock: %s", fumigation_stock)
     return physical_stock, fumigation_stock
 
-def update_annexure_sheet(format_file_path, processed_data, master_data):
-    print("\n=== Updating Annexure Sheet ===")
-    # Get physical stock and fumigation stock data
-    print("Getting physical and fumigation stock data...")
-    physical_stock_dict, fumigation_stock_dict = process_rm_stack_wise(format_file_path)
+@traced("update_annexure_sheet")
+def update_annexure_sheet(format_file_path, processed_data, master_data, wb=None, plan=None,
+                          physical_stock_dict=None, fumigation_stock_dict=None):
+    """
+    Write the raw material annexure. Pass the stock dicts from
+    process_rm_stack_wise when they are already known; otherwise the
+    stack sheet is read again to compute them.
+    """
+    started = time.perf_counter()
+    # Checked once: per-material DEBUG messages cost nothing at the default level
+    debug = logger.isEnabledFor(logging.DEBUG)
+    logger.info("\n=== Updating Annexure Sheet ===")
+    if physical_stock_dict is None or fumigation_stock_dict is None:
+        # Get physical stock and fumigation stock data
+        logger.info("Getting physical and fumigation stock data...")
+        physical_stock_dict, fumigation_stock_dict = process_rm_stack_wise(format_file_path, wb=wb)
     
-    # Load the workbook
-    print(f"Loading workbook: {format_file_path}")
-    wb = load_workbook(format_file_path)
+    # Load the workbook (or use the pipeline session's one)
+    owns_workbook = wb is None
+    if owns_workbook:
+        phase("load workbook")
+        logger.info("Loading workbook: %s", format_file_path)
+        wb = load_workbook(format_file_path)
     annexure_sheet = wb['Annexure- Raw Material']
 
     # Fill header data (Date and PSV Quarter)
-    print("Filling header data...")
+    logger.info("Filling header data...")
     annexure_sheet['C2'] = master_data.get("Date of Audit")
     annexure_sheet['C3'] = master_data.get("PSV Quarter")
     
     # Find the sign-off section
-    print("Looking for sign-off section...")
-    sign_off_start, sign_off_end = find_signoff_section(annexure_sheet)
+    phase("anchor search")
+    logger.info("Looking for sign-off section...")
+    sheet_plan = plan.sheet('Annexure- Raw Material') if plan else {}
+    sign_off = sheet_plan.get("sign_off", {})
+    search_from = 1
+    if has_label(annexure_sheet, sign_off.get("row"), sign_off.get("column"), "S Loc Incharge", exact=False):
+        search_from = sign_off["row"]
+    index = LabelIndex(annexure_sheet)
+    sign_off_start, sign_off_end = find_signoff_section(annexure_sheet, start_row=search_from, index=index)
     
     if sign_off_start is None:
         raise ValueError("Could not find sign-off section (S Loc Incharge row) in the Annexure sheet")
-    print(f"Found sign-off section: rows {sign_off_start} to {sign_off_end}")
+    logger.info("Found sign-off section: rows %s to %s", sign_off_start, sign_off_end)
     
     # Find the header row
-    print("Looking for header row...")
-    header_row = find_header_row(annexure_sheet)
+    logger.info("Looking for header row...")
+    if has_label(annexure_sheet, sheet_plan.get("header_row"), 2, 'S Loc Code'):
+        header_row = sheet_plan["header_row"]
+    else:
+        header_row = find_header_row(annexure_sheet, index=index)
     
     if header_row is None:
         raise ValueError("Could not find the header row with 'S Loc Code' in column B")
-    print(f"Found header row: {header_row}")
+    logger.info("Found header row: %s", header_row)
     
     data_start_row = header_row + 1
-    print(f"Data will start at row: {data_start_row}")
+    logger.info("Data will start at row: %s", data_start_row)
     
     # Find the first existing Total row
-    total_row_num = None
-    for row in range(data_start_row, sign_off_start):
-        if str(annexure_sheet.cell(row=row, column=4).value or '').strip() == 'Total':
-            total_row_num = row
-            print(f"Found existing Total row at: {total_row_num}")
-            break
+    total_row_num = find_total_row(annexure_sheet, header_row, sign_off_start, index=index)
+    if total_row_num:
+        logger.info("Found existing Total row at: %s", total_row_num)
     
     # Store the Total row formatting (from first found Total row)
     total_row_info = None
@@ -260,6 +270,7 @@ def update_annexure_sheet(format_file_path, processed_data, master_data):
             total_row_info.append((None, cell._style if cell.has_style else None))
     
     # Calculate required rows and shift amount
+    phase("row insertion")
     required_rows = len(processed_data)  # We'll add the Total row separately
     current_space = sign_off_start - data_start_row
     
@@ -279,6 +290,7 @@ def update_annexure_sheet(format_file_path, processed_data, master_data):
                 cell._style = new_style
     
     # Get template row for formatting
+    phase("write rows")
     template_row = data_start_row
     template_cells = {col: annexure_sheet.cell(row=template_row, column=col) 
                      for col in range(1, annexure_sheet.max_column + 1)}
@@ -299,15 +311,16 @@ def update_annexure_sheet(format_file_path, processed_data, master_data):
     }
     
     # Process data
-    print("\nProcessing data rows...")
+    logger.info("\nProcessing data rows...")
     data_without_total = processed_data[processed_data['Material Name'] != 'Total']
-    print(f"Number of data rows to process: {len(data_without_total)}")
+    logger.info("Number of data rows to process: %s", len(data_without_total))
     physical_total = 0
     fumigation_total = 0
     
     for idx, (_, row_data) in enumerate(data_without_total.iterrows()):
         current_row = data_start_row + idx
-        print(f"\nProcessing row {current_row}:")
+        if debug:
+            logger.debug("\nProcessing row %s:", current_row)
         
         # Create a new row with template formatting
         for col in range(1, annexure_sheet.max_column + 1):
@@ -324,7 +337,8 @@ def update_annexure_sheet(format_file_path, processed_data, master_data):
                 
                 if col_name == 'Material Code':
                     material_code = row_data[col_name]
-                    print(f"Material Code: {material_code}")
+                    if debug:
+                        logger.debug("Material Code: %s", material_code)
                 
                 # Handle special columns
                 if col_name == 'Physical Stock - Net Weight' and material_code:
@@ -334,7 +348,8 @@ def update_annexure_sheet(format_file_path, processed_data, master_data):
                     else:
                         cell.value = value
                         physical_total = round(physical_total + value, 2)
-                    print(f"Physical Stock: {cell.value}")
+                    if debug:
+                        logger.debug("Physical Stock: %s", cell.value)
                 elif col_name == 'Stock under Fumigation' and material_code:
                     value = fumigation_stock_dict.get(material_code)
                     if value is None or not isinstance(value, (int, float)) or value == 0:
@@ -342,7 +357,8 @@ def update_annexure_sheet(format_file_path, processed_data, master_data):
                     else:
                         cell.value = value
                         fumigation_total = round(fumigation_total + value, 2)
-                    print(f"Fumigation Stock: {cell.value}")
+                    if debug:
+                        logger.debug("Fumigation Stock: %s", cell.value)
                 elif col_name == 'Total Physical Stock' and material_code:
                     # Set Excel formula for this row
                     cell.value = f"=G{current_row}+H{current_row}"
@@ -352,15 +368,16 @@ def update_annexure_sheet(format_file_path, processed_data, master_data):
                 else:
                     cell.value = row_data[col_name]
             except Exception as e:
-                print(f"Error processing cell {col_letter}{current_row}: {str(e)}")
+                logger.error("Error processing cell %s%s: %s", col_letter, current_row, e)
                 continue
     
     # Add Total row
-    print("\nAdding Total row...")
+    phase("totals")
+    logger.info("\nAdding Total row...")
     total_row = data_start_row + len(data_without_total)
-    print(f"Total row will be at: {total_row}")
-    print(f"Final Physical Total: {physical_total}")
-    print(f"Final Fumigation Total: {fumigation_total}")
+    logger.info("Total row will be at: %s", total_row)
+    logger.info("Final Physical Total: %s", physical_total)
+    logger.info("Final Fumigation Total: %s", fumigation_total)
     
     for col in range(1, annexure_sheet.max_column + 1):
         cell = annexure_sheet.cell(row=total_row, column=col)
@@ -394,20 +411,60 @@ def update_annexure_sheet(format_file_path, processed_data, master_data):
             end_row = total_row - 1
             cell.value = f'=ROUND(SUM(J{start_row}:J{end_row}), 2)'
     
-    print("\nSaving workbook...")
-    wb.save(format_file_path)
-    print("Update complete!")
+    if owns_workbook:
+        phase("save")
+        logger.info("\nSaving workbook...")
+        wb.save(format_file_path)
+    logger.info("Annexure summary: %d materials, physical total %s, fumigation total %s, %.2fs",
+                len(data_without_total), physical_total, fumigation_total, time.perf_counter() - started)
+    logger.info("Update complete!")
 
-def process_raw_material(format_file_path, master_data):
-    processed_data = process_mb52_stock(format_file_path)
-    physical_stock, fumigation_stock = process_rm_stack_wise(format_file_path)
+def annexure_data(format_file_path, wb):
+    """
+    MB52 stock rows merged with the stack-wise net weights, plus the
+    physical and fumigation stock dicts they were taken from
+    """
+    processed_data = process_mb52_stock(format_file_path, wb=wb)
+    physical_stock, fumigation_stock = process_rm_stack_wise(format_file_path, wb=wb)
     # Update processed_data with physical and fumigation stock
-    for idx, row in processed_data.iterrows():
-        material_code = row['Material Code']
-        if pd.notna(material_code):
-            processed_data.at[idx, 'Physical Stock - Net Weight'] = physical_stock.get(material_code, '')
-            processed_data.at[idx, 'Stock under Fumigation'] = fumigation_stock.get(material_code, '')
-    update_annexure_sheet(format_file_path, processed_data, master_data)
+    material_codes = processed_data['Material Code']
+    has_code = material_codes.notna()
+    processed_data.loc[has_code, 'Physical Stock - Net Weight'] = material_codes[has_code].map(
+        lambda material_code: physical_stock.get(material_code, ''))
+    processed_data.loc[has_code, 'Stock under Fumigation'] = material_codes[has_code].map(
+        lambda material_code: fumigation_stock.get(material_code, ''))
+    return processed_data, physical_stock, fumigation_stock
+
+def has_stock_data(processed_data, physical_stock, fumigation_stock):
+    """True when the MB52 sheet lists a material or the stack sheet holds net weights"""
+    materials = processed_data['Material Name'] != 'Total'
+    return bool(materials.any() or physical_stock or fumigation_stock)
+
+@traced("process_raw_material")
+def process_raw_material(format_file_path, master_data, wb=None, plan=None):
+    """
+    Rebuild the raw material annexure from the MB52 and stack sheets.
+    With neither sheet filled yet the annexure is left as it is.
+    """
+    # Load format.xlsx once; the MB52 and stack sheets are read from this
+    # workbook and the annexure is written to it
+    owns_workbook = wb is None
+    if owns_workbook:
+        phase("load workbook")
+        logger.info("Loading workbook: %s", format_file_path)
+        wb = load_workbook(format_file_path)
+        end_phase()
+    processed_data, physical_stock, fumigation_stock = annexure_data(format_file_path, wb)
+    if not has_stock_data(processed_data, physical_stock, fumigation_stock):
+        logger.warning("No MB52 or stack data to build the annexure from; leaving it unchanged")
+        return True
+    update_annexure_sheet(format_file_path, processed_data, master_data, wb=wb, plan=plan,
+                          physical_stock_dict=physical_stock, fumigation_stock_dict=fumigation_stock)
+    if owns_workbook:
+        phase("save")
+        logger.info("\nSaving workbook...")
+        wb.save(format_file_path)
+    return True
 
 def main():
     pass
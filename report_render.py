@@ -0,0 +1,231 @@
+import os
+import openpyxl
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+from row_styles import FORMAT_FIELDS
+
+# "openpyxl" saves the session workbook as it is; "stream" keeps generated
+# rows as RowBlocks and streams every sheet to a write-only workbook.
+# ADANI_OUTPUT_ENGINE=stream switches Run All and batch mode by default.
+ENGINES = ("openpyxl", "stream")
+ENGINE_ENV = "ADANI_OUTPUT_ENGINE"
+# The stream engine reaches into openpyxl internals (write-only sheets, style
+# tables, cell and dimension attributes) as they are in these releases; on any
+# other release workbooks are saved with openpyxl instead
+STREAM_OPENPYXL_VERSIONS = ("3.1",)
+
+# Shared style lists cell style ids point into; the output gets copies, so the
+# template's ids are valid in it unchanged
+STYLE_TABLES = ("_fonts", "_fills", "_borders", "_number_formats", "_protections", "_alignments",
+                "_cell_styles")
+WORKBOOK_ATTRIBUTES = ("_named_styles", "_differential_styles", "_colors", "_external_links",
+                       "_active_sheet_index", "loaded_theme", "defined_names", "calculation", "views",
+                       "properties", "custom_doc_props", "security", "code_name", "epoch")
+SHEET_ATTRIBUTES = ("sheet_state", "sheet_properties", "sheet_format", "views", "page_setup",
+                    "print_options", "page_margins", "HeaderFooter", "protection", "auto_filter",
+                    "conditional_formatting", "data_validations", "defined_names", "row_breaks",
+                    "col_breaks", "legacy_drawing", "_print_area", "_print_rows", "_print_cols",
+                    "_images", "_charts", "_tables")
+
+def default_engine():
+    engine = os.environ.get(ENGINE_ENV, "").strip().lower()
+    return engine if engine in ENGINES else "openpyxl"
+
+def stream_supported(version=None):
+    """True when the installed openpyxl (or version) is a release the stream engine was built for"""
+    major_minor = ".".join((version or openpyxl.__version__).split(".")[:2])
+    return major_minor in STREAM_OPENPYXL_VERSIONS
+
+def usable_engine(engine):
+    """engine, or "openpyxl" when it is "stream" and the installed openpyxl is not supported"""
+    if engine == "stream" and not stream_supported():
+        print(f"[WARNING] The stream engine supports openpyxl {', '.join(STREAM_OPENPYXL_VERSIONS)}.x, "
+              f"found {openpyxl.__version__}; saving with openpyxl")
+        return "openpyxl"
+    return engine
+
+class RowBlock:
+    """
+    Generated rows of a sheet kept as column values instead of cells.
+
+    Covers rows first_row..first_row + num_rows - 1. columns maps a column
+    number to its values (one per row). styles maps a column number to the
+    style id of all its rows: with format_only only the formatting fields are
+    taken and the cell keeps its own flags, as apply_style_id does. With clear,
+    styled columns without values are blanked. Cells already in the sheet
+    show through wherever the block sets nothing.
+    """
+
+    def __init__(self, first_row, num_rows, columns, styles=None, clear=False, format_only=False):
+        self.first_row = first_row
+        self.num_rows = num_rows
+        self.columns = columns
+        self.styles = styles or {}
+        self.clear = clear
+        self.format_only = format_only
+        self.max_column = max(list(columns) + list(self.styles), default=0)
+
+    @property
+    def last_row(self):
+        return self.first_row + self.num_rows - 1
+
+    def value(self, offset, col):
+        """(has value, value) of a cell, so None can overwrite a base value"""
+        if col in self.columns:
+            return True, self.columns[col][offset]
+        if self.clear and col in self.styles:
+            return True, None
+        return False, None
+
+def enable_row_blocks(wb):
+    """Let stages record generated rows of this workbook as RowBlocks"""
+    wb._row_blocks_enabled = True
+
+def row_blocks_enabled(ws):
+    return getattr(ws.parent, "_row_blocks_enabled", False)
+
+def add_row_block(ws, block):
+    if block.num_rows > 0:
+        if not hasattr(ws, "_row_blocks"):
+            ws._row_blocks = []
+        ws._row_blocks.append(block)
+
+def row_blocks(ws):
+    """Blocks of a sheet in row order"""
+    return sorted(getattr(ws, "_row_blocks", ()), key=lambda block: block.first_row)
+
+def clear_row_blocks(ws):
+    ws._row_blocks = []
+
+def block_at(blocks, row):
+    for block in blocks:
+        if block.first_row <= row <= block.last_row:
+            return block
+    return None
+
+def iter_row_values(ws, min_row):
+    """
+    Cell values row by row from min_row, as ws.iter_rows(values_only=True)
+    would return them had the sheet's blocks been written as cells
+    """
+    blocks = row_blocks(ws)
+    if not blocks:
+        yield from ws.iter_rows(min_row=min_row, values_only=True)
+        return
+    cells = ws._cells
+    max_row = max([ws.max_row] + [block.last_row for block in blocks])
+    max_col = max([ws.max_column] + [block.max_column for block in blocks])
+    for row in range(min_row, max_row + 1):
+        block = block_at(blocks, row)
+        values = []
+        for col in range(1, max_col + 1):
+            cell = cells.get((row, col))
+            value = cell.value if cell is not None else None
+            if block is not None:
+                has_value, block_value = block.value(row - block.first_row, col)
+                if has_value:
+                    value = block_value
+            values.append(value)
+        yield tuple(values)
+
+class CellRowWorksheet(WriteOnlyWorksheet):
+    """
+    Write-only sheet whose appended rows are finished cells (column set,
+    gaps left out). The stock append binds every item as a value first and
+    only falls back to a cell after that fails, once per cell.
+    """
+
+    def _values_to_row(self, values, row_idx):
+        for cell in values:
+            cell.row = row_idx
+            if cell.hyperlink is not None:
+                cell.hyperlink.ref = cell.coordinate
+            yield cell
+
+def _row_cells(out_ws, base_cells, block, offset):
+    """
+    Cells of one output row for a CellRowWorksheet.
+    A block's format_only style is applied before its value and a full style
+    after it, in the order the stages set them on cells (a date value sets
+    the number format of the style it finds).
+    """
+    by_column = {cell.column: cell for cell in base_cells}
+    max_col = max([block.max_column if block is not None else 0] + list(by_column))
+    for col in range(1, max_col + 1):
+        base = by_column.get(col)
+        has_value, value, style = False, None, None
+        if block is not None:
+            has_value, value = block.value(offset, col)
+            style = block.styles.get(col)
+        if base is None and not has_value and style is None:
+            continue
+        # A new cell each time: the writer has finished with the previous one
+        cell = WriteOnlyCell(out_ws)
+        cell.column = col
+        if base is not None:
+            cell._value = base._value
+            cell.data_type = base.data_type
+            # MergedCells only carry these as class attributes
+            cell._hyperlink = base.hyperlink
+            cell._comment = base.comment
+            if base._style is not None:
+                cell._style = StyleArray(base._style)
+        if style is not None and block.format_only:
+            if cell._style is None:
+                cell._style = StyleArray()
+            cell._style[:FORMAT_FIELDS] = style[:FORMAT_FIELDS]
+        if has_value:
+            cell.value = value
+        if style is not None and not block.format_only:
+            cell._style = StyleArray(style)
+        yield cell
+
+def _copy_dimensions(source_dims, target_dims, target_ws):
+    for key, dim in source_dims.items():
+        new_dim = dim.__class__.__new__(dim.__class__)
+        new_dim.__dict__.update(dim.__dict__)
+        if dim._style is not None:
+            new_dim._style = StyleArray(dim._style)
+        new_dim.parent = target_ws
+        target_dims[key] = new_dim
+
+def render_sheet(ws, out_ws):
+    """Stream one session sheet (cells plus row blocks) to a write-only sheet"""
+    for attr in SHEET_ATTRIBUTES:
+        setattr(out_ws, attr, getattr(ws, attr))
+    out_ws.merged_cells = ws.merged_cells
+    _copy_dimensions(ws.column_dimensions, out_ws.column_dimensions, out_ws)
+    _copy_dimensions(ws.row_dimensions, out_ws.row_dimensions, out_ws)
+
+    rows = {}
+    for (row, _), cell in sorted(ws._cells.items()):
+        rows.setdefault(row, []).append(cell)
+    blocks = row_blocks(ws)
+    last_row = max([0] + list(rows) + [block.last_row for block in blocks] + list(ws.row_dimensions))
+
+    for row in range(1, last_row + 1):
+        block = block_at(blocks, row)
+        offset = row - block.first_row if block is not None else 0
+        out_ws.append(_row_cells(out_ws, rows.get(row, ()), block, offset))
+
+def render_workbook(wb, output_file_path):
+    """
+    Write a session workbook with a write-only workbook: template styles,
+    theme, names and sheet setup are reused as they are, static cells are
+    copied and row blocks are written straight from their column values,
+    one row at a time. Only the row blocks are streamed; the template's
+    static cells stay in the session workbook until it is closed.
+    """
+    out = Workbook(write_only=True)
+    for table in STYLE_TABLES:
+        setattr(out, table, IndexedList(getattr(wb, table)))
+    for attr in WORKBOOK_ATTRIBUTES:
+        setattr(out, attr, getattr(wb, attr))
+    for ws in wb.worksheets:
+        out_ws = CellRowWorksheet(parent=out, title=ws.title)
+        out._add_sheet(out_ws)
+        render_sheet(ws, out_ws)
+    out.save(output_file_path)
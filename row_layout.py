@@ -0,0 +1,118 @@
+from copy import copy
+from openpyxl.cell.cell import MergedCell
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.worksheet.merge import MergedCellRange
+
+class RowLayout:
+    """
+    Plans row insertions and deletions on a worksheet and applies them in one go.
+
+    Operations are recorded in the order the old insert_rows/delete_rows calls
+    would have run, using row numbers as they are at that point. apply() then
+    moves every cell straight to its final row, so each cell is touched once
+    however many operations were planned. Merged ranges move with their rows.
+    """
+
+    def __init__(self):
+        self.operations = []
+
+    def insert_rows(self, idx, amount=1):
+        """Plan inserting amount empty rows before row idx"""
+        if amount > 0:
+            self.operations.append((idx, amount))
+
+    def delete_rows(self, idx, amount=1):
+        """Plan deleting amount rows starting at row idx"""
+        if amount > 0:
+            self.operations.append((idx, -amount))
+
+    def mark(self):
+        """Position in the plan, for final_row(row, since=...)"""
+        return len(self.operations)
+
+    def final_row(self, row, since=0):
+        """
+        Row number after all planned operations for a row numbered as it is
+        once the first `since` operations ran. None if the row gets deleted.
+        """
+        for idx, amount in self.operations[since:]:
+            if row < idx:
+                continue
+            if amount < 0 and row < idx - amount:
+                return None
+            row += amount
+        return row
+
+    def apply(self, ws):
+        """Move every cell and merged range of ws to its final row"""
+        if not self.operations:
+            return
+
+        moved_merges = []
+        for merged in list(ws.merged_cells.ranges):
+            new_min = self.final_row(merged.min_row)
+            if new_min is None:
+                # The merge's top-left row is deleted, so the merge goes with it
+                ws.unmerge_cells(merged.coord)
+                continue
+            new_max = max(new_row for new_row in (self.final_row(row) for row in range(merged.min_row, merged.max_row + 1))
+                          if new_row is not None)
+            if (new_min, new_max) != (merged.min_row, merged.max_row):
+                ws.merged_cells.remove(merged)
+                moved_merges.append(CellRange(min_col=merged.min_col, min_row=new_min,
+                                              max_col=merged.max_col, max_row=new_max).coord)
+
+        cells = {}
+        for (row, col), cell in ws._cells.items():
+            new_row = self.final_row(row)
+            if new_row is None:
+                continue
+            cell.row = new_row
+            cells[(new_row, col)] = cell
+        ws._cells = cells
+
+        for coord in moved_merges:
+            merged = MergedCellRange(ws, coord)
+            ws.merged_cells.add(merged)
+            # Rows inserted inside the merge need placeholder cells
+            for row, col in merged.cells:
+                if (row, col) not in ws._cells:
+                    ws._cells[(row, col)] = MergedCell(ws, row=row, column=col)
+
+        ws._current_row = ws.max_row
+        self.operations = []
+
+def move_block_down(ws, start_row, end_row, shift_amount):
+    """
+    Move the cells of rows start_row..end_row down by shift_amount rows in one pass.
+    Values and styles go to the new rows; the old rows keep their styles with
+    their values cleared. Merged ranges inside the block move with it.
+    """
+    if start_row is None or end_row is None or shift_amount <= 0:
+        return
+
+    max_column = ws.max_column
+    block_merges = [merged for merged in ws.merged_cells.ranges
+                    if merged.min_row >= start_row and merged.max_row <= end_row]
+    for merged in block_merges:
+        ws.unmerge_cells(merged.coord)
+
+    # Bottom to top so overlapping source and target rows are not overwritten
+    for row in range(end_row, start_row - 1, -1):
+        for col in range(1, max_column + 1):
+            source_cell = ws._cells.get((row, col))
+            target_cell = ws.cell(row=row + shift_amount, column=col)
+            # Cells covered by a merge that only partly overlaps the block stay put
+            if isinstance(source_cell, MergedCell) or isinstance(target_cell, MergedCell):
+                continue
+            if source_cell is None:
+                target_cell.value = None
+                continue
+            target_cell.value = source_cell.value
+            if source_cell.has_style:
+                target_cell._style = copy(source_cell._style)
+            source_cell.value = None
+
+    for merged in block_merges:
+        merged.shift(row_shift=shift_amount)
+        ws.merge_cells(merged.coord)
@@ -0,0 +1,43 @@
+from copy import copy
+from openpyxl.cell.cell import Cell
+from openpyxl.styles.cell_style import StyleArray
+
+# A StyleArray holds font, fill, border, number format, protection and
+# alignment ids first, followed by the pivotButton/quotePrefix/xfId flags
+FORMAT_FIELDS = 6
+
+def style_id(cell):
+    """
+    Resolve a cell's formatting to a shared style id (a StyleArray).
+    The ids are registered through the workbook exactly as assigning
+    font, border, fill, number format, protection and alignment would,
+    so the result matches the per-attribute copy it replaces.
+    """
+    resolved = Cell(cell.parent)
+    resolved.font = copy(cell.font)
+    resolved.border = copy(cell.border)
+    resolved.fill = copy(cell.fill)
+    resolved.number_format = cell.number_format
+    resolved.protection = copy(cell.protection)
+    resolved.alignment = copy(cell.alignment)
+    return StyleArray(resolved._style)
+
+def apply_style_id(cell, style):
+    """
+    Give cell the formatting of a style id without creating any style objects.
+    Every cell gets its own array because openpyxl updates a cell's
+    StyleArray in place when a single style attribute is set later.
+    """
+    new_style = StyleArray(cell._style) if cell._style is not None else StyleArray()
+    new_style[:FORMAT_FIELDS] = style[:FORMAT_FIELDS]
+    cell._style = new_style
+
+def fill_rows_with_style(ws, first_row, last_row, style, max_column=None, clear_values=False):
+    """Assign one style id to every cell of rows first_row..last_row, optionally clearing values"""
+    max_column = max_column or ws.max_column
+    for row in range(first_row, last_row + 1):
+        for col in range(1, max_column + 1):
+            cell = ws.cell(row=row, column=col)
+            if clear_values:
+                cell.value = None
+            apply_style_id(cell, style)
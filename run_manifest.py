@@ -0,0 +1,237 @@
+import os
+import json
+import hashlib
+import importlib.util
+from openpyxl import load_workbook
+from template_plan import template_hash, read_json_cache, write_json_cache
+from sheet_copy import StyleInterner, replace_sheet_contents
+
+MANIFEST_VERSION = 2
+MANIFEST_SUFFIX = ".manifest.json"
+
+# Part of every stage fingerprint. Bump it when stage output changes in a way
+# the module sources below do not show (a dependency upgrade, a frozen build).
+STAGE_LOGIC_VERSION = 1
+# Helpers every stage writes through, hashed along with the stage's own modules
+SHARED_MODULES = ("template_plan", "label_index", "row_layout", "row_styles", "report_render",
+                  "sheet_copy", "instrumentation")
+
+_source_hashes = {}
+
+def manifest_path(output_file_path):
+    """The manifest of format_8046_Wheat.xlsx is format_8046_Wheat.manifest.json"""
+    return os.path.splitext(output_file_path)[0] + MANIFEST_SUFFIX
+
+def data_hash(value):
+    """SHA-256 of a JSON-serialisable value (other values are hashed as text)"""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def source_hash(module_name):
+    """SHA-256 of a module's source file, or its name when there is no source (frozen build)"""
+    if module_name not in _source_hashes:
+        spec = importlib.util.find_spec(module_name)
+        origin = spec.origin if spec is not None else None
+        if origin and origin.endswith(".py") and os.path.exists(origin):
+            _source_hashes[module_name] = template_hash(origin)
+        else:
+            _source_hashes[module_name] = module_name
+    return _source_hashes[module_name]
+
+def code_version(modules):
+    """Version of the code a stage runs: STAGE_LOGIC_VERSION and the sources of its modules"""
+    names = sorted(set(modules) | set(SHARED_MODULES))
+    return data_hash([STAGE_LOGIC_VERSION, {name: source_hash(name) for name in names}])
+
+class Stage:
+    """
+    One stage of the chain: the sheets it writes, the sheets it only reads
+    and what its result depends on besides those sheets, including the
+    modules whose code it runs.
+    """
+
+    def __init__(self, name, title, writes, reads=(), input_file_path=None, data=None, active=True, code=()):
+        self.name = name
+        self.title = title
+        self.writes = set(writes)
+        self.reads = set(reads) - self.writes
+        self.input_file_path = input_file_path
+        self.data = data
+        self.active = active
+        self.code = tuple(code)
+        self.fingerprint = None
+        # Version index of each of its sheets the stage reads or produces
+        self.positions = {}
+        self.reuse = False
+
+class IncrementalRun:
+    """
+    Decides which stages of a run can reuse the sheets of the previous run.
+
+    Every stage gets a fingerprint of its input file hash, master row,
+    template hash, code version and the versions of the sheets it touches as the stage
+    starts; a sheet's version after a stage is derived from that fingerprint.
+    The manifest stored next to the output workbook records the version of
+    each sheet in it. A sheet whose stored version occurs in this run's
+    chain of versions is copied from the stored workbook at that point and
+    the stages that produced it are skipped. A run that fails saves what it
+    has (a checkpoint), so the next run continues from the failed stage.
+    """
+
+    def __init__(self, format_file_path, output_file_path, enabled=True):
+        self.output_file_path = output_file_path
+        self.manifest_path = manifest_path(output_file_path)
+        # Writing over the template itself makes every run start from the last output
+        in_place = os.path.abspath(format_file_path) == os.path.abspath(output_file_path)
+        self.enabled = enabled and not in_place
+        self.template_digest = template_hash(format_file_path) if self.enabled else None
+        self.previous = self._read_previous() if self.enabled else {}
+        self.stages = []
+        self.versions = {}
+        self.reuse_at = {}
+        self.current = {}
+        self.materialized = set()
+        self.completed = []
+        self.failed_stage = None
+        self._stored_wb = None
+        self._interner = None
+
+    def _read_previous(self):
+        """The stored manifest, or {} when it does not describe the workbook on disk"""
+        manifest = read_json_cache(self.manifest_path)
+        if manifest.get("version") != MANIFEST_VERSION or not os.path.exists(self.output_file_path):
+            return {}
+        if manifest.get("workbook_sha256") != template_hash(self.output_file_path):
+            print(f"[INFO] {self.output_file_path} changed since its manifest was written; running every stage")
+            return {}
+        return manifest
+
+    def add_stage(self, stage):
+        self.stages.append(stage)
+        return stage
+
+    def template_version(self, sheet_name):
+        return data_hash([self.template_digest, sheet_name])
+
+    def resolve(self):
+        """Fingerprint every stage and decide which ones run"""
+        if not self.enabled:
+            return
+        for stage in self.stages:
+            if not stage.active:
+                continue
+            for sheet_name in stage.writes | stage.reads:
+                self.versions.setdefault(sheet_name, [self.template_version(sheet_name)])
+            inputs = {
+                "stage": stage.name,
+                "template": self.template_digest,
+                "input_file": template_hash(stage.input_file_path) if stage.input_file_path else None,
+                "data": data_hash(stage.data),
+                "code": code_version(stage.code),
+                "sheets": {name: self.versions[name][-1] for name in sorted(stage.writes | stage.reads)},
+            }
+            stage.fingerprint = data_hash(inputs)
+            for sheet_name in stage.reads:
+                stage.positions[sheet_name] = len(self.versions[sheet_name]) - 1
+            for sheet_name in stage.writes:
+                chain = self.versions[sheet_name]
+                stage.positions[sheet_name] = len(chain)
+                chain.append(data_hash([chain[-1], stage.fingerprint]))
+
+        stored = self.previous.get("sheets", {})
+        for sheet_name, chain in self.versions.items():
+            self.current[sheet_name] = chain[0]
+            version = stored.get(sheet_name)
+            self.reuse_at[sheet_name] = chain.index(version) if version in chain else 0
+
+        while True:
+            for stage in self.stages:
+                stage.reuse = stage.active and all(
+                    stage.positions[name] <= self.reuse_at[name] for name in stage.writes)
+            # A stage that runs must read a sheet at the version it expects;
+            # a stored later version of it cannot be used
+            conflicts = {name for stage in self.stages if stage.active and not stage.reuse
+                         for name in stage.reads if stage.positions[name] < self.reuse_at[name]}
+            if not conflicts:
+                break
+            for name in conflicts:
+                self.reuse_at[name] = 0
+
+        reused = [stage.title for stage in self.stages if stage.reuse]
+        if reused:
+            if self.previous.get("status") == "failed":
+                print(f"[INFO] Previous run failed at {self.previous.get('failed_stage')}; resuming")
+            print(f"[INFO] Reusing previous output for: {', '.join(reused)}")
+
+    def up_to_date(self):
+        """True when the stored workbook already holds every sheet at its final version"""
+        return self.enabled and bool(self.versions) and all(
+            self.reuse_at[name] == len(chain) - 1 for name, chain in self.versions.items())
+
+    def _copy_sheets(self, wb, sheet_names):
+        """Copy sheets from the stored workbook at their reusable version"""
+        for sheet_name in sheet_names:
+            if sheet_name in self.materialized or not self.reuse_at.get(sheet_name):
+                continue
+            if self._stored_wb is None:
+                print(f"Loading previous output: {self.output_file_path}")
+                self._stored_wb = load_workbook(self.output_file_path)
+                self._interner = StyleInterner(self._stored_wb, wb)
+            replace_sheet_contents(wb[sheet_name], self._stored_wb[sheet_name], self._interner)
+            self.current[sheet_name] = self.versions[sheet_name][self.reuse_at[sheet_name]]
+            self.materialized.add(sheet_name)
+
+    def before_stage(self, wb, stage):
+        """Bring in the stored sheets this stage needs before it runs"""
+        if not self.enabled:
+            return
+        due = [name for name in stage.writes if stage.positions[name] > self.reuse_at[name]]
+        due += [name for name in stage.reads if stage.positions[name] >= self.reuse_at[name]]
+        self._copy_sheets(wb, sorted(due))
+
+    def stage_done(self, stage):
+        """Record a stage that succeeded; its sheets are now at their new version"""
+        if not self.enabled:
+            return
+        for sheet_name in stage.writes:
+            self.current[sheet_name] = self.versions[sheet_name][stage.positions[sheet_name]]
+        self.completed.append(stage.name)
+
+    def before_save(self, wb):
+        """Bring in every stored sheet not copied yet"""
+        self._copy_sheets(wb, sorted(self.versions))
+        self.close()
+
+    def stage_failed(self, wb, stage):
+        """
+        Prepare a checkpoint after stage raised: whatever it wrote is of
+        unknown version, and stored sheets not copied yet are brought in so
+        the checkpoint keeps them.
+        """
+        if not self.enabled:
+            return
+        for sheet_name in stage.writes:
+            self.current[sheet_name] = None
+        self.failed_stage = stage
+        self.before_save(wb)
+
+    def close(self):
+        if self._stored_wb is not None:
+            self._stored_wb.close()
+            self._stored_wb = None
+
+    def write_manifest(self):
+        """Record the sheet versions of the workbook just saved to the output path"""
+        if not self.enabled:
+            return
+        failed_stage = self.failed_stage
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "status": "failed" if failed_stage is not None else "complete",
+            "failed_stage": failed_stage.title if failed_stage is not None else None,
+            "template_sha256": self.template_digest,
+            "workbook_sha256": template_hash(self.output_file_path),
+            "stages": {stage.name: stage.fingerprint for stage in self.stages
+                       if stage.name in self.completed or stage.reuse},
+            "sheets": {name: version for name, version in self.current.items() if version is not None},
+        }
+        write_json_cache(self.manifest_path, manifest, "run manifest")
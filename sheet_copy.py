@@ -0,0 +1,85 @@
+from copy import copy
+from openpyxl.cell.cell import Cell, MergedCell
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE
+from openpyxl.worksheet.cell_range import MultiCellRange
+from openpyxl.worksheet.merge import MergedCellRange
+from report_render import clear_row_blocks
+
+# Shared style lists a StyleArray points into, in StyleArray field order
+STYLE_COLLECTIONS = ("_fonts", "_fills", "_borders", None, "_protections", "_alignments")
+NUMBER_FORMAT_FIELD = 3
+XF_FIELD = 8
+
+class StyleInterner:
+    """
+    Translates style ids of one workbook into style ids of another.
+    Each distinct source StyleArray is resolved once; fonts, fills, borders,
+    number formats, protections and alignments are added to the target
+    workbook's shared lists, which return the existing id for a style they
+    already hold.
+    """
+
+    def __init__(self, source_wb, target_wb):
+        self.source_wb = source_wb
+        self.target_wb = target_wb
+        self.styles = {}
+
+    def translate(self, style):
+        key = tuple(style)
+        translated = self.styles.get(key)
+        if translated is None:
+            translated = list(key)
+            for field, collection in enumerate(STYLE_COLLECTIONS):
+                if collection is not None:
+                    item = getattr(self.source_wb, collection)[key[field]]
+                    translated[field] = getattr(self.target_wb, collection).add(item)
+            number_format = key[NUMBER_FORMAT_FIELD]
+            if number_format >= BUILTIN_FORMATS_MAX_SIZE:
+                fmt = self.source_wb._number_formats[number_format - BUILTIN_FORMATS_MAX_SIZE]
+                translated[NUMBER_FORMAT_FIELD] = self.target_wb._number_formats.add(fmt) + BUILTIN_FORMATS_MAX_SIZE
+            name = self.source_wb._named_styles[key[XF_FIELD]].name
+            target_names = self.target_wb._named_styles.names
+            translated[XF_FIELD] = target_names.index(name) if name in target_names else 0
+            translated = tuple(translated)
+            self.styles[key] = translated
+        # Every cell gets its own array: openpyxl updates StyleArrays in place
+        return StyleArray(translated)
+
+def replace_sheet_contents(target_ws, source_ws, interner):
+    """
+    Make target_ws hold exactly the cells, merged ranges and row/column
+    dimensions of source_ws, which may belong to another workbook (both
+    copies of the same template). Sheet setup is left as the target has it.
+    """
+    target_ws._cells.clear()
+    clear_row_blocks(target_ws)
+    for (row, col), source_cell in source_ws._cells.items():
+        if isinstance(source_cell, MergedCell):
+            cell = MergedCell(target_ws, row=row, column=col)
+        else:
+            cell = Cell(target_ws, row=row, column=col)
+            cell._value = source_cell._value
+            cell.data_type = source_cell.data_type
+            if source_cell.hyperlink:
+                cell._hyperlink = copy(source_cell.hyperlink)
+            if source_cell.comment:
+                cell.comment = copy(source_cell.comment)
+        if source_cell.has_style:
+            cell._style = interner.translate(source_cell._style)
+        target_ws._cells[(row, col)] = cell
+
+    target_ws.merged_cells = MultiCellRange()
+    for merged in source_ws.merged_cells.ranges:
+        target_ws.merged_cells.add(MergedCellRange(target_ws, merged.coord))
+
+    for attr in ("row_dimensions", "column_dimensions"):
+        source_dims = getattr(source_ws, attr)
+        target_dims = getattr(target_ws, attr)
+        target_dims.clear()
+        for key, dim in source_dims.items():
+            new_dim = copy(dim)
+            new_dim.parent = target_ws
+            if dim.has_style:
+                new_dim._style = interner.translate(dim._style)
+            target_dims[key] = new_dim
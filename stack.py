@@ -1,17 +1,35 @@
+import time
+import logging
 import pandas as pd
 import openpyxl
 import numpy as np
-from copy import copy
+from template_plan import has_label
+from label_index import LabelIndex
+from row_styles import style_id, fill_rows_with_style
+from row_layout import RowLayout
+from log_setup import get_logger
+from instrumentation import traced, phase
+from report_render import RowBlock, add_row_block, row_blocks_enabled
+
+logger = get_logger("stack")
 # from sign_off import write_value_below_label  # Not used in this context
 
-def process_stack_data(input_file, output_file, master_data):
+@traced("process_stack_data")
+def process_stack_data(input_file, output_file, master_data, wb=None, plan=None):
+    """Fill the stack-wise sheet; returns False when the sheet could not be filled"""
+    started = time.perf_counter()
+    # Checked once: per-cell DEBUG messages cost nothing at the default level
+    debug = logger.isEnabledFor(logging.DEBUG)
     try:
         output_sheet_name = 'RM- Stack wise'
-        wb = openpyxl.load_workbook(output_file)
+        owns_workbook = wb is None
+        if owns_workbook:
+            phase("load workbook")
+            wb = openpyxl.load_workbook(output_file)
         ws = wb[output_sheet_name]
 
         # Write audit date and PSV quarter
-        print("Filling header data...")
+        logger.info("Filling header data...")
         ws['C2'] = master_data.get("Date of Audit")
         ws['C3'] = master_data.get("PSV Quarter")
 
@@ -61,124 +79,39 @@ def process_stack_data(input_file, output_file, master_data):
         
             return len(rows_to_delete)
 
-        def print_cell_values(ws, start_row, end_row, col_range=(1, 5)):
-            """Print cell values for debugging"""
-            for row in range(start_row, min(end_row + 1, ws.max_row + 1)):
-                row_values = []
-                for col in range(col_range[0], col_range[1] + 1):
-                    value = ws.cell(row=row, column=col).value
-                    row_values.append(f"{col}:'{value}'")
-                print(f"Row {row}: {' | '.join(row_values)}")
-
-        print("\n=== Starting Data Processing ===")
-        print("\nReading input file:", input_file)
+        logger.info("\n=== Starting Data Processing ===")
+        logger.info("\nReading input file: %s", input_file)
+        phase("read input")
         input_df = pd.read_excel(input_file)
-        print(f"Total rows in input file: {len(input_df)}")
-        print("\nCleaning up input data...")
+        logger.info("Total rows in input file: %s", len(input_df))
+        logger.info("\nCleaning up input data...")
         valid_df = input_df[input_df['Stock Type'].notna()].copy()
-        print(f"Rows after removing NaN Stock Type: {len(valid_df)}")
+        logger.info("Rows after removing NaN Stock Type: %s", len(valid_df))
         valid_df.loc[:, 'Stock Type'] = valid_df['Stock Type'].str.lower().str.strip()
         valid_stock_types = ['general', 'fumigation']
         valid_df = valid_df[valid_df['Stock Type'].isin(valid_stock_types)]
-        print("Valid stock types found:", valid_df['Stock Type'].unique())
-        print(f"Final number of valid rows to process: {len(valid_df)}")
+        logger.info("Valid stock types found: %s", valid_df['Stock Type'].unique())
+        logger.info("Final number of valid rows to process: %s", len(valid_df))
         stock_type_counts = valid_df['Stock Type'].value_counts()
-        print("\nRows per stock type:")
+        logger.info("\nRows per stock type:")
         for stock_type, count in stock_type_counts.items():
-            print(f"- {stock_type}: {count} rows")
-        print("\nLocating sections in output template...")
-        print(f"Total rows in sheet: {ws.max_row}")
-        print("\nChecking rows 30-35 for fumigation section:")
-        print_cell_values(ws, 30, 35)
-        general_header_row = None
-        fumigation_label_row = None
-        total_stock_row = None
-        name_row = None
-        for row in range(1, ws.max_row + 1):
-            for col in range(1, 10):
-                cell_value = str(ws.cell(row=row, column=col).value or '').strip()
-                if cell_value == 'Stack No. (With Stock)':
-                    general_header_row = row
-                    print(f"Found General section header at row {row}, column {col}")
-                    break
-            if general_header_row:
-                break
-        if not general_header_row:
-            print("Error: Could not find General section header 'Stack No. (With Stock)'")
-            return
-        for row in range(general_header_row + 1, ws.max_row + 1):
-            col1_value = str(ws.cell(row=row, column=1).value or '').strip()
-            if col1_value == 'Total Stock':
-                total_stock_row = row
-                print(f"Found Total Stock row at row {row}")
-            for col in range(1, 5):
-                cell_value = str(ws.cell(row=row, column=col).value or '').strip()
-                if cell_value.lower() == 'stock under fumigation':
-                    fumigation_label_row = row
-                    print(f"Found Fumigation section at row {row}, column {col}")
-                    break
-            if col1_value == 'Name':
-                name_row = row
-                print(f"Found Name row at row {row}")
-        if not fumigation_label_row:
-            print("\nTrying broader search for Fumigation section...")
-            for row in range(1, ws.max_row + 1):
-                for col in range(1, 5):
-                    cell_value = str(ws.cell(row=row, column=col).value or '').strip()
-                    if 'fumigation' in cell_value.lower():
-                        fumigation_label_row = row
-                        print(f"Found Fumigation section using broader search at row {row}, column {col}")
-                        break
-                if fumigation_label_row:
-                    break
-        if not fumigation_label_row:
-            print("Error: Could not find Fumigation section.")
-            print("Creating a simplified version with just the General section.")
-        else:
-            print(f"Fumigation label row is at {fumigation_label_row}")
-        fumigation_header_row = fumigation_label_row + 1 if fumigation_label_row else None
-        if fumigation_header_row:
-            print(f"Fumigation header row is at {fumigation_header_row}")
-            print("\nChecking fumigation header row:")
-            print_cell_values(ws, fumigation_header_row, fumigation_header_row)
-        print("\nMapping columns...")
-        general_col_idx = {}
-        # for cell in ws[general_header_row]:
-        #     if cell.value:
-        #         general_col_idx[str(cell.value).strip()] = cell.column
-        for cell in ws[general_header_row]:
-            if cell.value:
-                header_text = str(cell.value).strip().replace('\xa0', ' ')  # replaces non-breaking spaces
-                general_col_idx[header_text] = cell.column
-
-        print("Normalized header columns:", list(general_col_idx.keys()))
-
-        print(f"Found {len(general_col_idx)} columns in General section")
-        print("General column indices:", general_col_idx)
-        print("Header row values and columns:")
-        for cell in ws[general_header_row]:
-            print(f"Column {cell.column}: '{cell.value}'")
-        fumigation_col_idx = {}
-        if fumigation_header_row:
-            for cell in ws[fumigation_header_row]:
-                if cell.value:
-                    fumigation_col_idx[str(cell.value).strip()] = cell.column
-            print(f"Found {len(fumigation_col_idx)} columns in Fumigation section")
+            logger.info("- %s: %s rows", stock_type, count)
+        logger.info("\nLocating sections in output template...")
+        phase("anchor search")
+        sheet_plan = plan.sheet(output_sheet_name) if plan else {}
+        anchors = sheet_plan.get("anchors")
+        if anchors and stack_anchors_valid(ws, anchors):
+            logger.info("Using compiled template plan for section anchors")
         else:
-            fumigation_col_idx = general_col_idx
-
-        # --- Find sign-off section using 'S Loc Incharge' label (robust, like app_mb52.py) ---
-        sign_off_label = "S Loc Incharge (WMS Representative)"
-        signoff_start_row = None
-        for row in ws.iter_rows(min_row=1, max_row=ws.max_row):
-            for cell in row:
-                if str(cell.value).strip() == sign_off_label:
-                    signoff_start_row = cell.row
-                    break
-            if signoff_start_row:
-                break
-        if not signoff_start_row:
-            raise Exception("Could not find the sign-off section (row with 'S Loc Incharge (WMS Representative)')!")
+            anchors = find_stack_anchors(ws)
+        if not anchors:
+            return False
+        general_header_row = anchors["general_header_row"]
+        fumigation_label_row = anchors["fumigation_label_row"]
+        fumigation_header_row = anchors["fumigation_header_row"]
+        general_col_idx = anchors["general_col_idx"]
+        fumigation_col_idx = anchors["fumigation_col_idx"]
+        signoff_start_row = anchors["signoff_start_row"]
 
         # --- Robust dynamic row management for General and Fumigation sections ---
         # 1. Count data rows needed
@@ -202,12 +135,18 @@ def process_stack_data(input_file, output_file, master_data):
         else:
             existing_fumigation_rows = 0
 
+        # 3-5. Plan the final layout up front. Every insertion/deletion below is
+        # recorded in the order (and row numbering) it logically happens and the
+        # whole plan is applied in one pass, so each cell moves at most once.
+        phase("row insertion")
+        layout = RowLayout()
+
         # 3. Insert rows as needed for General section
         general_insert_start = general_header_row + 1
         if num_general_rows > existing_general_rows:
             rows_to_insert = num_general_rows - existing_general_rows
-            print(f"Inserting {rows_to_insert} rows after General header at row {general_insert_start}")
-            ws.insert_rows(idx=general_insert_start, amount=rows_to_insert)
+            logger.info("Inserting %s rows after General header at row %s", rows_to_insert, general_insert_start)
+            layout.insert_rows(general_insert_start, rows_to_insert)
             if fumigation_label_row:
                 fumigation_label_row += rows_to_insert
                 if fumigation_header_row:
@@ -219,8 +158,8 @@ def process_stack_data(input_file, output_file, master_data):
         if fumigation_label_row and num_fumigation_rows > existing_fumigation_rows:
             fumigation_insert_start = fumigation_header_row + 1
             rows_to_insert = num_fumigation_rows - existing_fumigation_rows
-            print(f"Inserting {rows_to_insert} rows after Fumigation header at row {fumigation_insert_start}")
-            ws.insert_rows(idx=fumigation_insert_start, amount=rows_to_insert)
+            logger.info("Inserting %s rows after Fumigation header at row %s", rows_to_insert, fumigation_insert_start)
+            layout.insert_rows(fumigation_insert_start, rows_to_insert)
             if signoff_start_row > fumigation_insert_start:
                 signoff_start_row += rows_to_insert
 
@@ -230,167 +169,100 @@ def process_stack_data(input_file, output_file, master_data):
             actual_gap = fumigation_label_row - gap_start
             if actual_gap != gap_between_sections:
                 gap_diff = gap_between_sections - actual_gap
-                print(f"Adjusting gap between General and Fumigation by {gap_diff} rows at {gap_start}")
+                logger.info("Adjusting gap between General and Fumigation by %s rows at %s", gap_diff, gap_start)
                 if gap_diff > 0:
-                    ws.insert_rows(idx=gap_start, amount=gap_diff)
-                    fumigation_label_row += gap_diff
-                    if fumigation_header_row:
-                        fumigation_header_row += gap_diff
-                    if signoff_start_row > gap_start:
-                        signoff_start_row += gap_diff
+                    layout.insert_rows(gap_start, gap_diff)
                 elif gap_diff < 0:
-                    ws.delete_rows(idx=gap_start, amount=abs(gap_diff))
-                    fumigation_label_row += gap_diff
-                    if fumigation_header_row:
-                        fumigation_header_row += gap_diff
-                    if signoff_start_row > gap_start:
-                        signoff_start_row += gap_diff
-
-        # Always copy formatting from Row 2, Column C (cell C2) for all data rows
-        format_cell = ws.cell(row=2, column=3)  # C2
-        print(f"Template cell C2: font={format_cell.font}, border={format_cell.border}, fill={format_cell.fill}, number_format={format_cell.number_format}")
-        # Format General section rows (data only, not header)
-        print(f"Formatting General section data rows {general_header_row + 1} to {general_header_row + num_general_rows} (columns 1 to {ws.max_column}) using C2 as template")
-        for row in range(general_header_row + 1, general_header_row + num_general_rows + 1):
-            for col in range(1, ws.max_column + 1):
-                tgt_cell = ws.cell(row=row, column=col)
-                tgt_cell.value = None
-                tgt_cell.font = copy(format_cell.font)
-                tgt_cell.border = copy(format_cell.border)
-                tgt_cell.fill = copy(format_cell.fill)
-                tgt_cell.number_format = format_cell.number_format
-                tgt_cell.protection = copy(format_cell.protection)
-                tgt_cell.alignment = copy(format_cell.alignment)
-                print(f"Formatted General row {row}, col {col} with C2 style")
-        # Format Fumigation section rows (data only, not header)
-        if fumigation_label_row and num_fumigation_rows > 0:
-            print(f"Formatting Fumigation data rows {fumigation_header_row + 1} to {fumigation_header_row + num_fumigation_rows} (columns 1 to {ws.max_column}) using C2 as template")
-            for row in range(fumigation_header_row + 1, fumigation_header_row + num_fumigation_rows + 1):
-                for col in range(1, ws.max_column + 1):
-                    tgt_cell = ws.cell(row=row, column=col)
-                    tgt_cell.value = None
-                    tgt_cell.font = copy(format_cell.font)
-                    tgt_cell.border = copy(format_cell.border)
-                    tgt_cell.fill = copy(format_cell.fill)
-                    tgt_cell.number_format = format_cell.number_format
-                    tgt_cell.protection = copy(format_cell.protection)
-                    tgt_cell.alignment = copy(format_cell.alignment)
-                    print(f"Formatted Fumigation row {row}, col {col} with C2 style")
-        # Write General section data
-        row_ptr = general_header_row + 1
-        print("General column indices:", general_col_idx)
-        general_totals = {col: 0 for col in ['Normal Bags', 'Made up Bags', 'Total Bags', 'Gross QTY', 'Net Weight']}
-        print("Available columns:", list(general_data.columns))
-        # Find the Net Weight column index once
-        net_weight_col = find_column_by_label(ws, general_header_row, "Net Weight")
-        kgs_per_bag_col = find_column_by_label(ws, general_header_row, "Kgs per Bag*")
-        if not net_weight_col:
-            print("ERROR: Could not find 'Net Weight' column in header row!")
-        if not kgs_per_bag_col:
-            print("ERROR: Could not find 'Kgs per Bag*' column in header row!")
-        else:
-            for _, row in general_data.iterrows():
-                gross_qty = row.get('Gross QTY', 0) or 0
-                bardana_weight = row.get('Bardana Weight', 0) or 0
-                category = str(master_data.get('Category', '')).strip().lower()
-
-                # Calculate Bardana Weight as per category
-                if category == 'wheat':
-                    bardana_weight = gross_qty * (row['Bardana Weight'] / 100)
-                elif category in ['paddy/rice', 'paddy', 'rice']:
-                    total_bags = row['Normal Bag'] + row['Madeup Bag']
-                    bardana_weight = total_bags * row['Bardana Weight'] / 1000
-
-                net_weight = gross_qty - bardana_weight
-
-                # Write all columns except 'Total Bags' as before
-                for in_col, out_col in column_map.items():
-                    if in_col in row and out_col in general_col_idx and out_col != 'Total Bags':
-                        value = row[in_col]
-                        if out_col == 'Bardana Weight':
-                            value = round(bardana_weight, 2)
-                        ws.cell(row=row_ptr, column=general_col_idx[out_col], value=value)
-                        print(f"WROTE General: ws.cell(row={row_ptr}, col={general_col_idx[out_col]}) = {value} (for column '{out_col}')")
-                # Write Excel formula for Total Bags
-                if 'Normal Bags' in general_col_idx and 'Made up Bags' in general_col_idx and 'Total Bags' in general_col_idx:
-                    normal_col = general_col_idx['Normal Bags']
-                    madeup_col = general_col_idx['Made up Bags']
-                    total_col = general_col_idx['Total Bags']
-                    normal_cell = f"{openpyxl.utils.get_column_letter(normal_col)}{row_ptr}"
-                    madeup_cell = f"{openpyxl.utils.get_column_letter(madeup_col)}{row_ptr}"
-                    formula = f"={normal_cell}+{madeup_cell}"
-                    ws.cell(row=row_ptr, column=total_col, value=formula)
-                    print(f"WROTE General: ws.cell(row={row_ptr}, col={total_col}) = {formula} (for column 'Total Bags')")
-                # Write Net Weight (Gross QTY - Bardana Weight)
-                ws.cell(row=row_ptr, column=net_weight_col, value=round(net_weight, 2))
-                print(f"WROTE Net Weight: ws.cell(row={row_ptr}, col={net_weight_col}) = {round(net_weight, 2)}")
-                # Write Kgs per Bag formula
-                if kgs_per_bag_col and 'Qty. In MT' in general_col_idx and 'Normal Bags' in general_col_idx:
-                    qty_col = general_col_idx['Qty. In MT']
-                    normal_bags_col = general_col_idx['Normal Bags']
-                    qty_cell = f"{openpyxl.utils.get_column_letter(qty_col)}{row_ptr}"
-                    normal_bags_cell = f"{openpyxl.utils.get_column_letter(normal_bags_col)}{row_ptr}"
-                    formula = f"=IF({normal_bags_cell}=0,0,{qty_cell}*1000/{normal_bags_cell})"
-                    ws.cell(row=row_ptr, column=kgs_per_bag_col, value=formula)
-                    print(f"WROTE Kgs per Bag formula: ws.cell(row={row_ptr}, col={kgs_per_bag_col}) = {formula}")
-                # Accumulate totals
-                for col in general_totals:
-                    if col in general_col_idx:
-                        cell_value = ws.cell(row=row_ptr, column=general_col_idx[col]).value or 0
-                        try:
-                            general_totals[col] = round(general_totals.get(col, 0) + float(cell_value), 2)
-                        except Exception:
-                            pass
-                print(f"Row {row_ptr}: Gross QTY = {gross_qty}, Bardana Weight = {bardana_weight}, Net Weight = {net_weight}")
-                row_ptr += 1
-        # Add Total row for General section
-        print(f"Adding Total row for General section at row {row_ptr}")
-        ws.cell(row=row_ptr, column=general_col_idx['Stack No. (With Stock)'], value='Total')
-        for col in general_totals:
-            if col in general_col_idx:
-                value = general_totals[col]
-                if col == 'Net Weight':
-                    value = round(value, 2)
-                ws.cell(row=row_ptr, column=general_col_idx[col], value=value)
-        # Add Excel formula for Qty. In MT total (vertical sum)
-        if 'Qty. In MT' in general_col_idx:
-            qty_col = general_col_idx['Qty. In MT']
-            data_start = general_header_row + 1
-            data_end = row_ptr - 1
-            if data_end >= data_start:
-                formula = f"=SUM({openpyxl.utils.get_column_letter(qty_col)}{data_start}:{openpyxl.utils.get_column_letter(qty_col)}{data_end})"
-                ws.cell(row=row_ptr, column=qty_col, value=formula)
-        # Add Excel formula for Total Bags total (vertical sum)
-        if 'Total Bags' in general_col_idx:
-            total_bags_col = general_col_idx['Total Bags']
-            data_start = general_header_row + 1
-            data_end = row_ptr - 1
-            if data_end >= data_start:
-                formula = f"=SUM({openpyxl.utils.get_column_letter(total_bags_col)}{data_start}:{openpyxl.utils.get_column_letter(total_bags_col)}{data_end})"
-                ws.cell(row=row_ptr, column=total_bags_col, value=formula)
-
-        # --- Ensure 2-row gap after General Total before Fumigation section ---
+                    layout.delete_rows(gap_start, abs(gap_diff))
+                fumigation_label_row += gap_diff
+                if fumigation_header_row:
+                    fumigation_header_row += gap_diff
+                if signoff_start_row > gap_start:
+                    signoff_start_row += gap_diff
+        general_rows_planned_at = layout.mark()
+
+        # General data is only written when the Kgs per Bag* column exists; its Total row follows it
+        net_weight_col = anchors["net_weight_col"]
+        kgs_per_bag_col = anchors["kgs_per_bag_col"]
+        general_total_row = general_header_row + 1 + (num_general_rows if kgs_per_bag_col else 0)
+
+        # 6. Ensure 2-row gap after General Total before Fumigation section
         if fumigation_label_row:
-            gap_start = row_ptr + 1
+            gap_start = general_total_row + 1
             actual_gap = fumigation_label_row - gap_start
             gap_needed = 2
             if actual_gap != gap_needed:
                 gap_diff = gap_needed - actual_gap
-                print(f"Adjusting gap after General Total before Fumigation by {gap_diff} rows at {gap_start}")
+                logger.info("Adjusting gap after General Total before Fumigation by %s rows at %s", gap_diff, gap_start)
                 if gap_diff > 0:
-                    ws.insert_rows(idx=gap_start, amount=gap_diff)
-                    fumigation_label_row += gap_diff
-                    if fumigation_header_row:
-                        fumigation_header_row += gap_diff
-                    if signoff_start_row > gap_start:
-                        signoff_start_row += gap_diff
+                    layout.insert_rows(gap_start, gap_diff)
                 elif gap_diff < 0:
-                    ws.delete_rows(idx=gap_start, amount=abs(gap_diff))
-                    fumigation_label_row += gap_diff
-                    if fumigation_header_row:
-                        fumigation_header_row += gap_diff
-                    if signoff_start_row > gap_start:
-                        signoff_start_row += gap_diff
+                    layout.delete_rows(gap_start, abs(gap_diff))
+                fumigation_label_row += gap_diff
+                if fumigation_header_row:
+                    fumigation_header_row += gap_diff
+                if signoff_start_row > gap_start:
+                    signoff_start_row += gap_diff
+
+        # 7. Ensure 2-row gap after Fumigation Total before sign-off section
+        if fumigation_label_row and num_fumigation_rows > 0:
+            gap_start = fumigation_header_row + 1 + num_fumigation_rows + 1
+            actual_gap = signoff_start_row - gap_start
+            gap_needed = 2
+            if actual_gap != gap_needed:
+                gap_diff = gap_needed - actual_gap
+                logger.info("Adjusting gap after Fumigation Total before sign-off by %s rows at %s", gap_diff, gap_start)
+                if gap_diff > 0:
+                    layout.insert_rows(gap_start, gap_diff)
+                elif gap_diff < 0:
+                    layout.delete_rows(gap_start, abs(gap_diff))
+                if signoff_start_row > gap_start:
+                    signoff_start_row += gap_diff
+
+        # General data rows as laid out by steps 3-5, at their final positions
+        general_rows = [row for row in (layout.final_row(row, since=general_rows_planned_at)
+                                        for row in range(general_header_row + 1, general_header_row + num_general_rows + 1))
+                        if row is not None]
+        logger.info("Applying %s planned row insertions/deletions in one pass", len(layout.operations))
+        layout.apply(ws)
+
+        phase("formatting")
+        # Always copy formatting from Row 2, Column C (cell C2) for all data rows,
+        # resolved once to a shared style id and assigned to whole row ranges
+        format_cell = ws.cell(row=2, column=3)  # C2
+        format_style = style_id(format_cell)
+        logger.debug("Template cell C2: font=%s, border=%s, fill=%s, number_format=%s", format_cell.font, format_cell.border, format_cell.fill, format_cell.number_format)
+        # With the stream engine, rows that get data are formatted as part of their row block
+        deferred = row_blocks_enabled(ws)
+        block_style = (format_style, ws.max_column) if deferred else None
+        defer_general = deferred and bool(kgs_per_bag_col) and general_rows == list(
+            range(general_header_row + 1, general_header_row + 1 + num_general_rows))
+        # Format General section rows (data only, not header)
+        if general_rows and not defer_general:
+            logger.info("Formatting General section data rows %s to %s (columns 1 to %s) using C2 as template", general_rows[0], general_rows[-1], ws.max_column)
+            fill_rows_with_style(ws, general_rows[0], general_rows[-1], format_style, clear_values=True)
+        # Format Fumigation section rows (data only, not header)
+        if fumigation_label_row and num_fumigation_rows > 0 and not deferred:
+            logger.info("Formatting Fumigation data rows %s to %s (columns 1 to %s) using C2 as template", fumigation_header_row + 1, fumigation_header_row + num_fumigation_rows, ws.max_column)
+            fill_rows_with_style(ws, fumigation_header_row + 1, fumigation_header_row + num_fumigation_rows, format_style, clear_values=True)
+        phase("write rows")
+        # Bardana, net weight and totals for each section come from the category rule table
+        category = master_data.get('Category', '')
+        if not net_weight_col:
+            logger.error("Could not find 'Net Weight' column in header row!")
+        logger.debug("General column indices: %s", general_col_idx)
+        logger.debug("Available columns: %s", list(general_data.columns))
+        # Write General section data
+        if not kgs_per_bag_col:
+            logger.error("Could not find 'Kgs per Bag*' column in header row!")
+            general_data = general_data.iloc[0:0]
+        row_ptr, general_totals = write_section_rows(
+            ws, general_data, general_col_idx, general_header_row + 1, category,
+            net_weight_col, kgs_per_bag_col, column_map, "General", debug,
+            block_style=block_style if defer_general else None)
+        # Add Total row for General section
+        logger.info("Adding Total row for General section at row %s", row_ptr)
+        write_section_total(ws, row_ptr, general_col_idx, general_totals, general_header_row + 1)
 
         # Write Fumigation section header and data (if present)
         if fumigation_label_row and num_fumigation_rows > 0:
@@ -399,108 +271,266 @@ def process_stack_data(input_file, output_file, master_data):
                 tgt_cell = ws.cell(row=fumigation_header_row, column=col)
                 tgt_cell.value = src_cell.value
             # Write data rows
-            row_ptr = fumigation_header_row + 1
-            fumigation_totals = {col: 0 for col in ['Normal Bags', 'Made up Bags', 'Total Bags', 'Gross QTY', 'Net Weight']}
-            for _, row in fumigation_data.iterrows():
-                gross_qty = row.get('Gross QTY', 0) or 0
-                bardana_weight = row.get('Bardana Weight', 0) or 0
-                category = str(master_data.get('Category', '')).strip().lower()
-
-                # Calculate Bardana Weight as per category
-                if category == 'wheat':
-                    bardana_weight = gross_qty * (row['Bardana Weight'] / 100)
-                elif category in ['paddy/rice', 'paddy', 'rice']:
-                    total_bags = row['Normal Bag'] + row['Madeup Bag']
-                    bardana_weight = total_bags * row['Bardana Weight'] / 1000
-
-                net_weight = gross_qty - bardana_weight
-
-                # Write all columns except 'Total Bags' as before
-                for in_col, out_col in column_map.items():
-                    if in_col in row and out_col in fumigation_col_idx and out_col != 'Total Bags':
-                        value = row[in_col]
-                        if out_col == 'Bardana Weight':
-                            value = round(bardana_weight, 2)
-                        ws.cell(row=row_ptr, column=fumigation_col_idx[out_col], value=value)
-                        print(f"WROTE Fumigation: ws.cell(row={row_ptr}, col={fumigation_col_idx[out_col]}) = {value} (for column '{out_col}')")
-                # Write Excel formula for Total Bags
-                if 'Normal Bags' in fumigation_col_idx and 'Made up Bags' in fumigation_col_idx and 'Total Bags' in fumigation_col_idx:
-                    normal_col = fumigation_col_idx['Normal Bags']
-                    madeup_col = fumigation_col_idx['Made up Bags']
-                    total_col = fumigation_col_idx['Total Bags']
-                    normal_cell = f"{openpyxl.utils.get_column_letter(normal_col)}{row_ptr}"
-                    madeup_cell = f"{openpyxl.utils.get_column_letter(madeup_col)}{row_ptr}"
-                    formula = f"={normal_cell}+{madeup_cell}"
-                    ws.cell(row=row_ptr, column=total_col, value=formula)
-                    print(f"WROTE Fumigation: ws.cell(row={row_ptr}, col={total_col}) = {formula} (for column 'Total Bags')")
-                # Write Net Weight (Gross QTY - Bardana Weight)
-                ws.cell(row=row_ptr, column=net_weight_col, value=round(net_weight, 2))
-                print(f"WROTE Net Weight: ws.cell(row={row_ptr}, col={net_weight_col}) = {round(net_weight, 2)}")
-                # Write Kgs per Bag formula
-                if kgs_per_bag_col and 'Qty. In MT' in fumigation_col_idx and 'Normal Bags' in fumigation_col_idx:
-                    qty_col = fumigation_col_idx['Qty. In MT']
-                    normal_bags_col = fumigation_col_idx['Normal Bags']
-                    qty_cell = f"{openpyxl.utils.get_column_letter(qty_col)}{row_ptr}"
-                    normal_bags_cell = f"{openpyxl.utils.get_column_letter(normal_bags_col)}{row_ptr}"
-                    formula = f"=IF({normal_bags_cell}=0,0,{qty_cell}*1000/{normal_bags_cell})"
-                    ws.cell(row=row_ptr, column=kgs_per_bag_col, value=formula)
-                    print(f"WROTE Kgs per Bag formula: ws.cell(row={row_ptr}, col={kgs_per_bag_col}) = {formula}")
-                # Accumulate totals
-                for col in fumigation_totals:
-                    if col in fumigation_col_idx:
-                        cell_value = ws.cell(row=row_ptr, column=fumigation_col_idx[col]).value or 0
-                        try:
-                            fumigation_totals[col] = round(fumigation_totals.get(col, 0) + float(cell_value), 2)
-                        except Exception:
-                            pass
-                print(f"Row {row_ptr}: Gross QTY = {gross_qty}, Bardana Weight = {bardana_weight}, Net Weight = {net_weight}")
-                row_ptr += 1
+            row_ptr, fumigation_totals = write_section_rows(
+                ws, fumigation_data, fumigation_col_idx, fumigation_header_row + 1, category,
+                net_weight_col, kgs_per_bag_col, column_map, "Fumigation", debug, block_style=block_style)
             # Add Total row for Fumigation section
-            print(f"Adding Total row for Fumigation section at row {row_ptr}")
-            ws.cell(row=row_ptr, column=fumigation_col_idx['Stack No. (With Stock)'], value='Total')
-            for col in fumigation_totals:
-                if col in fumigation_col_idx:
-                    value = fumigation_totals[col]
-                    if col == 'Net Weight':
-                        value = round(value, 2)
-                    ws.cell(row=row_ptr, column=fumigation_col_idx[col], value=value)
-            # Add Excel formula for Qty. In MT total (vertical sum)
-            if 'Qty. In MT' in fumigation_col_idx:
-                qty_col = fumigation_col_idx['Qty. In MT']
-                data_start = fumigation_header_row + 1
-                data_end = row_ptr - 1
-                if data_end >= data_start:
-                    formula = f"=SUM({openpyxl.utils.get_column_letter(qty_col)}{data_start}:{openpyxl.utils.get_column_letter(qty_col)}{data_end})"
-                    ws.cell(row=row_ptr, column=qty_col, value=formula)
-            # Add Excel formula for Total Bags total (vertical sum)
-            if 'Total Bags' in fumigation_col_idx:
-                total_bags_col = fumigation_col_idx['Total Bags']
-                data_start = fumigation_header_row + 1
-                data_end = row_ptr - 1
-                if data_end >= data_start:
-                    formula = f"=SUM({openpyxl.utils.get_column_letter(total_bags_col)}{data_start}:{openpyxl.utils.get_column_letter(total_bags_col)}{data_end})"
-                    ws.cell(row=row_ptr, column=total_bags_col, value=formula)
-
-            # --- Ensure 2-row gap after Fumigation Total before sign-off section ---
-            gap_start = row_ptr + 1
-            actual_gap = signoff_start_row - gap_start
-            gap_needed = 2
-            if actual_gap != gap_needed:
-                gap_diff = gap_needed - actual_gap
-                print(f"Adjusting gap after Fumigation Total before sign-off by {gap_diff} rows at {gap_start}")
-                if gap_diff > 0:
-                    ws.insert_rows(idx=gap_start, amount=gap_diff)
-                    if signoff_start_row > gap_start:
-                        signoff_start_row += gap_diff
-                elif gap_diff < 0:
-                    ws.delete_rows(idx=gap_start, amount=abs(gap_diff))
-                    if signoff_start_row > gap_start:
-                        signoff_start_row += gap_diff
+            logger.info("Adding Total row for Fumigation section at row %s", row_ptr)
+            write_section_total(ws, row_ptr, fumigation_col_idx, fumigation_totals, fumigation_header_row + 1)
 
-        wb.save(output_file)
-        print(f"Stack data processed and saved to {output_file}")
+        logger.info("Stack stage summary: %d general rows, %d fumigation rows, sign-off at row %d, %.2fs",
+                    num_general_rows, num_fumigation_rows, signoff_start_row, time.perf_counter() - started)
+        if owns_workbook:
+            phase("save")
+            wb.save(output_file)
+            logger.info("Stack data processed and saved to %s", output_file)
+        else:
+            logger.info("Stack data processed")
+        return True
     except Exception as e:
-        print(f"Error processing stack data: {str(e)}")
+        logger.error("Error processing stack data: %s", e)
+        return False
+
+# Section columns totalled on each section's Total row
+TOTAL_COLUMNS = ['Normal Bags', 'Made up Bags', 'Total Bags', 'Gross QTY', 'Net Weight']
+
+def input_column(data, name):
+    """An input column with blank values as 0 (all 0 when the column is missing)"""
+    if name not in data:
+        return pd.Series(0, index=data.index)
+    values = data[name]
+    if values.dtype == object:
+        values = values.map(lambda value: value or 0)
+    return values
+
+# Bardana (bag weight) rules, evaluated on a whole section of the stack input at once.
+# Each rule takes the section DataFrame and returns the bardana weight in MT per row.
+def percent_of_gross(data):
+    """Bardana Weight entered as a percentage of the gross quantity"""
+    return input_column(data, 'Gross QTY') * (data['Bardana Weight'] / 100)
+
+def kg_per_bag(data):
+    """Bardana Weight entered in kg per bag, for normal and made-up bags"""
+    return (data['Normal Bag'] + data['Madeup Bag']) * data['Bardana Weight'] / 1000
+
+def as_entered(data):
+    """Bardana Weight entered in MT"""
+    return input_column(data, 'Bardana Weight')
+
+# Category (lower case) -> rule; categories without an entry use as_entered
+BARDANA_RULES = {
+    'wheat': percent_of_gross,
+    'paddy/rice': kg_per_bag,
+    'paddy': kg_per_bag,
+    'rice': kg_per_bag,
+}
+
+def register_bardana_rule(category, rule):
+    """Add or replace the bardana rule of a category, e.g. register_bardana_rule('Maize', percent_of_gross)"""
+    BARDANA_RULES[str(category).strip().lower()] = rule
+
+def section_weights(data, category):
+    """Bardana and net weight per row, rounded to 2 decimals as they are written"""
+    rule = BARDANA_RULES.get(str(category).strip().lower(), as_entered)
+    bardana_weight = rule(data)
+    net_weight = input_column(data, 'Gross QTY') - bardana_weight
+    # Python's round, not NumPy's, so values match the sheet's historic output exactly
+    return ([round(value, 2) for value in bardana_weight.tolist()],
+            [round(value, 2) for value in net_weight.tolist()])
+
+def written_total(values):
+    """
+    Total of a column as written to the sheet, rounded to 2 decimals.
+    Text that is not a number (formulas) counts as 0; a blank (NaN) value
+    makes the total NaN, as summing the cells one by one did.
+    """
+    if len(values) == 0:
+        return 0
+    values = pd.Series(values, dtype=object)
+    numbers = pd.to_numeric(values, errors='coerce')
+    numbers = numbers.where(numbers.notna() | values.isna(), 0)
+    return round(float(numbers.sum(skipna=False)), 2)
+
+def write_section_rows(ws, data, col_idx, first_row, category, net_weight_col, kgs_per_bag_col,
+                       column_map, section_name, debug=False, block_style=None):
+    """
+    Write one section's data rows starting at first_row.
+    Returns the row after the last data row and the section totals.
+    block_style=(style id, last column) records the rows as a RowBlock for the
+    stream engine instead, formatted and cleared as fill_rows_with_style would.
+    """
+    get_column_letter = openpyxl.utils.get_column_letter
+    num_rows = len(data)
+    bardana_weights, net_weights = section_weights(data, category)
+    rows = range(first_row, first_row + num_rows)
+
+    # Values per output column, in the order they are written (a later write wins)
+    columns = {}
+    for in_col, out_col in column_map.items():
+        if in_col in data and out_col in col_idx and out_col != 'Total Bags':
+            if out_col == 'Bardana Weight':
+                columns[col_idx[out_col]] = bardana_weights
+            else:
+                columns[col_idx[out_col]] = data[in_col].tolist()
+    # Excel formula for Total Bags
+    if 'Normal Bags' in col_idx and 'Made up Bags' in col_idx and 'Total Bags' in col_idx:
+        normal_letter = get_column_letter(col_idx['Normal Bags'])
+        madeup_letter = get_column_letter(col_idx['Made up Bags'])
+        columns[col_idx['Total Bags']] = [f"={normal_letter}{row}+{madeup_letter}{row}" for row in rows]
+    # Net Weight (Gross QTY - Bardana Weight)
+    if num_rows:
+        columns[net_weight_col] = net_weights
+    # Kgs per Bag formula
+    if kgs_per_bag_col and 'Qty. In MT' in col_idx and 'Normal Bags' in col_idx:
+        qty_letter = get_column_letter(col_idx['Qty. In MT'])
+        normal_bags_letter = get_column_letter(col_idx['Normal Bags'])
+        columns[kgs_per_bag_col] = [f"=IF({normal_bags_letter}{row}=0,0,{qty_letter}{row}*1000/{normal_bags_letter}{row})"
+                                    for row in rows]
+
+    if block_style is not None:
+        if None in columns:
+            raise ValueError("Net Weight column not found in the stack sheet")
+        style, max_column = block_style
+        styles = {col: style for col in range(1, max_column + 1)}
+        add_row_block(ws, RowBlock(first_row, num_rows, columns, styles, clear=True, format_only=True))
+    else:
+        for col, values in columns.items():
+            for row, value in zip(rows, values):
+                ws.cell(row=row, column=col, value=value)
+    if debug:
+        for offset, row in enumerate(rows):
+            logger.debug("WROTE %s row %s: %s", section_name, row,
+                         {col: values[offset] for col, values in columns.items()})
+
+    totals = {col: written_total(columns.get(col_idx[col], ())) for col in TOTAL_COLUMNS if col in col_idx}
+    return first_row + num_rows, totals
+
+def write_section_total(ws, total_row, col_idx, totals, data_start):
+    """Write a section's Total row: label, value totals and vertical SUM formulas"""
+    get_column_letter = openpyxl.utils.get_column_letter
+    ws.cell(row=total_row, column=col_idx['Stack No. (With Stock)'], value='Total')
+    for col, value in totals.items():
+        if col == 'Net Weight':
+            value = round(value, 2)
+        ws.cell(row=total_row, column=col_idx[col], value=value)
+    data_end = total_row - 1
+    # Excel formulas for the Qty. In MT and Total Bags totals (vertical sums)
+    for col in ('Qty. In MT', 'Total Bags'):
+        if col in col_idx and data_end >= data_start:
+            letter = get_column_letter(col_idx[col])
+            ws.cell(row=total_row, column=col_idx[col], value=f"=SUM({letter}{data_start}:{letter}{data_end})")
+
+def find_stack_anchors(ws):
+    """
+    Scan the RM Stack wise sheet for its section anchors: General header,
+    fumigation label/header, sign-off row and the header column maps
+    """
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    def print_cell_values(ws, start_row, end_row, col_range=(1, 5)):
+        """Print cell values for debugging"""
+        for row in range(start_row, min(end_row + 1, ws.max_row + 1)):
+            row_values = []
+            for col in range(col_range[0], col_range[1] + 1):
+                value = ws.cell(row=row, column=col).value
+                row_values.append(f"{col}:'{value}'")
+            logger.debug("Row %s: %s", row, ' | '.join(row_values))
+
+    logger.debug("Total rows in sheet: %s", ws.max_row)
+    logger.debug("\nChecking rows 30-35 for fumigation section:")
+    if debug:
+        print_cell_values(ws, 30, 35)
+    index = LabelIndex(ws)
+    fumigation_label_row = None
+    total_stock_row = None
+    name_row = None
+    general_header_row, general_header_col = index.find('Stack No. (With Stock)', max_col=9)
+    if not general_header_row:
+        logger.error("Error: Could not find General section header 'Stack No. (With Stock)'")
+        return None
+    logger.info("Found General section header at row %s, column %s", general_header_row, general_header_col)
+    # The last match below the General header wins for each of these labels
+    for row, _ in index.find_all('Total Stock', min_row=general_header_row + 1, max_col=1):
+        total_stock_row = row
+        logger.info("Found Total Stock row at row %s", row)
+    fumigation_cells = index.search(lambda text: text.lower() == 'stock under fumigation',
+                                    min_row=general_header_row + 1, max_col=4)
+    for row, col, _ in fumigation_cells:
+        if row != fumigation_label_row:
+            fumigation_label_row = row
+            logger.info("Found Fumigation section at row %s, column %s", row, col)
+    for row, _ in index.find_all('Name', min_row=general_header_row + 1, max_col=1):
+        name_row = row
+        logger.info("Found Name row at row %s", row)
+    if not fumigation_label_row:
+        logger.info("\nTrying broader search for Fumigation section...")
+        fumigation_cells = index.search(lambda text: 'fumigation' in text.lower(), max_col=4)
+        if fumigation_cells:
+            fumigation_label_row, col, _ = fumigation_cells[0]
+            logger.info("Found Fumigation section using broader search at row %s, column %s", fumigation_label_row, col)
+    if not fumigation_label_row:
+        logger.warning("Could not find Fumigation section.")
+        logger.warning("Creating a simplified version with just the General section.")
+    else:
+        logger.info("Fumigation label row is at %s", fumigation_label_row)
+    fumigation_header_row = fumigation_label_row + 1 if fumigation_label_row else None
+    if fumigation_header_row:
+        logger.info("Fumigation header row is at %s", fumigation_header_row)
+        logger.debug("\nChecking fumigation header row:")
+        if debug:
+            print_cell_values(ws, fumigation_header_row, fumigation_header_row)
+    logger.info("\nMapping columns...")
+    general_col_idx = {}
+    # for cell in ws[general_header_row]:
+    #     if cell.value:
+    #         general_col_idx[str(cell.value).strip()] = cell.column
+    for cell in ws[general_header_row]:
+        if cell.value:
+            header_text = str(cell.value).strip().replace('\xa0', ' ')  # replaces non-breaking spaces
+            general_col_idx[header_text] = cell.column
+
+    logger.debug("Normalized header columns: %s", list(general_col_idx.keys()))
+
+    logger.info("Found %s columns in General section", len(general_col_idx))
+    logger.debug("General column indices: %s", general_col_idx)
+    logger.debug("Header row values and columns:")
+    if debug:
+        for cell in ws[general_header_row]:
+            logger.debug("Column %s: '%s'", cell.column, cell.value)
+    fumigation_col_idx = {}
+    if fumigation_header_row:
+        for cell in ws[fumigation_header_row]:
+            if cell.value:
+                fumigation_col_idx[str(cell.value).strip()] = cell.column
+        logger.info("Found %s columns in Fumigation section", len(fumigation_col_idx))
+    else:
+        fumigation_col_idx = general_col_idx
+
+    # --- Find sign-off section using 'S Loc Incharge' label (robust, like app_mb52.py) ---
+    sign_off_label = "S Loc Incharge (WMS Representative)"
+    signoff_start_row, signoff_col = index.find(sign_off_label)
+    if not signoff_start_row:
+        raise Exception("Could not find the sign-off section (row with 'S Loc Incharge (WMS Representative)')!")
+
+    return {
+        "general_header_row": general_header_row,
+        "general_header_col": general_header_col,
+        "fumigation_label_row": fumigation_label_row,
+        "fumigation_header_row": fumigation_header_row,
+        "total_stock_row": total_stock_row,
+        "name_row": name_row,
+        "general_col_idx": general_col_idx,
+        "fumigation_col_idx": fumigation_col_idx,
+        "signoff_start_row": signoff_start_row,
+        "signoff_col": signoff_col,
+        "net_weight_col": find_column_by_label(ws, general_header_row, "Net Weight"),
+        "kgs_per_bag_col": find_column_by_label(ws, general_header_row, "Kgs per Bag*"),
+    }
+
+def stack_anchors_valid(ws, anchors):
+    """Cheap check that compiled anchors still point at the expected labels"""
+    return (has_label(ws, anchors["general_header_row"], anchors["general_header_col"], 'Stack No. (With Stock)')
+            and has_label(ws, anchors["signoff_start_row"], anchors["signoff_col"], "S Loc Incharge (WMS Representative)"))
 
 def find_column_by_label(ws, header_row, label):
     for cell in ws[header_row]:
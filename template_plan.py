@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import hashlib
+import tempfile
+from openpyxl import load_workbook
+from label_index import LabelIndex
+
+PLAN_FILE_NAME = "template_plan.json"
+PLAN_VERSION = 1
+MAX_CACHED_PLANS = 8
+# Workbooks saved over their own template that point at the template's plan
+MAX_DERIVED_WORKBOOKS = 8
+
+SIGN_OFF_LABEL = "S Loc Incharge (WMS Representative)"
+
+def template_hash(format_file_path):
+    """SHA-256 of the template file contents"""
+    digest = hashlib.sha256()
+    with open(format_file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def plan_file_path(format_file_path):
+    """Plans are cached next to the template they were compiled from"""
+    return os.path.join(os.path.dirname(os.path.abspath(format_file_path)), PLAN_FILE_NAME)
+
+def has_label(sheet, row, col, label, exact=True):
+    """Check that a compiled anchor still points at the expected label"""
+    if not row or not col:
+        return False
+    value = sheet.cell(row=row, column=col).value
+    if value is None:
+        return False
+    if exact:
+        return str(value).strip() == label
+    return label in str(value)
+
+def row_style_ids(sheet, row):
+    """
+    Shared style ids (StyleArray values) of every cell in a template row.
+    Reads existing cells only, so compiling never adds cells to the workbook.
+    """
+    style_ids = []
+    for col in range(1, sheet.max_column + 1):
+        cell = sheet._cells.get((row, col))
+        style = getattr(cell, "_style", None)
+        style_ids.append(list(style) if style is not None else None)
+    return style_ids
+
+class TemplatePlan:
+    """Compiled anchors, column maps and style ids for one version of format.xlsx"""
+
+    def __init__(self, template_digest, sheets):
+        self.template_digest = template_digest
+        self.sheets = sheets
+
+    def sheet(self, sheet_name):
+        """Plan for one sheet ({} when the sheet was not compiled)"""
+        return self.sheets.get(sheet_name, {})
+
+    def to_dict(self):
+        return {"version": PLAN_VERSION, "sheets": self.sheets}
+
+def _sign_off_plan(sheet, expected_row=None):
+    """Sign-off label position; dropped when it is not the row the stage itself would find"""
+    row, col = LabelIndex(sheet).find(SIGN_OFF_LABEL)
+    if expected_row is not None and row != expected_row:
+        return {"row": None, "column": None}
+    return {"row": row, "column": col}
+
+def compile_sheet_plans(wb):
+    """Scan a pristine template workbook once and record what every stage looks up"""
+    # Imported here: the stage modules import has_label from this module
+    from stack import find_stack_anchors
+    from hygeine import find_check_points_header
+    from raw_material import find_header_row, find_total_row, find_signoff_section
+    from countsheet import find_signoff_section as find_count_sheet_signoff
+
+    sheets = {}
+
+    if "RM- Stack wise" in wb.sheetnames:
+        ws = wb["RM- Stack wise"]
+        anchors = find_stack_anchors(ws)
+        if anchors:
+            sheets["RM- Stack wise"] = {
+                "anchors": anchors,
+                "data_row_styles": row_style_ids(ws, anchors["general_header_row"] + 1),
+            }
+
+    if "Annexure- Raw Material" in wb.sheetnames:
+        ws = wb["Annexure- Raw Material"]
+        sign_off_start, _ = find_signoff_section(ws)
+        header_row = find_header_row(ws)
+        if sign_off_start and header_row:
+            sheets["Annexure- Raw Material"] = {
+                "sign_off": _sign_off_plan(ws, sign_off_start),
+                "header_row": header_row,
+                "total_row": find_total_row(ws, header_row, sign_off_start),
+                "data_row_styles": row_style_ids(ws, header_row + 1),
+            }
+
+    if "Annexure- Hygiene Obs" in wb.sheetnames:
+        ws = wb["Annexure- Hygiene Obs"]
+        header_row, check_points_col, auditor_response_col = find_check_points_header(ws)
+        if header_row:
+            sheets["Annexure- Hygiene Obs"] = {
+                "header_row": header_row,
+                "check_points_col": check_points_col,
+                "auditor_response_col": auditor_response_col,
+            }
+
+    if "Count Sheet" in wb.sheetnames:
+        ws = wb["Count Sheet"]
+        sign_off_start, _ = find_count_sheet_signoff(ws)
+        sheets["Count Sheet"] = {
+            "sign_off": _sign_off_plan(ws, sign_off_start),
+            "headers": [cell.value for cell in ws[1] if cell.value],
+            "data_row_styles": row_style_ids(ws, 2),
+        }
+
+    if "Mb52- Stock Report" in wb.sheetnames:
+        ws = wb["Mb52- Stock Report"]
+        sheets["Mb52- Stock Report"] = {
+            "sign_off": _sign_off_plan(ws),
+            "format_row_styles": row_style_ids(ws, 3),
+        }
+
+    return sheets
+
+def read_json_cache(path):
+    """Contents of a JSON cache file, or {} when it is missing or unreadable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            plans = json.load(f)
+        return plans if isinstance(plans, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def write_json_cache(path, data, description="template plan"):
+    """Atomic write; a read-only install directory just means no cache"""
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[INFO] Could not cache {description}: {e}")
+
+def stored_plan(plans, digest):
+    """
+    The plan stored for a digest, or None. A derived workbook's entry names
+    the template it was saved from, whose plan is returned instead.
+    """
+    entry = plans.get(digest)
+    if entry and "template" in entry:
+        digest = entry["template"]
+        entry = plans.get(digest)
+    if not entry or entry.get("version") != PLAN_VERSION or "sheets" not in entry:
+        return None
+    return TemplatePlan(digest, entry["sheets"])
+
+def prune_plans(plans):
+    """Keep the most recent templates and derived workbooks, dropping orphans"""
+    templates = [digest for digest, entry in plans.items() if "sheets" in entry]
+    for stale in templates[:-MAX_CACHED_PLANS]:
+        del plans[stale]
+    derived = [digest for digest, entry in plans.items() if "template" in entry]
+    for stale in derived[:-MAX_DERIVED_WORKBOOKS]:
+        del plans[stale]
+    for digest in derived[-MAX_DERIVED_WORKBOOKS:]:
+        if plans[digest]["template"] not in plans:
+            del plans[digest]
+
+def cached_plan(format_file_path):
+    """Return the stored plan for this exact template, or None (never compiles)"""
+    try:
+        digest = template_hash(format_file_path)
+    except OSError:
+        return None
+    return stored_plan(read_json_cache(plan_file_path(format_file_path)), digest)
+
+def load_plan(format_file_path, wb=None):
+    """
+    Return the plan for this template, compiling and caching it on first use.
+    wb must be an unmodified copy of the template when given.
+    """
+    digest = template_hash(format_file_path)
+    path = plan_file_path(format_file_path)
+    plans = read_json_cache(path)
+    plan = stored_plan(plans, digest)
+    if plan is not None:
+        return plan
+
+    print(f"Compiling template plan for {format_file_path}...")
+    owns_workbook = wb is None
+    if owns_workbook:
+        wb = load_workbook(format_file_path)
+    try:
+        plan = TemplatePlan(digest, compile_sheet_plans(wb))
+    finally:
+        if owns_workbook:
+            wb.close()
+
+    plans.pop(digest, None)
+    plans[digest] = plan.to_dict()
+    prune_plans(plans)
+    write_json_cache(path, plans)
+    return plan
+
+def record_derived_workbook(plan, workbook_path):
+    """
+    Point a workbook saved over its own template (the GUI fills
+    output/format.xlsx in place) at the plan of the template it came from,
+    so the next run does not compile a plan for every saved version. Stages
+    check anchors against the sheet before using them, and openpyxl only
+    appends to the style tables, so the template's style ids stay valid.
+    """
+    path = plan_file_path(workbook_path)
+    plans = read_json_cache(path)
+    if plan.template_digest not in plans:
+        return
+    digest = template_hash(workbook_path)
+    if "sheets" in plans.get(digest, {}):
+        return
+    plans.pop(digest, None)
+    plans[digest] = {"version": PLAN_VERSION, "template": plan.template_digest}
+    prune_plans(plans)
+    write_json_cache(path, plans)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    format_file_path = argv[0] if argv else os.path.join("output", "format.xlsx")
+    plan = load_plan(format_file_path)
+    print(f"✅ Template plan ready for {format_file_path} ({len(plan.sheets)} sheets)")
+    print(f"Plan file: {plan_file_path(format_file_path)}")
+
+if __name__ == "__main__":
+    main()
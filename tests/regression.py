@@ -0,0 +1,240 @@
+"""
+Regression scenarios for the stage chain and workbook snapshots to compare against.
+
+Each scenario fills a copy of output/format.xlsx from the sample inputs in
+input/ (the stack input is built from the sample count sheet). The files in
+tests/snapshots/ were written by the baseline release of the stages; the
+regression tests compare today's output with them. To write snapshots with
+the code of another checkout:
+
+    python tests/regression.py --repo path/to/checkout
+"""
+import os
+import sys
+import json
+import math
+import random
+import shutil
+import hashlib
+import argparse
+import contextlib
+import io
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+SNAPSHOT_DIR = os.path.join(TESTS_DIR, "snapshots")
+
+MASTER_FILE = os.path.join("input", "master.xlsx")
+FORMAT_FILE = os.path.join("output", "format.xlsx")
+HYGIENE_FILE = os.path.join("input", "hygeine_input_files", "Adani S LocAWL Market Audit Headers.xlsx")
+MB52_FILE = os.path.join("input", "mb52_input_files", "Book stock- Layout.xlsx")
+COUNTSHEET_FILE = os.path.join("input", "countsheet_input_files", "Sample Auditor Countsheet.xlsx")
+S_LOC_CODE = "8046"
+
+# name -> (category, general stack rows, fumigation stack rows, share of blank cells,
+# MB52 rows for the location); None sizes use the sample as it is
+SCENARIOS = {
+    "wheat_sample": ("Wheat", None, None, 0, True),
+    "wheat_5x2": ("Wheat", 5, 2, 0, True),
+    "wheat_100x40": ("Wheat", 100, 40, 0, True),
+    "paddy_30x5": ("Paddy/Rice", 30, 5, 0, True),
+    "paddy_240x60_blanks": ("Paddy/Rice", 240, 60, 0.1, True),
+    "maize_240x60_blanks": ("Maize", 240, 60, 0.1, True),
+    "wheat_5x2_no_mb52": ("Wheat", 5, 2, 0, False),
+}
+
+# Columns blanked at random in the scenarios with blank cells
+BLANK_COLUMNS = ["Item QTY As Per book Stock", "Gross QTY", "Bardana Weight", "Madeup Bag",
+                 "Variance Remarks", "Remarks"]
+
+# Floats may differ from the baseline in the last digits (sums are compensated now)
+FLOAT_TOLERANCE = 1e-9
+
+def repo_path(relative_path, repo_dir=REPO_DIR):
+    return os.path.join(repo_dir, relative_path)
+
+def stack_input(general_rows, fumigation_rows, path, repo_dir=REPO_DIR, blank_share=0):
+    """Stack input of a given size, drawn from the sample count sheet in a fixed order"""
+    import pandas as pd
+    sample = pd.read_excel(repo_path(COUNTSHEET_FILE, repo_dir))
+    general = sample[sample["Stock Type"] == "General"]
+    fumigation = sample[sample["Stock Type"] == "Fumigation"]
+    rows = ([general.iloc[i % len(general)] for i in range(general_rows)]
+            + [fumigation.iloc[i % len(fumigation)] for i in range(fumigation_rows)])
+    random.Random(1).shuffle(rows)
+    data = pd.DataFrame(rows)
+    for column in ["Normal Bag", "Madeup Bag"]:
+        data[column] = pd.to_numeric(data[column], errors="coerce").fillna(1)
+    if blank_share:
+        blanks = random.Random(2)
+        data = data.astype(object)
+        for column in BLANK_COLUMNS:
+            for index in range(len(data)):
+                if blanks.random() < blank_share:
+                    data.iat[index, data.columns.get_loc(column)] = None
+    data.to_excel(path, index=False)
+    return path
+
+def empty_mb52_input(path, repo_dir=REPO_DIR):
+    """The sample MB52 export without data rows: title rows and headers only"""
+    from openpyxl import Workbook, load_workbook
+    source = load_workbook(repo_path(MB52_FILE, repo_dir), read_only=True, data_only=True)
+    wb = Workbook()
+    for row in source.active.iter_rows(max_row=3, values_only=True):
+        wb.active.append(row)
+    source.close()
+    wb.save(path)
+    return path
+
+def prepare(scenario, work_dir, repo_dir=REPO_DIR):
+    """Template copy, master row and input paths of a scenario"""
+    from master_data_fetcher import fetch_master_data
+    category, general_rows, fumigation_rows, blank_share, has_mb52_rows = SCENARIOS[scenario]
+    os.makedirs(work_dir, exist_ok=True)
+    format_file_path = os.path.join(work_dir, "format.xlsx")
+    shutil.copy(repo_path(FORMAT_FILE, repo_dir), format_file_path)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fetch_master_data(S_LOC_CODE, "Wheat", repo_path(MASTER_FILE, repo_dir))
+    master_data, auditor_data = result["master_data"], result["auditor_data"]
+    # Fixed values so the snapshot does not depend on the day it was taken
+    master_data["Date of Audit"] = "FIXED"
+    master_data["Category"] = category
+
+    if general_rows is None:
+        countsheet = stack = repo_path(COUNTSHEET_FILE, repo_dir)
+    else:
+        stack = stack_input(general_rows, fumigation_rows, os.path.join(work_dir, "stack.xlsx"), repo_dir,
+                            blank_share)
+        countsheet = stack
+    inputs = {
+        # The hygiene input only has Wheat rows
+        "hygiene": repo_path(HYGIENE_FILE, repo_dir) if category == "Wheat" else None,
+        "mb52": (repo_path(MB52_FILE, repo_dir) if has_mb52_rows
+                 else empty_mb52_input(os.path.join(work_dir, "mb52.xlsx"), repo_dir)),
+        "countsheet": countsheet,
+        "stack": stack,
+    }
+    return format_file_path, master_data, auditor_data, inputs
+
+def run_stages(format_file_path, master_data, auditor_data, inputs):
+    """Run every stage on its own against the template file, as the GUI buttons do"""
+    from header import main as header_main
+    from hygeine import fill_hygiene_sheet
+    from app_mb52 import process_mb52
+    from countsheet import process_count_sheet
+    from stack import process_stack_data
+    from raw_material import process_raw_material
+    with contextlib.redirect_stdout(io.StringIO()):
+        header_main(master_data, auditor_data, format_file_path, format_file_path)
+        if inputs["hygiene"]:
+            fill_hygiene_sheet(master_data, format_file_path, inputs["hygiene"])
+        process_mb52(format_file_path, inputs["mb52"], S_LOC_CODE)
+        process_count_sheet(inputs["countsheet"], format_file_path)
+        process_stack_data(inputs["stack"], format_file_path, master_data)
+        process_raw_material(format_file_path, master_data)
+    return format_file_path
+
+def run_pipeline(format_file_path, master_data, auditor_data, inputs, output_file_path, engine=None):
+    """Run every stage through run_all into a separate output workbook"""
+    from pipeline import run_all
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_all(master_data, auditor_data, format_file_path, output_file_path, s_loc_code=S_LOC_CODE,
+                hygiene_input_file_path=inputs["hygiene"], mb52_input_file_path=inputs["mb52"],
+                countsheet_input_file_path=inputs["countsheet"], stack_input_file_path=inputs["stack"],
+                incremental=False, engine=engine)
+    return output_file_path
+
+def style_digest(cell):
+    parts = [repr(cell.font), repr(cell.border), repr(cell.fill), cell.number_format,
+             repr(cell.alignment), repr(cell.protection)]
+    return hashlib.md5("|".join(parts).encode("utf-8")).hexdigest()[:12]
+
+def snapshot_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+def snapshot_workbook(path):
+    """Values, style digests, merged ranges and dimensions of every sheet"""
+    from openpyxl import load_workbook
+    wb = load_workbook(path)
+    sheets = {}
+    for ws in wb.worksheets:
+        cells = {}
+        for row in ws.iter_rows():
+            for cell in row:
+                style = style_digest(cell) if cell.has_style else None
+                if cell.value is None and style is None:
+                    continue
+                cells[cell.coordinate] = [snapshot_value(cell.value), style]
+        sheets[ws.title] = {
+            "cells": cells,
+            "merged": sorted(str(merged) for merged in ws.merged_cells.ranges),
+            "heights": {str(row): dim.height for row, dim in ws.row_dimensions.items() if dim.height},
+            "widths": {key: dim.width for key, dim in ws.column_dimensions.items() if dim.customWidth},
+        }
+    wb.close()
+    return sheets
+
+def same_value(expected, actual):
+    if isinstance(expected, float) and isinstance(actual, (int, float)) and not isinstance(actual, bool):
+        return math.isclose(expected, actual, rel_tol=FLOAT_TOLERANCE, abs_tol=FLOAT_TOLERANCE)
+    return expected == actual
+
+def compare_snapshots(expected, actual):
+    """Differences between two workbook snapshots, one line each"""
+    differences = []
+    for title in sorted(set(expected) | set(actual)):
+        if title not in expected or title not in actual:
+            differences.append(f"{title}: sheet only in {'actual' if title in actual else 'expected'}")
+            continue
+        want, got = expected[title], actual[title]
+        for coord in sorted(set(want["cells"]) | set(got["cells"])):
+            want_cell, got_cell = want["cells"].get(coord), got["cells"].get(coord)
+            if want_cell is None or got_cell is None:
+                if want_cell != got_cell:
+                    differences.append(f"{title}!{coord}: {want_cell} -> {got_cell}")
+            elif not same_value(want_cell[0], got_cell[0]) or want_cell[1] != got_cell[1]:
+                differences.append(f"{title}!{coord}: {want_cell} -> {got_cell}")
+        for key in ("merged", "heights", "widths"):
+            if want[key] != got[key]:
+                differences.append(f"{title} {key}: {want[key]} -> {got[key]}")
+    return differences
+
+def snapshot_path(scenario):
+    return os.path.join(SNAPSHOT_DIR, scenario + ".json")
+
+def load_snapshot(scenario):
+    with open(snapshot_path(scenario), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_snapshots(work_dir, repo_dir=REPO_DIR):
+    """Snapshot every scenario with the stages importable from sys.path"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    for scenario in SCENARIOS:
+        format_file_path, master_data, auditor_data, inputs = prepare(
+            scenario, os.path.join(work_dir, scenario), repo_dir)
+        run_stages(format_file_path, master_data, auditor_data, inputs)
+        with open(snapshot_path(scenario), "w", encoding="utf-8") as f:
+            json.dump(snapshot_workbook(format_file_path), f, sort_keys=True, separators=(",", ":"))
+        print(f"✅ {scenario}: {snapshot_path(scenario)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write regression snapshots with the stages of a checkout")
+    parser.add_argument("--repo", default=REPO_DIR, help="Checkout whose stages fill the workbooks")
+    parser.add_argument("--work-dir", default=os.path.join(TESTS_DIR, ".regression"),
+                        help="Scratch directory for the filled workbooks")
+    args = parser.parse_args(argv)
+    repo_dir = os.path.abspath(args.repo)
+    sys.path.insert(0, repo_dir)
+    # Stages resolve a few paths relative to the working directory
+    os.chdir(repo_dir)
+    work_dir = os.path.abspath(args.work_dir)
+    try:
+        write_snapshots(work_dir, repo_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import random
+from openpyxl import load_workbook
+from app_mb52 import write_mb52_rows
+from row_styles import style_id, apply_style_id
+from regression import FORMAT_FILE, repo_path
+
+ROWS = 300
+
+def mb52_sheet(extra_rows):
+    ws = load_workbook(repo_path(FORMAT_FILE))["Mb52- Stock Report"]
+    ws.insert_rows(4, extra_rows)
+    return ws, [style_id(ws.cell(row=3, column=col)) for col in range(1, ws.max_column + 1)]
+
+def cells(ws):
+    return {key: (cell.value, tuple(cell._style) if cell._style is not None else None)
+            for key, cell in ws._cells.items()}
+
+def test_matches_per_cell_writer():
+    rng = random.Random(3)
+    columns = {col: [rng.choice([rng.random(), None, "text", 0]) for _ in range(ROWS)] for col in range(2, 26, 2)}
+
+    # Fewer inserted rows than written, so the last rows overlap template cells that already exist
+    expected, styles = mb52_sheet(ROWS - 20)
+    for row in range(4, 4 + ROWS):
+        for col, style in enumerate(styles, 1):
+            apply_style_id(expected.cell(row=row, column=col), style)
+    for col, values in columns.items():
+        for i, value in enumerate(values):
+            expected.cell(row=4 + i, column=col, value=value)
+
+    actual, styles = mb52_sheet(ROWS - 20)
+    write_mb52_rows(actual, 4, ROWS, columns, styles)
+    assert cells(actual) == cells(expected)
@@ -0,0 +1,30 @@
+import pytest
+from benchmark import StageFailed, StageOutput, compare_results
+from log_setup import get_logger
+
+def run(call):
+    with StageOutput() as output:
+        result = call()
+    output.check(result)
+
+def test_failure_status_fails():
+    with pytest.raises(StageFailed):
+        run(lambda: False)
+    with pytest.raises(StageFailed):
+        run(lambda: {"status": "error", "error_message": "no such location"})
+
+def test_printed_and_logged_errors_fail():
+    with pytest.raises(StageFailed, match="bad input"):
+        run(lambda: print("❌ Error: bad input") or True)
+    with pytest.raises(StageFailed, match="missing header"):
+        run(lambda: get_logger("stack").error("missing header") or True)
+
+def test_successful_stage_passes():
+    run(lambda: print("Processing 3 rows, 0 errors") or True)
+    run(lambda: None)
+    run(lambda: {"status": "success"})
+
+def test_compare_reports_failed_benchmark():
+    baseline = {"results": {"process_stack_data[100]": {"seconds": 1.0, "peak_kb": 1000}}}
+    current = {"results": {}, "failed": {"process_stack_data[100]": "missing header"}}
+    assert compare_results(baseline, current) == ["process_stack_data[100]"]
@@ -0,0 +1,92 @@
+import math
+import pytest
+from copy import copy
+import openpyxl
+import pandas as pd
+from openpyxl.utils import get_column_letter
+from countsheet import process_count_sheet, find_signoff_section, move_range_down
+from template_plan import TemplatePlan, compile_sheet_plans
+from regression import FORMAT_FILE, repo_path, stack_input
+
+def per_cell_writer(sheet, input_df):
+    """The count sheet writer before write_count_rows: iterrows() and a style copy per cell"""
+    signoff_start, signoff_end = find_signoff_section(sheet)
+    if len(input_df) > signoff_start - 2:
+        move_range_down(sheet, signoff_start, signoff_end, len(input_df) - (signoff_start - 2) + 2)
+    headers = [cell.value for cell in sheet[1] if cell.value]
+    diff_col = headers.index("Diff") + 1
+    gross_qty = get_column_letter(headers.index("Gross QTY") + 1)
+    book_stock = get_column_letter(headers.index("Item QTY As Per book Stock") + 1)
+    reference_cells = {col: sheet.cell(row=2, column=col) for col in range(1, len(headers) + 1)}
+    for current_row, (_, row) in enumerate(input_df.iterrows(), start=2):
+        for col, header in enumerate(headers, start=1):
+            target_cell = sheet.cell(row=current_row, column=col)
+            if col == diff_col:
+                target_cell.value = f"=ABS({gross_qty}{current_row}-{book_stock}{current_row})"
+            elif header in row:
+                target_cell.value = row[header]
+            if reference_cells[col].has_style:
+                target_cell._style = copy(reference_cells[col]._style)
+
+def cells(sheet):
+    def value(cell):
+        if isinstance(cell.value, float) and math.isnan(cell.value):
+            return "nan"
+        return cell.value
+    return {key: (value(cell), tuple(cell._style) if cell._style is not None else None)
+            for key, cell in sheet._cells.items()}
+
+def test_matches_per_cell_writer(tmp_path):
+    input_file = stack_input(150, 50, str(tmp_path / "counts.xlsx"), blank_share=0.1)
+    input_df = pd.read_excel(input_file)
+    expected = openpyxl.load_workbook(repo_path(FORMAT_FILE))
+    process_count_sheet(input_file, None, wb=expected)
+    reference = openpyxl.load_workbook(repo_path(FORMAT_FILE))
+    per_cell_writer(reference["Count Sheet"], input_df)
+    assert cells(expected["Count Sheet"]) == cells(reference["Count Sheet"])
+
+def test_plan_styles_match_row_styles(tmp_path):
+    input_file = stack_input(20, 5, str(tmp_path / "counts.xlsx"), blank_share=0.1)
+    without_plan = openpyxl.load_workbook(repo_path(FORMAT_FILE))
+    process_count_sheet(input_file, None, wb=without_plan)
+    with_plan = openpyxl.load_workbook(repo_path(FORMAT_FILE))
+    plan = TemplatePlan("test", compile_sheet_plans(with_plan))
+    assert plan.sheet("Count Sheet").get("data_row_styles")
+    process_count_sheet(input_file, None, wb=with_plan, plan=plan)
+    assert cells(with_plan["Count Sheet"]) == cells(without_plan["Count Sheet"])
+
+def template_without_gross_qty():
+    wb = openpyxl.load_workbook(repo_path(FORMAT_FILE))
+    sheet = wb["Count Sheet"]
+    for cell in sheet[1]:
+        if cell.value == "Gross QTY":
+            cell.value = "Gross Quantity"
+    return wb
+
+@pytest.mark.parametrize("engine_rows", [False, True])
+def test_missing_diff_source_header(tmp_path, capsys, engine_rows):
+    from report_render import enable_row_blocks, row_blocks
+    empty_file = str(tmp_path / "empty.xlsx")
+    pd.DataFrame(columns=pd.read_excel(stack_input(1, 0, str(tmp_path / "one.xlsx"))).columns).to_excel(
+        empty_file, index=False)
+    wb = template_without_gross_qty()
+    assert process_count_sheet(empty_file, None, wb=wb)
+    assert "[WARNING]" not in capsys.readouterr().out
+
+    input_file = stack_input(3, 1, str(tmp_path / "counts.xlsx"))
+    wb = template_without_gross_qty()
+    if engine_rows:
+        enable_row_blocks(wb)
+    assert process_count_sheet(input_file, None, wb=wb)
+    assert "no Diff formula is written" in capsys.readouterr().out
+    sheet = wb["Count Sheet"]
+    headers = [cell.value for cell in sheet[1] if cell.value]
+    diff_col = headers.index("Diff") + 1
+    if engine_rows:
+        block = row_blocks(sheet)[0]
+        assert diff_col not in block.columns and diff_col in block.styles
+    else:
+        template = template_without_gross_qty()["Count Sheet"]
+        assert ([sheet.cell(row=row, column=diff_col).value for row in range(2, 6)]
+                == [template.cell(row=row, column=diff_col).value for row in range(2, 6)])
+        assert sheet.cell(row=2, column=headers.index("Material Code") + 1).value is not None
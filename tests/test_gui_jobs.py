@@ -0,0 +1,56 @@
+import pytest
+import app_mb52
+import stack
+import gui
+from pipeline import StageFailed
+
+VALUES = {"s_loc_code": "8046", "category": "Wheat", "master_file_path": "master.xlsx",
+          "mb52_input_file_path": "mb52.xlsx", "stack_input_file_path": "stack.xlsx"}
+
+def test_failed_stage_raises(monkeypatch):
+    monkeypatch.setattr(app_mb52, "process_mb52", lambda **kwargs: False)
+    with pytest.raises(StageFailed, match="MB52 stage reported an error"):
+        gui.mb52_job(VALUES)
+
+def test_failed_stage_after_master_fetch_raises(monkeypatch):
+    monkeypatch.setattr(gui, "fetch_master_for_job", lambda values: {"master_data": {}, "auditor_data": {}})
+    monkeypatch.setattr(stack, "process_stack_data", lambda **kwargs: False)
+    with pytest.raises(StageFailed, match="Stack stage"):
+        gui.stack_job(VALUES)
+
+def test_successful_stage_reports_output(monkeypatch):
+    monkeypatch.setattr(app_mb52, "process_mb52", lambda **kwargs: True)
+    assert gui.mb52_job(VALUES).startswith("MB52 data processed!")
+
+class FakeRoot:
+    def __init__(self):
+        self.destroyed = False
+        self.scheduled = []
+
+    def destroy(self):
+        self.destroyed = True
+
+    def after(self, delay, callback, *args):
+        if self.destroyed:
+            raise RuntimeError("callback scheduled on a destroyed window")
+        self.scheduled.append(callback)
+
+def test_close_window_stops_background_rendering():
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    app = gui.AdaniGUI.__new__(gui.AdaniGUI)
+    app.root = FakeRoot()
+    app.closed = False
+    app.bg_renderer = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    running = app.bg_renderer.submit(release.wait)
+    queued = app.bg_renderer.submit(lambda: None)
+
+    app.close_window()
+    release.set()
+    assert app.root.destroyed and queued.cancelled()
+    running.result(timeout=5)
+    # A render finishing after the window closed is ignored
+    app.show_rendered_background(running, (100, 100))
+    app.render_background()
+    assert app.root.scheduled == []
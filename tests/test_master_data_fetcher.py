@@ -0,0 +1,24 @@
+from openpyxl import load_workbook
+from master_data_fetcher import fetch_master_data
+from regression import MASTER_FILE, S_LOC_CODE, repo_path
+
+def test_sample_master():
+    result = fetch_master_data(S_LOC_CODE, "Wheat", repo_path(MASTER_FILE))
+    assert result["status"] == "success"
+    assert result["master_data"]["PSV Quarter"] == "Q1 FY 25-26"
+
+def test_table_from_first_sheet_and_quarter_from_active_sheet(tmp_path):
+    # Same sheets the baseline used: pd.read_excel reads the first sheet, the quarter came from wb.active
+    wb = load_workbook(repo_path(MASTER_FILE))
+    notes = wb.create_sheet("Notes")
+    notes["A1"] = "Audit Quarter:"
+    notes["B1"] = "Q3 FY 25-26"
+    wb.active = wb.sheetnames.index("Notes")
+    path = str(tmp_path / "master.xlsx")
+    wb.save(path)
+
+    result = fetch_master_data(S_LOC_CODE, "Wheat", path)
+    assert result["status"] == "success"
+    assert result["master_data"]["S Loc Code"] == fetch_master_data(
+        S_LOC_CODE, "Wheat", repo_path(MASTER_FILE))["master_data"]["S Loc Code"]
+    assert result["master_data"]["PSV Quarter"] == "Q3 FY 25-26"
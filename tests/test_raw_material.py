@@ -0,0 +1,39 @@
+import pandas as pd
+from raw_material import net_weight_by_material
+
+def section(rows):
+    return pd.DataFrame(rows, columns=['Stack No. (With Stock)', 'Material Code', 'Qty. In MT', 'Bardana Weight'])
+
+def test_materials_keep_first_stack_order():
+    totals = net_weight_by_material(section([
+        ['S1', 'B', 10, 1],
+        ['S2', 'A', 5, 0.5],
+        ['S3', 'B', 4, 0],
+    ]))
+    assert list(totals) == ['B', 'A']
+    assert totals == {'B': 13.0, 'A': 4.5}
+
+def test_skips_label_total_and_incomplete_rows():
+    totals = net_weight_by_material(section([
+        [None, 'A', 100, 0],
+        ['S1', 'A', 3, 1],
+        ['Total Stock', 'A', 100, 0],
+        ['S2', None, 100, 0],
+        ['S3', 'A', 'n/a', 0],
+        ['S4', 'A', 2, '-'],
+    ]))
+    assert totals == {'A': 2.0}
+
+def test_empty_section():
+    assert net_weight_by_material(section([['Total Stock', 'A', 1, 0]])) == {}
+
+def test_missing_bardana_column_counts_as_zero():
+    data = pd.DataFrame({'Stack No. (With Stock)': ['S1'], 'Material Code': ['A'], 'Qty. In MT': [1.5]})
+    assert net_weight_by_material(data) == {'A': 1.5}
+
+def test_sum_is_compensated():
+    # A running total gives 0.9999999999999999 and 3198.390000000001 for these
+    assert net_weight_by_material(section([['S', 'A', 0.1, 0]] * 10)) == {'A': 1.0}
+    quantities = [794.01, 804.85, 792.45, 767.51, 39.57]
+    totals = net_weight_by_material(section([['S', 'A', qty, 0] for qty in quantities]))
+    assert totals['A'] == 3198.39
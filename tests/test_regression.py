@@ -0,0 +1,26 @@
+"""Stage output compared with snapshots written by the baseline stages (see regression.py)"""
+import pytest
+from regression import (SCENARIOS, prepare, run_stages, run_pipeline, snapshot_workbook,
+                        compare_snapshots, load_snapshot)
+
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_stages_match_baseline(scenario, tmp_path):
+    format_file_path, master_data, auditor_data, inputs = prepare(scenario, str(tmp_path))
+    run_stages(format_file_path, master_data, auditor_data, inputs)
+    assert compare_snapshots(load_snapshot(scenario), snapshot_workbook(format_file_path)) == []
+
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_run_all_matches_baseline(scenario, tmp_path):
+    format_file_path, master_data, auditor_data, inputs = prepare(scenario, str(tmp_path))
+    output_file_path = run_pipeline(format_file_path, master_data, auditor_data, inputs,
+                                    str(tmp_path / "output.xlsx"), engine="openpyxl")
+    assert compare_snapshots(load_snapshot(scenario), snapshot_workbook(output_file_path)) == []
+
+def test_raw_material_totals_are_compensated(tmp_path):
+    # The baseline's running total wrote 2458.010000000001 here
+    from openpyxl import load_workbook
+    format_file_path, master_data, auditor_data, inputs = prepare("wheat_100x40", str(tmp_path))
+    run_stages(format_file_path, master_data, auditor_data, inputs)
+    assert load_snapshot("wheat_100x40")["Annexure- Raw Material"]["cells"]["G18"][0] == 2458.010000000001
+    wb = load_workbook(format_file_path)
+    assert wb["Annexure- Raw Material"]["G18"].value == 2458.01
@@ -0,0 +1,24 @@
+import pytest
+import report_render
+from pipeline import PipelineSession
+from regression import SCENARIOS, prepare, run_pipeline, snapshot_workbook, compare_snapshots
+from report_render import stream_supported
+
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_stream_matches_openpyxl(scenario, tmp_path):
+    format_file_path, master_data, auditor_data, inputs = prepare(scenario, str(tmp_path))
+    outputs = {engine: run_pipeline(format_file_path, master_data, auditor_data, inputs,
+                                    str(tmp_path / f"{engine}.xlsx"), engine=engine)
+               for engine in ("openpyxl", "stream")}
+    assert compare_snapshots(snapshot_workbook(outputs["openpyxl"]), snapshot_workbook(outputs["stream"])) == []
+
+def test_stream_supported_versions():
+    assert stream_supported("3.1.0") and stream_supported("3.1.5")
+    assert not stream_supported("3.0.10") and not stream_supported("3.2.0")
+
+def test_unsupported_openpyxl_falls_back(tmp_path, monkeypatch, capsys):
+    format_file_path, _, _, _ = prepare("wheat_sample", str(tmp_path))
+    monkeypatch.setattr(report_render.openpyxl, "__version__", "3.2.0")
+    with PipelineSession(format_file_path, str(tmp_path / "output.xlsx"), engine="stream") as session:
+        assert session.engine == "openpyxl"
+    assert "[WARNING] The stream engine supports openpyxl 3.1.x, found 3.2.0" in capsys.readouterr().out
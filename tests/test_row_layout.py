@@ -0,0 +1,143 @@
+import random
+from openpyxl import Workbook
+from openpyxl.cell.cell import MergedCell
+from openpyxl.styles import Font
+from row_layout import RowLayout
+
+def make_sheet(rows=30, columns=4):
+    ws = Workbook().active
+    for row in range(1, rows + 1):
+        for col in range(1, columns + 1):
+            ws.cell(row=row, column=col, value=f"r{row}c{col}")
+        ws.cell(row=row, column=1).font = Font(bold=row % 2 == 0)
+    return ws
+
+def contents(ws):
+    return {key: (cell.value, tuple(cell._style) if cell.has_style else None)
+            for key, cell in ws._cells.items() if cell.value is not None}
+
+def merges(ws):
+    return sorted(merged.coord for merged in ws.merged_cells.ranges)
+
+def test_final_row_insert_and_delete():
+    layout = RowLayout()
+    layout.insert_rows(5, 3)
+    assert [layout.final_row(row) for row in (1, 4, 5, 10)] == [1, 4, 8, 13]
+
+    layout = RowLayout()
+    layout.delete_rows(5, 2)
+    assert [layout.final_row(row) for row in (4, 5, 6, 7, 10)] == [4, None, None, 5, 8]
+
+def test_final_row_mixed_sequence():
+    layout = RowLayout()
+    layout.insert_rows(3, 2)    # rows 3.. move to 5..
+    layout.delete_rows(10, 3)   # rows 10-12 as numbered now (8-10 before) go
+    layout.insert_rows(1)
+    assert layout.final_row(2) == 3
+    assert layout.final_row(3) == 6
+    assert layout.final_row(7) == 10
+    assert layout.final_row(8) is None
+    assert layout.final_row(10) is None
+    assert layout.final_row(11) == 11
+
+def test_final_row_since_mark():
+    layout = RowLayout()
+    layout.insert_rows(2, 5)
+    mark = layout.mark()
+    layout.delete_rows(3)
+    # Rows numbered after the insertion only go through the deletion
+    assert layout.final_row(10, since=mark) == 9
+    assert layout.final_row(3, since=mark) is None
+    assert layout.final_row(10) == 14
+
+def test_empty_plan_leaves_sheet_alone():
+    ws = make_sheet()
+    before = contents(ws)
+    RowLayout().apply(ws)
+    assert contents(ws) == before
+
+def test_apply_matches_sequential_insert_and_delete():
+    rng = random.Random(7)
+    for _ in range(25):
+        expected = make_sheet()
+        actual = make_sheet()
+        layout = RowLayout()
+        for _ in range(rng.randint(1, 6)):
+            idx = rng.randint(1, 35)
+            amount = rng.randint(1, 4)
+            if rng.random() < 0.5:
+                expected.insert_rows(idx, amount)
+                layout.insert_rows(idx, amount)
+            else:
+                expected.delete_rows(idx, amount)
+                layout.delete_rows(idx, amount)
+        layout.apply(actual)
+        assert contents(actual) == contents(expected)
+        assert all(cell.row == row for (row, _), cell in actual._cells.items())
+        assert layout.operations == []
+
+def test_merge_below_the_moved_rows_moves_with_them():
+    ws = make_sheet()
+    ws.merge_cells("A20:C21")
+    layout = RowLayout()
+    layout.insert_rows(10, 3)
+    layout.delete_rows(2)
+    layout.apply(ws)
+    assert merges(ws) == ["A22:C23"]
+    assert ws["A22"].value == "r20c1"
+    assert isinstance(ws._cells[(23, 2)], MergedCell)
+
+def test_merge_above_the_moved_rows_stays():
+    ws = make_sheet()
+    ws.merge_cells("B2:D3")
+    layout = RowLayout()
+    layout.insert_rows(10, 3)
+    layout.apply(ws)
+    assert merges(ws) == ["B2:D3"]
+
+def test_insertion_inside_a_merge_stretches_it():
+    ws = make_sheet()
+    ws.merge_cells("A5:B8")
+    layout = RowLayout()
+    layout.insert_rows(7, 2)
+    layout.apply(ws)
+    assert merges(ws) == ["A5:B10"]
+    # The inserted rows are covered by placeholder cells
+    assert all(isinstance(ws._cells[(row, col)], MergedCell) for row in (7, 8) for col in (1, 2))
+    assert ws["A5"].value == "r5c1"
+
+def test_deleting_part_of_a_merge_shrinks_it():
+    ws = make_sheet()
+    ws.merge_cells("A5:B8")
+    layout = RowLayout()
+    layout.delete_rows(7, 3)
+    layout.apply(ws)
+    assert merges(ws) == ["A5:B6"]
+    assert ws["A7"].value == "r10c1"
+
+def test_deleting_a_merge_top_row_removes_it():
+    ws = make_sheet()
+    ws.merge_cells("A5:B8")
+    layout = RowLayout()
+    layout.delete_rows(4, 2)
+    layout.apply(ws)
+    assert merges(ws) == []
+    # The rows the merge covered below its top row move up as empty rows
+    assert not any(isinstance(cell, MergedCell) for cell in ws._cells.values())
+    assert [(row, 1) in ws._cells for row in (4, 5, 6)] == [False, False, False]
+    assert ws["A7"].value == "r9c1"
+
+def test_merges_inside_across_and_below_a_mixed_plan():
+    ws = make_sheet(40)
+    ws.merge_cells("A3:B4")     # above everything
+    ws.merge_cells("A9:D12")    # an insertion lands inside
+    ws.merge_cells("C20:D20")   # single row below both operations
+    ws.merge_cells("A30:A33")   # below, partly deleted later
+    layout = RowLayout()
+    layout.insert_rows(11, 2)   # 9:12 -> 9:14, rows 20.. -> 22..
+    layout.delete_rows(33, 2)   # rows 33-34 now (31-32 before)
+    layout.insert_rows(1)
+    layout.apply(ws)
+    assert merges(ws) == ["A10:D15", "A33:A34", "A4:B5", "C23:D23"]
+    assert ws["A33"].value == "r30c1"
+    assert ws["C23"].value == "r20c3"
@@ -0,0 +1,144 @@
+import json
+import pytest
+from openpyxl import Workbook, load_workbook
+import pipeline
+import run_manifest
+from pipeline import StageFailed, run_all
+from run_manifest import IncrementalRun, Stage, manifest_path
+from regression import prepare, snapshot_workbook, compare_snapshots, load_snapshot
+
+SHEETS = ("A", "B", "C")
+
+def make_template(tmp_path):
+    wb = Workbook()
+    wb.active.title = "A"
+    for title in SHEETS[1:]:
+        wb.create_sheet(title)
+    path = str(tmp_path / "format.xlsx")
+    wb.save(path)
+    return path
+
+def chain(data):
+    """s1 writes A; s2 reads A and writes B; s3 reads B and writes A again and C"""
+    return [
+        Stage("s1", "S1", {"A"}, data=data["s1"], code=("s1_module",)),
+        Stage("s2", "S2", {"B"}, reads={"A"}, data=data["s2"], code=("s2_module",)),
+        Stage("s3", "S3", {"A", "C"}, reads={"B"}, data=data["s3"], code=("s3_module",)),
+    ]
+
+def run_stage(wb, stage):
+    read = "|".join(str(wb[name]["A1"].value) for name in sorted(stage.reads))
+    for name in stage.writes:
+        wb[name]["A1"] = f"{stage.name}({stage.data};{read};{wb[name]['A1'].value})"
+
+def simulate(format_file_path, output_file_path, data, fail_at=None, incremental=True):
+    """Run the chain the way run_all does; returns the names of the stages that ran"""
+    run = IncrementalRun(format_file_path, output_file_path, enabled=incremental)
+    stages = [run.add_stage(stage) for stage in chain(data)]
+    run.resolve()
+    if run.up_to_date():
+        return []
+    wb = load_workbook(format_file_path)
+    ran = []
+    for stage in stages:
+        if stage.reuse:
+            continue
+        run.before_stage(wb, stage)
+        ran.append(stage.name)
+        if stage.name == fail_at:
+            wb["B"]["A1"] = "half-written"
+            run.stage_failed(wb, stage)
+            wb.save(output_file_path)
+            run.write_manifest()
+            return ran
+        run_stage(wb, stage)
+        run.stage_done(stage)
+    run.before_save(wb)
+    wb.save(output_file_path)
+    run.write_manifest()
+    return ran
+
+def values(path):
+    wb = load_workbook(path)
+    return {name: wb[name]["A1"].value for name in SHEETS}
+
+@pytest.fixture
+def paths(tmp_path):
+    return make_template(tmp_path), str(tmp_path / "output.xlsx"), str(tmp_path / "full.xlsx")
+
+DATA = {"s1": 1, "s2": 1, "s3": 1}
+
+def test_unchanged_run_is_up_to_date(paths):
+    format_file_path, output_file_path, _ = paths
+    assert simulate(format_file_path, output_file_path, DATA) == ["s1", "s2", "s3"]
+    assert simulate(format_file_path, output_file_path, DATA) == []
+
+def test_changed_stage_reuses_stored_sheets(paths):
+    # B is stored as s2 left it; A only as s3 left it, so s1 reruns to give s3 its input
+    format_file_path, output_file_path, full_file_path = paths
+    simulate(format_file_path, output_file_path, DATA)
+    changed = dict(DATA, s3=2)
+    assert simulate(format_file_path, output_file_path, changed) == ["s1", "s3"]
+    simulate(format_file_path, full_file_path, changed, incremental=False)
+    assert values(output_file_path) == values(full_file_path)
+
+def test_stage_reading_an_overwritten_sheet_reruns_its_writers(paths):
+    # s2 must read A as s1 left it, but the stored A is s3's version, so s1 reruns too
+    format_file_path, output_file_path, full_file_path = paths
+    simulate(format_file_path, output_file_path, DATA)
+    changed = dict(DATA, s2=2)
+    assert simulate(format_file_path, output_file_path, changed) == ["s1", "s2", "s3"]
+    simulate(format_file_path, full_file_path, changed, incremental=False)
+    assert values(output_file_path) == values(full_file_path)
+
+def test_failed_run_resumes_from_failed_stage(paths):
+    format_file_path, output_file_path, full_file_path = paths
+    assert simulate(format_file_path, output_file_path, DATA, fail_at="s2") == ["s1", "s2"]
+    with open(manifest_path(output_file_path), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert manifest["status"] == "failed" and manifest["failed_stage"] == "S2"
+    assert list(manifest["stages"]) == ["s1"]
+    assert simulate(format_file_path, output_file_path, DATA) == ["s2", "s3"]
+    simulate(format_file_path, full_file_path, DATA, incremental=False)
+    assert values(output_file_path) == values(full_file_path)
+    assert simulate(format_file_path, output_file_path, DATA) == []
+
+def test_code_changes_rerun_stages(paths, monkeypatch):
+    format_file_path, output_file_path, _ = paths
+    simulate(format_file_path, output_file_path, DATA)
+    monkeypatch.setitem(run_manifest._source_hashes, "s3_module", "changed")
+    assert simulate(format_file_path, output_file_path, DATA) == ["s1", "s3"]
+    monkeypatch.setattr(run_manifest, "STAGE_LOGIC_VERSION", run_manifest.STAGE_LOGIC_VERSION + 1)
+    assert simulate(format_file_path, output_file_path, DATA) == ["s1", "s2", "s3"]
+
+def test_run_all_resumes_after_a_stage_reports_an_error(tmp_path, monkeypatch, capsys):
+    format_file_path, master_data, auditor_data, inputs = prepare("wheat_5x2", str(tmp_path))
+    output_file_path = str(tmp_path / "output.xlsx")
+    with monkeypatch.context() as patch:
+        patch.setattr(pipeline, "process_stack_data", lambda *args, **kwargs: False)
+        with pytest.raises(StageFailed):
+            run_all(master_data, auditor_data, format_file_path, output_file_path,
+                    hygiene_input_file_path=inputs["hygiene"], mb52_input_file_path=inputs["mb52"],
+                    countsheet_input_file_path=inputs["countsheet"], stack_input_file_path=inputs["stack"],
+                    engine="openpyxl")
+    with open(manifest_path(output_file_path), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert manifest["status"] == "failed" and manifest["failed_stage"] == "Stack"
+    assert sorted(manifest["stages"]) == ["countsheet", "header", "hygiene", "mb52"]
+
+    capsys.readouterr()
+    run_all(master_data, auditor_data, format_file_path, output_file_path,
+            hygiene_input_file_path=inputs["hygiene"], mb52_input_file_path=inputs["mb52"],
+            countsheet_input_file_path=inputs["countsheet"], stack_input_file_path=inputs["stack"],
+            engine="openpyxl")
+    out = capsys.readouterr().out
+    # Header reruns too: the Stack stage builds on its sign-off in the stack sheet
+    assert "Reusing previous output for: Hygiene, MB52, Count Sheet\n" in out
+    assert "=== Stage: Stack ===" in out and "=== Stage: Raw Material ===" in out
+    assert compare_snapshots(load_snapshot("wheat_5x2"), snapshot_workbook(output_file_path)) == []
+
+    run_all(master_data, auditor_data, format_file_path, output_file_path,
+            hygiene_input_file_path=inputs["hygiene"], mb52_input_file_path=inputs["mb52"],
+            countsheet_input_file_path=inputs["countsheet"], stack_input_file_path=inputs["stack"],
+            engine="openpyxl")
+    assert "is up to date" in capsys.readouterr().out